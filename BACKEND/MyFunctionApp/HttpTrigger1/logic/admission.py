@@ -0,0 +1,322 @@
+"""Admission control for the conversion routes: per-client quotas and a fair-share wait queue.
+
+Every request is priced from its file's size and page count, in rough
+seconds of worker time. A client pays that cost from its own token bucket,
+refilled at ADMISSION_CLIENT_RATE units a second up to ADMISSION_CLIENT_BURST;
+a client that has run dry is turned away at once. Admitted requests share
+ADMISSION_CAPACITY units of this worker. When it is full they wait in a
+bounded queue, and capacity that frees up goes to the waiting client with
+the least work already running, so one client's batch cannot starve the
+others. A full queue or a wait past ADMISSION_QUEUE_TIMEOUT is a rejection
+too, always with the number of seconds to wait before retrying.
+"""
+import os
+import re
+import hmac
+import math
+import time
+import hashlib
+import logging
+import itertools
+import threading
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from . import telemetry
+
+# Set ADMISSION_CONTROL=0 to admit every request straight away
+ENABLED = os.environ.get("ADMISSION_CONTROL", "1") != "0"
+
+# Cost units running at once on this worker
+CAPACITY = float(os.environ.get("ADMISSION_CAPACITY", "40"))
+
+# Requests waiting for capacity; each holds a host thread, so keep this
+# well below PYTHON_THREADPOOL_THREAD_COUNT
+QUEUE_SIZE = int(os.environ.get("ADMISSION_QUEUE_SIZE", "8"))
+
+# Seconds a request may wait for capacity before it is rejected
+QUEUE_TIMEOUT = float(os.environ.get("ADMISSION_QUEUE_TIMEOUT", "10"))
+
+# Per client: cost units refilled a second, and the most a bucket holds
+CLIENT_RATE = float(os.environ.get("ADMISSION_CLIENT_RATE", "4"))
+CLIENT_BURST = float(os.environ.get("ADMISSION_CLIENT_BURST", "120"))
+
+# Token buckets kept; the least recently seen client is forgotten (and starts full again)
+MAX_CLIENTS = int(os.environ.get("ADMISSION_MAX_CLIENTS", "10000"))
+
+# Header naming the client, honored only on a request carrying one of ADMISSION_API_KEYS (comma separated)
+# in X-API-Key or x-functions-key; other requests are charged to their address
+CLIENT_HEADER = os.environ.get("ADMISSION_CLIENT_HEADER", "X-Client-ID")
+API_KEYS = [key.strip() for key in os.environ.get("ADMISSION_API_KEYS", "").split(",") if key.strip()]
+KEY_HEADERS = ("X-API-Key", "x-functions-key")
+
+# Proxies in front of the app that append to X-Forwarded-For (the platform front end is one); the address
+# the outermost of them saw is the caller's, anything before it was sent by the caller
+TRUSTED_PROXIES = int(os.environ.get("ADMISSION_TRUSTED_PROXIES", "1"))
+
+COST_PER_MB = float(os.environ.get("ADMISSION_COST_PER_MB", "0.5"))
+
+# Per pipeline: (fixed cost, cost per page). An image page is a model call; a PDF page mostly is not
+PIPELINE_COSTS = {
+    "image-to-csv": (1.0, float(os.environ.get("ADMISSION_IMAGE_PAGE_COST", "4"))),
+    "pdf-to-csv": (1.0, float(os.environ.get("ADMISSION_PDF_PAGE_COST", "0.5"))),
+    "merge-csv": (2.0, 0.0),
+}
+
+# Page counts guessed from the size when the upload did not record one
+PDF_BYTES_PER_PAGE = 64 * 1024
+ARCHIVE_BYTES_PER_PAGE = 512 * 1024
+ARCHIVE_EXTENSIONS = (".zip", ".tif", ".tiff")
+
+DECISIONS = telemetry.counter("admission_decisions", "Conversion requests admitted or rejected, by route and outcome.")
+WAIT_SECONDS = telemetry.histogram("admission_wait_seconds", "Time admitted requests waited for capacity, by route.")
+REQUEST_COST = telemetry.histogram("admission_request_cost", "Estimated cost of conversion requests, by route.",
+                                   (1, 2, 5, 10, 20, 50, 100, 200))
+
+
+class Rejected(Exception):
+    """A request turned away. reason is quota, queue_full or timeout; retry_after is in whole seconds."""
+
+    def __init__(self, reason, retry_after):
+        self.reason = reason
+        self.retry_after = retry_after
+        if reason == "quota":
+            message = f"Request quota exceeded; retry in {retry_after}s."
+        else:
+            message = f"The server is busy; retry in {retry_after}s."
+        super().__init__(message)
+
+
+def count_pages(data, extension):
+    """Page count of an uploaded PDF, so it can be priced without a download; None for other files.
+
+    Read from the /Count of the page tree objects, without parsing the PDF.
+    Page trees inside compressed object streams cannot be seen this way and
+    give None, so the pages are guessed from the size (see estimate_cost).
+    """
+    if not ENABLED or extension.lower() != ".pdf":
+        return None
+    counts = []
+    for match in _PAGE_TREE.finditer(data):
+        start = data.rfind(b" obj", 0, match.start())
+        end = data.find(b"endobj", match.end())
+        count = _PAGE_COUNT.search(data, max(0, start), end if end != -1 else len(data))
+        if count:
+            counts.append(int(count.group(1)))
+    # The root of the page tree counts every page; the pages under it count fewer
+    return max(counts) if counts else None
+
+
+_PAGE_TREE = re.compile(rb"/Type\s*/Pages\b")
+_PAGE_COUNT = re.compile(rb"/Count\s+(\d+)")
+
+
+def estimate_cost(pipeline, name="", size=0, metadata=None):
+    """Estimated cost of running pipeline on a file, in rough seconds of worker time."""
+    fixed, page_cost = PIPELINE_COSTS[pipeline]
+    pages = (metadata or {}).get("pages")
+    if pages:
+        pages = int(pages)
+    elif pipeline == "pdf-to-csv":
+        pages = max(1, math.ceil(size / PDF_BYTES_PER_PAGE))
+    elif pipeline == "image-to-csv":
+        archive = os.path.splitext(name)[1].lower() in ARCHIVE_EXTENSIONS
+        pages = max(1, math.ceil(size / ARCHIVE_BYTES_PER_PAGE)) if archive else 1
+    else:
+        pages = 0
+    return round(fixed + page_cost * pages + COST_PER_MB * size / (1024 * 1024), 2)
+
+
+def client_id(headers):
+    """Whom a request counts against.
+
+    An authenticated request (see API_KEYS) is named by its CLIENT_HEADER, or
+    else by its key. Any other request is named by the address the trusted
+    proxy saw, so a caller cannot pick its bucket by sending headers.
+    """
+    key = authenticated_key(headers)
+    if key is not None:
+        client = (headers.get(CLIENT_HEADER) or "").strip()
+        return f"key:{client[:128]}" if client else "key:" + hashlib.sha256(key.encode()).hexdigest()[:16]
+    return client_address(headers) or "anonymous"
+
+
+def authenticated_key(headers):
+    """The API key a request carries, if it is one of API_KEYS."""
+    for name in KEY_HEADERS:
+        sent = (headers.get(name) or "").strip()
+        if sent and any(hmac.compare_digest(sent.encode(), key.encode()) for key in API_KEYS):
+            return sent
+    return None
+
+
+def client_address(headers):
+    """The X-Forwarded-For address added by the outermost trusted proxy, without its port."""
+    hops = [hop.strip() for hop in (headers.get("X-Forwarded-For") or "").split(",") if hop.strip()]
+    if TRUSTED_PROXIES < 1 or len(hops) < TRUSTED_PROXIES:
+        return ""
+    address = hops[-TRUSTED_PROXIES]
+    if address.startswith("["):
+        # [IPv6]:port
+        address = address[1:].split("]")[0]
+    elif address.count(":") == 1:
+        address = address.split(":")[0]
+    return address[:128]
+
+
+class _Waiter:
+    __slots__ = ("client", "cost", "sequence", "granted", "rejected")
+
+    def __init__(self, client, cost, sequence):
+        self.client = client
+        self.cost = cost
+        self.sequence = sequence
+        self.granted = False
+        self.rejected = None
+
+
+class AdmissionController:
+    """Token buckets per client in front of a shared, bounded pool of capacity.
+
+    Costs are capped at the burst size and the capacity, so a huge request
+    drains its client's bucket and then runs alone instead of never running.
+    A request that finds others waiting queues behind them. When the queue
+    is full, the newest request of the client holding most of it makes room
+    for a client with fewer waiting.
+    """
+
+    def __init__(self, capacity=CAPACITY, queue_size=QUEUE_SIZE, queue_timeout=QUEUE_TIMEOUT, rate=CLIENT_RATE,
+                 burst=CLIENT_BURST, max_clients=MAX_CLIENTS):
+        self.capacity = capacity
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self.in_flight = 0.0
+        self._condition = threading.Condition()
+        self._buckets = OrderedDict()
+        self._running = Counter()
+        # When each client last started a request, to break ties between waiters
+        self._served = OrderedDict()
+        self._waiting = []
+        self._sequence = itertools.count()
+        # Moving average of how long an admitted request runs, for Retry-After
+        self._hold_seconds = 1.0
+
+    @contextmanager
+    def admit(self, client, cost, route=None):
+        """Hold cost units of capacity for client while the block runs; raises Rejected instead."""
+        REQUEST_COST.observe(cost, route=route)
+        cost = min(cost, self.burst, self.capacity)
+        started = time.monotonic()
+        try:
+            with self._condition:
+                self._spend(client, cost)
+                try:
+                    self._acquire(client, cost)
+                except Rejected:
+                    self._refund(client, cost)
+                    raise
+        except Rejected as e:
+            DECISIONS.inc(route=route, outcome=e.reason)
+            logging.warning(f" Rejected {route} for client {client} ({e.reason}, cost {cost})")
+            raise
+        admitted = time.monotonic()
+        DECISIONS.inc(route=route, outcome="admitted")
+        WAIT_SECONDS.observe(admitted - started, route=route)
+        telemetry.record_stage("admission.wait", admitted - started)
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._release(client, cost, time.monotonic() - admitted)
+
+    def stats(self):
+        with self._condition:
+            return {"waiting": len(self._waiting), "in_flight": round(self.in_flight, 2), "capacity": self.capacity,
+                    "running_clients": len(self._running), "clients": len(self._buckets)}
+
+    def _spend(self, client, cost):
+        now = time.monotonic()
+        tokens, updated = self._buckets.pop(client, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        if tokens < cost:
+            self._remember(client, tokens, now)
+            raise Rejected("quota", max(1, math.ceil((cost - tokens) / self.rate)) if self.rate > 0 else 3600)
+        self._remember(client, tokens - cost, now)
+
+    def _refund(self, client, cost):
+        tokens, updated = self._buckets.get(client, (self.burst, time.monotonic()))
+        self._buckets[client] = (min(self.burst, tokens + cost), updated)
+
+    def _remember(self, client, tokens, now):
+        self._buckets[client] = (tokens, now)
+        while len(self._buckets) > self.max_clients:
+            self._buckets.popitem(last=False)
+
+    def _acquire(self, client, cost):
+        if not self._waiting and self.in_flight + cost <= self.capacity:
+            self._start(client, cost)
+            return
+        if len(self._waiting) >= self.queue_size:
+            self._make_room(client)
+        waiter = _Waiter(client, cost, next(self._sequence))
+        self._waiting.append(waiter)
+        self._grant()
+        deadline = time.monotonic() + self.queue_timeout
+        while not waiter.granted and waiter.rejected is None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self._waiting.remove(waiter)
+                # The head of the queue leaving may let the next one in
+                self._grant()
+                raise Rejected("timeout", self._retry_after())
+            self._condition.wait(remaining)
+        if waiter.rejected:
+            raise Rejected(waiter.rejected, self._retry_after())
+
+    def _make_room(self, client):
+        """Push out the newest waiter of the client holding most of the queue, or reject client."""
+        counts = Counter(waiter.client for waiter in self._waiting)
+        heaviest, held = counts.most_common(1)[0]
+        if held <= counts[client] + 1:
+            raise Rejected("queue_full", self._retry_after())
+        victim = next(waiter for waiter in reversed(self._waiting) if waiter.client == heaviest)
+        self._waiting.remove(victim)
+        victim.rejected = "queue_full"
+        self._condition.notify_all()
+
+    def _grant(self):
+        """Start waiters while they fit: the client with least running first, then the one served longest ago."""
+        granted = False
+        while self._waiting:
+            waiter = min(self._waiting, key=lambda w: (self._running[w.client], self._served.get(w.client, -1),
+                                                       w.sequence))
+            if self.in_flight + waiter.cost > self.capacity:
+                break
+            self._waiting.remove(waiter)
+            waiter.granted = True
+            self._start(waiter.client, waiter.cost)
+            granted = True
+        if granted:
+            self._condition.notify_all()
+
+    def _start(self, client, cost):
+        self.in_flight += cost
+        self._running[client] += cost
+        self._served.pop(client, None)
+        self._served[client] = next(self._sequence)
+        while len(self._served) > self.max_clients:
+            self._served.popitem(last=False)
+
+    def _release(self, client, cost, seconds):
+        self._running[client] -= cost
+        if self._running[client] <= 1e-9:
+            del self._running[client]
+        # Summing floats drifts; with nothing running the worker is exactly empty
+        self.in_flight = sum(self._running.values()) if self._running else 0.0
+        self._hold_seconds = 0.8 * self._hold_seconds + 0.2 * seconds
+        self._grant()
+
+    def _retry_after(self):
+        return max(1, math.ceil(self._hold_seconds))
@@ -0,0 +1,217 @@
+import os
+import re
+import base64
+import uuid
+import hashlib
+import logging
+from collections import deque
+
+# Azure allows at most 50,000 blocks per blob
+MAX_CHUNKS = 50000
+
+# Largest chunk accepted in one request
+MAX_CHUNK_BYTES = int(os.environ.get("UPLOAD_CHUNK_MAX_BYTES", str(16 * 1024 * 1024)))
+
+# upload ids are "<uuid4><ext>", the file_id the committed upload will get
+UPLOAD_ID_PATTERN = re.compile(r"^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}(\.[A-Za-z0-9]{1,10})?$")
+
+
+class ChunkError(ValueError):
+    """A chunk or commit request the server cannot accept."""
+
+
+def new_upload_id(original_filename):
+    """Upload id for a new upload, keeping the original file extension."""
+    upload_id = f"{uuid.uuid4()}{os.path.splitext(original_filename)[1]}"
+    if not UPLOAD_ID_PATTERN.match(upload_id):
+        raise ChunkError("Unsupported file extension.")
+    return upload_id
+
+
+def validate_upload_id(upload_id):
+    if not upload_id or not UPLOAD_ID_PATTERN.match(upload_id):
+        raise ChunkError("Invalid upload id.")
+    return upload_id
+
+
+def block_id(index, sha256_hex):
+    """Fixed-length block id carrying the chunk index and its checksum."""
+    return base64.b64encode(f"{index:05d}-{sha256_hex}".encode("ascii")).decode("ascii")
+
+
+def parse_block_id(encoded):
+    """Return (index, sha256_hex) for a block id made by block_id, or None."""
+    try:
+        index, sha256_hex = base64.b64decode(encoded).decode("ascii").split("-", 1)
+        return int(index), sha256_hex
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def verify_chunk(index, data, expected_sha256=None):
+    """Check bounds and checksum of one chunk and return its SHA-256."""
+    if not 0 <= index < MAX_CHUNKS:
+        raise ChunkError(f"Chunk index must be between 0 and {MAX_CHUNKS - 1}.")
+    if not data:
+        raise ChunkError("Chunk is empty.")
+    if len(data) > MAX_CHUNK_BYTES:
+        raise ChunkError(f"Chunk exceeds {MAX_CHUNK_BYTES} bytes.")
+    actual = hashlib.sha256(data).hexdigest()
+    if expected_sha256 and expected_sha256.lower() != actual:
+        raise ChunkError(f"Checksum mismatch for chunk {index}: expected {expected_sha256}, got {actual}.")
+    return actual
+
+
+def select_blocks(staged, chunk_sha256=None, chunk_count=None):
+    """Pick the ordered (index, sha256) list to commit from staged chunks.
+
+    staged maps index -> list of sha256 values staged for that index (a
+    resent chunk may have several). The client names its chunks either by
+    their checksums, which disambiguates resends, or just by count.
+    """
+    if chunk_sha256 is not None:
+        wanted = [(i, sha.lower()) for i, sha in enumerate(chunk_sha256)]
+        missing = [i for i, sha in wanted if sha not in staged.get(i, [])]
+    elif chunk_count is not None:
+        missing = [i for i in range(chunk_count) if i not in staged]
+        ambiguous = [i for i in range(chunk_count) if len(staged.get(i, [])) > 1]
+        if ambiguous:
+            raise ChunkError(f"Chunks {ambiguous} were staged more than once; commit with 'chunk_sha256'.")
+        wanted = [(i, staged[i][0]) for i in range(chunk_count) if i in staged]
+    else:
+        raise ChunkError("Provide 'chunk_sha256' or 'chunks' to commit.")
+    if not wanted:
+        raise ChunkError("Nothing to commit.")
+    if missing:
+        raise ChunkError(f"Missing chunks: {missing[:20]}{'...' if len(missing) > 20 else ''}")
+    return wanted
+
+
+class AzureChunkStore:
+    """Chunks staged as uncommitted blocks of the target blob, then committed as a block list."""
+
+    def __init__(self, blob_service_client, container):
+        self.blob_service_client = blob_service_client
+        self.container = container
+
+    def _blob(self, upload_id):
+        return self.blob_service_client.get_blob_client(container=self.container, blob=upload_id)
+
+    def put_chunk(self, upload_id, index, data, sha256_hex):
+        # validate_content adds a transport MD5 so corruption in flight is rejected by the service
+        self._blob(upload_id).stage_block(block_id(index, sha256_hex), data, length=len(data), validate_content=True)
+
+    def staged_chunks(self, upload_id):
+        """Return ({index: [sha256, ...]}, {(index, sha256): size}, committed)."""
+        from azure.core.exceptions import ResourceNotFoundError
+
+        try:
+            committed, uncommitted = self._blob(upload_id).get_block_list("all")
+        except ResourceNotFoundError:
+            return {}, {}, False
+        staged, sizes = {}, {}
+        for block in uncommitted:
+            parsed = parse_block_id(block.id)
+            if parsed:
+                staged.setdefault(parsed[0], []).append(parsed[1])
+                sizes[parsed] = block.size
+        return staged, sizes, bool(committed) and not uncommitted
+
+    def commit(self, upload_id, blocks, metadata=None):
+        """Commit blocks as the uploaded file; returns None, as the file's SHA-256 is not known here.
+
+        Staged blocks cannot be read and the service joins them, so hashing
+        would mean downloading the whole file again. The pipelines hash it
+        from the download they make anyway and record it then.
+        """
+        from azure.storage.blob import BlobBlock
+
+        self._blob(upload_id).commit_block_list([BlobBlock(block_id=block_id(i, sha)) for i, sha in blocks],
+                                                metadata=metadata)
+        return None
+
+
+class StorageChunkStore:
+    """Chunks as blobs of a staging container in any storage backend; commit concatenates them."""
+
+    def __init__(self, storage, container, staging_container="upload-staging"):
+        self.storage = storage
+        self.container = container
+        self.staging_container = staging_container
+
+    def put_chunk(self, upload_id, index, data, sha256_hex):
+        self.storage.put(self.staging_container, f"{upload_id}/{index:05d}-{sha256_hex}", data)
+
+    def staged_chunks(self, upload_id):
+        committed = self.storage.exists(self.container, upload_id)
+        staged, sizes = {}, {}
+        for info in self.storage.list(self.staging_container, f"{upload_id}/"):
+            index, sha256_hex = info.name.rsplit("/", 1)[1].split("-", 1)
+            staged.setdefault(int(index), []).append(sha256_hex)
+            sizes[(int(index), sha256_hex)] = info.size
+        return staged, sizes, committed and not staged
+
+    def commit(self, upload_id, blocks, metadata=None):
+        """Join blocks into the uploaded file and return its SHA-256, stored in its metadata like save_upload's."""
+        names = [f"{upload_id}/{index:05d}-{sha256_hex}" for index, sha256_hex in blocks]
+        reader = _ChunkReader(self.storage, self.staging_container, names)
+        self.storage.put(self.container, upload_id, reader, metadata=metadata)
+        # The chunks are hashed as they are copied, so the hash is only known once the file is in
+        file_hash = reader.digest.hexdigest()
+        self.storage.set_metadata(self.container, upload_id, {**(metadata or {}), "sha256": file_hash})
+        # Repeated chunks are left over too, so clear everything staged for the upload
+        self.storage.delete_many([(self.staging_container, info.name)
+                                  for info in self.storage.list(self.staging_container, f"{upload_id}/")])
+        return file_hash
+
+
+class _ChunkReader:
+    """File-like view of staged chunks read one at a time, so a commit never holds the whole file twice.
+
+    digest is the SHA-256 of everything read so far.
+    """
+
+    def __init__(self, storage, container, names):
+        self.storage = storage
+        self.container = container
+        self.names = deque(names)
+        self.buffer = bytearray()
+        self.offset = 0
+        self.digest = hashlib.sha256()
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = None
+        while self.names and (size is None or len(self.buffer) - self.offset < size):
+            # Drop what was read already before growing the buffer, so every byte is moved about once
+            del self.buffer[:self.offset]
+            self.offset = 0
+            data = self.storage.get(self.container, self.names.popleft()).data
+            self.digest.update(data)
+            self.buffer += data
+        end = len(self.buffer) if size is None else min(self.offset + size, len(self.buffer))
+        with memoryview(self.buffer) as view:
+            data = bytes(view[self.offset:end])
+        self.offset = end
+        return data
+
+
+def create_chunk_store(storage, container):
+    """Create the chunk store selected by UPLOAD_STAGING.
+
+    azure stages chunks as uncommitted blocks (Azure storage only); storage
+    keeps them as blobs of the configured storage and is the default for the
+    local and memory backends; local does the same on a LocalStorage under
+    LOCAL_UPLOAD_DIR.
+    """
+    default = "azure" if storage.backend == "azure" else "storage"
+    backend = os.environ.get("UPLOAD_STAGING", default).lower()
+    if backend == "local":
+        from .storage import LocalStorage
+
+        return StorageChunkStore(LocalStorage(os.environ.get("LOCAL_UPLOAD_DIR", "/tmp/chunked-uploads")), container)
+    if backend == "storage":
+        return StorageChunkStore(storage, container)
+    if backend != "azure":
+        logging.warning(f" Unknown UPLOAD_STAGING backend '{backend}', using azure")
+    return AzureChunkStore(storage.client, container)
@@ -0,0 +1,508 @@
+"""Streaming normalization of the CSV written by the image model and the PDF extractor.
+
+Rows are repaired one at a time as they pass through: markdown fences,
+blank lines and the prose around a table are dropped, markdown tables lose
+their pipes, and rows with the wrong number of fields are padded, trimmed or
+re-joined to the width of their table's header. Column types are inferred
+on the way (see outputformat.ColumnType). Everything done is counted in a
+QualityReport. Only the current table's header, per-column type state and
+the last few rows are kept, so memory does not grow with the number of rows.
+"""
+import io
+import os
+import re
+import csv
+import threading
+from collections import Counter, deque
+from . import telemetry
+from .outputformat import ColumnType
+
+# Single-field rows held back while looking for the header; more than this
+# and the first of them is the header of a one-column table
+PREAMBLE_ROWS = 5
+
+# Lines a quoted field may span before its opening quote is taken as a stray one
+MAX_RECORD_LINES = int(os.environ.get("CSV_MAX_RECORD_LINES", "20"))
+
+# Flagged rows kept as samples in a report
+MAX_SAMPLES = int(os.environ.get("CSV_QUALITY_SAMPLES", "20"))
+
+# A lone cell of at least this many words ending like a sentence is prose, not data
+PROSE_WORDS = 4
+
+# Rows remembered at the end of a table, to find the ones a strip repeats from the strip above
+MAX_OVERLAP_ROWS = 20
+
+# Issues that drop a line, that repair a row, and that only flag a row kept as it is, in report order
+DROPPED = ("fence", "separator", "prose", "blank", "repeated_header", "overlap")
+REPAIRED = ("markdown", "stray_quote", "padded", "trimmed", "merged_number", "folded")
+FLAGGED = ("suspect_prose", "before_header")
+
+ISSUES = telemetry.counter("csv_normalize_issues", "Lines dropped or rows repaired by the CSV normalizer, by issue.")
+
+_FENCE = re.compile(r"^```")
+_SEPARATOR = re.compile(r"^\|(\s*:?-{3,}:?\s*\|)+$")
+# "1,234" split into two fields by an unquoted thousands separator
+_THOUSANDS_HEAD = re.compile(r"^[+-]?[$€£₹]?\d{1,3}(,\d{3})*$")
+_THOUSANDS_TAIL = re.compile(r"^\d{3}(\.\d+)?$")
+
+
+class QualityReport:
+    """What normalization did to one output: counts by issue, sample rows and each table's columns.
+
+    A sample's row is counted within the text or table it came from.
+    """
+
+    def __init__(self):
+        self.issues = Counter()
+        self.samples = []
+        self.tables = []
+        self._lock = threading.Lock()
+
+    def flag(self, issue, row_number, row):
+        ISSUES.inc(issue=issue)
+        with self._lock:
+            self.issues[issue] += 1
+            if len(self.samples) < MAX_SAMPLES:
+                self.samples.append({"issue": issue, "row": row_number, "text": _preview(row)})
+
+    def merge(self, other):
+        """Add another report's counts and samples (not its tables) to this one."""
+        with self._lock:
+            self.issues.update(other.issues)
+            self.samples.extend(other.samples[:max(MAX_SAMPLES - len(self.samples), 0)])
+
+    def describe(self):
+        return ", ".join(f"{count} {issue}" for issue, count in self.issues.items()) or "clean"
+
+    def as_dict(self):
+        return {
+            "rows": sum(table.rows for table in self.tables),
+            "dropped": {issue: self.issues[issue] for issue in DROPPED if self.issues[issue]},
+            "repaired": {issue: self.issues[issue] for issue in REPAIRED if self.issues[issue]},
+            "flagged": {issue: self.issues[issue] for issue in FLAGGED if self.issues[issue]},
+            "samples": list(self.samples),
+            "tables": [table.summary() for table in self.tables],
+        }
+
+
+class TableNormalizer:
+    """Repairs the rows of one table to its header's width and infers the type of each column.
+
+    Rows that are too long lose trailing blank fields first, then numbers
+    split at a thousands separator are joined back, and whatever is still
+    left over is folded into the last column. Short rows are padded.
+    """
+
+    def __init__(self, header, report):
+        self.header = header
+        self.width = len(header)
+        self.report = report
+        self.rows = 0
+        self._types = [ColumnType() for _ in header]
+        report.tables.append(self)
+
+    def fix(self, cells, row_number):
+        """cells (already stripped) repaired to the header's width."""
+        if len(cells) > self.width:
+            cells = self._shorten(cells, row_number)
+        elif len(cells) < self.width:
+            self.report.flag("padded", row_number, cells)
+            cells += [""] * (self.width - len(cells))
+        self.rows += 1
+        return cells
+
+    def observe(self, rows):
+        """Account fixed rows in the column types, a column at a time."""
+        if rows:
+            for column, values in zip(self._types, zip(*rows)):
+                column.observe(values)
+
+    def _shorten(self, cells, row_number):
+        original = list(cells)
+        if not any(cells[self.width:]):
+            self.report.flag("trimmed", row_number, original)
+            return cells[:self.width]
+        merged = False
+        while len(cells) > self.width:
+            for i in range(len(cells) - 1):
+                if _THOUSANDS_HEAD.match(cells[i]) and _THOUSANDS_TAIL.match(cells[i + 1]):
+                    cells[i:i + 2] = [f"{cells[i]},{cells[i + 1]}"]
+                    merged = True
+                    break
+            else:
+                break
+        if merged:
+            self.report.flag("merged_number", row_number, original)
+        if len(cells) > self.width:
+            self.report.flag("folded", row_number, original)
+            cells = cells[:self.width - 1] + [",".join(cells[self.width - 1:])]
+        return cells
+
+    def summary(self):
+        return {"rows": self.rows,
+                "columns": [{"name": name, "type": column.name, "blank": column.blank}
+                            for name, column in zip(self.header, self._types)]}
+
+
+class CsvNormalizer:
+    """Turns model responses, fed one at a time with add(), into canonical tables written to a table sink.
+
+    sink has start_table(header) and write_rows(rows), like
+    tablestitch.TableFileSink. The header is the first row with two or more
+    fields that does not read as a sentence; up to PREAMBLE_ROWS rows before
+    it are the model's preamble. Preamble prose is dropped and rows that
+    look like data are kept under the header.
+
+    A blank line, a fence, a dropped line of prose or the start of another
+    response is a break. After a break a copy of the header is dropped, so
+    is a line that ends in a colon, or reads as a sentence and is not as
+    wide as the table. A row of two or more fields with another width
+    starts a new table; anything else carries on with the current one.
+    Inside a table, a line without a single delimiter that reads as a
+    sentence is taken for commentary and dropped, while a row with
+    delimiters that reads as one is kept and flagged. Call close() once
+    every response is added.
+    """
+
+    def __init__(self, sink, report=None):
+        self.sink = sink
+        self.report = report if report is not None else QualityReport()
+        self.table = None
+        self._header_key = None
+        self._preamble = []
+        self._row_number = 0
+        self._break = False
+        # Keys of the current table's last rows, and the first rows of a response held back to compare with them
+        self._tail = deque(maxlen=MAX_OVERLAP_ROWS)
+        self._head = []
+        self._head_size = 0
+        self._response_rows = 0
+
+    @property
+    def header(self):
+        return self.table.header if self.table else None
+
+    @property
+    def rows_written(self):
+        return sum(table.rows for table in self.report.tables)
+
+    def add(self, text, max_overlap_rows=0):
+        """Normalize one model response; returns how many table rows it held.
+
+        Up to max_overlap_rows of its first rows may repeat the last rows
+        written, as when the response is for a strip overlapping the strip
+        above; rows that do are dropped. Repeats further down are kept.
+        """
+        self._row_number = 0
+        self._response_rows = 0
+        self._break = self.table is not None
+        self._head_size = min(max_overlap_rows, len(self._tail)) if self.table is not None else 0
+        self.writerows(read_rows(io.StringIO(text or ""), self.report))
+        self._flush_head()
+        return self._response_rows
+
+    def writerow(self, row):
+        self._row_number += 1
+        cells, issue = _unmark(row)
+        if issue:
+            self.report.flag(issue, self._row_number, row if cells is None else cells)
+        if cells is None:
+            self._break = self.table is not None
+        elif self.table is None:
+            self._add_preamble(cells)
+        elif self._break:
+            self._resume(cells)
+        else:
+            self._write(cells, self._row_number)
+
+    def writerows(self, rows):
+        for row in rows:
+            self.writerow(row)
+
+    def close(self):
+        """Write anything still held back and return the report."""
+        self._flush_head()
+        if self.table is None and self._preamble:
+            self._flush_preamble()
+        return self.report
+
+    def _add_preamble(self, cells):
+        if not _is_header(cells):
+            self._preamble.append((self._row_number, cells))
+            if len(self._preamble) > PREAMBLE_ROWS:
+                self._flush_preamble()
+            return
+        held, self._preamble = self._preamble, []
+        self._start(cells)
+        for number, row in held:
+            if len(row) > 1 and not _reads_as_sentence(",".join(row)):
+                self.report.flag("before_header", number, row)
+                self._emit(row, number)
+            else:
+                self.report.flag("prose", number, row)
+
+    def _flush_preamble(self):
+        """No header turned up: the first held row heads a table of the rest."""
+        held, self._preamble = self._preamble, []
+        self._start(held[0][1])
+        for number, cells in held[1:]:
+            self._write(cells, number)
+
+    def _resume(self, cells):
+        """First row after a break: a repeated header, more prose, a new table or more of the current one."""
+        if _key(cells) == self._header_key:
+            self.report.flag("repeated_header", self._row_number, cells)
+            self._break = False
+        elif _is_prose_line(cells, self.table.width):
+            self.report.flag("prose", self._row_number, cells)
+        elif len(cells) != self.table.width and _is_header(cells):
+            self._flush_head()
+            self._start(cells)
+        else:
+            self._break = False
+            self._write(cells, self._row_number)
+
+    def _start(self, header):
+        self.table = TableNormalizer(header, self.report)
+        self._header_key = _key(header)
+        self._break = False
+        self._tail.clear()
+        self.sink.start_table(header)
+
+    def _write(self, cells, row_number):
+        if _key(cells) == self._header_key:
+            self.report.flag("repeated_header", row_number, cells)
+            return
+        if len(cells) == 1 and self.table.width > 1 and _reads_as_sentence(cells[0]):
+            self.report.flag("prose", row_number, cells)
+            self._break = True
+            return
+        if _is_prose(cells, self.table.width):
+            self.report.flag("suspect_prose", row_number, cells)
+        if len(self._head) < self._head_size:
+            self._head.append((row_number, cells))
+            if len(self._head) == self._head_size:
+                self._flush_head()
+        else:
+            self._emit(cells, row_number)
+
+    def _flush_head(self):
+        """Drop the longest run of held-back rows that repeats the end of the table, and write the rest."""
+        head, self._head, self._head_size = self._head, [], 0
+        if not head:
+            return
+        keys = [_row_key(cells) for _, cells in head]
+        tail = list(self._tail)
+        overlap = next((size for size in range(min(len(keys), len(tail)), 0, -1) if tail[-size:] == keys[:size]), 0)
+        self._response_rows += overlap
+        for number, cells in head[:overlap]:
+            self.report.flag("overlap", number, cells)
+        for number, cells in head[overlap:]:
+            self._emit(cells, number)
+
+    def _emit(self, cells, row_number):
+        self._response_rows += 1
+        self._tail.append(_row_key(cells))
+        cells = self.table.fix(cells, row_number)
+        self.table.observe((cells,))
+        self.sink.write_rows((cells,))
+
+
+class TableListSink:
+    """Keeps the tables written to it as (header, rows) pairs, for output small enough to hold (one page)."""
+
+    def __init__(self):
+        self.tables = []
+
+    def start_table(self, header):
+        self.tables.append((header, []))
+
+    def write_rows(self, rows):
+        self.tables[-1][1].extend(rows)
+
+
+class _TextSink:
+    """Tables as CSV text, a blank line between one table and the next."""
+
+    def __init__(self, output):
+        self.writer = csv.writer(output, lineterminator="\n")
+        self.tables = 0
+
+    def start_table(self, header):
+        if self.tables:
+            self.writer.writerow([])
+        self.tables += 1
+        self.writer.writerow(header)
+
+    def write_rows(self, rows):
+        self.writer.writerows(rows)
+
+
+class NormalizingTableSink:
+    """Wraps a tablestitch sink so each logical table's rows reach it repaired to its header's width."""
+
+    def __init__(self, sink, report):
+        self.sink = sink
+        self.report = report
+        self.table = None
+
+    def start_table(self, header):
+        header = [_cell(value) for value in header]
+        self.table = TableNormalizer(header, self.report)
+        self.sink.start_table(header)
+
+    def write_rows(self, rows):
+        fixed = []
+        for row in rows:
+            cells = [_cell(value) for value in row]
+            if any(cells):
+                fixed.append(self.table.fix(cells, self.table.rows + 1))
+            else:
+                self.report.flag("blank", self.table.rows + 1, cells)
+        self.table.observe(fixed)
+        self.sink.write_rows(fixed)
+
+
+def read_rows(lines, report=None, max_lines=MAX_RECORD_LINES):
+    """Yield the CSV records in an iterable of text lines, one at a time.
+
+    Like csv.reader, except that a quote still open after max_lines lines (or
+    at the end) is taken as a stray one: its line is split at every comma
+    and reading carries on from the next line, instead of the rest of the
+    text becoming a single field.
+    """
+    lines = iter(lines)
+    backlog = deque()
+    record = []
+    records = 0
+    while True:
+        line = backlog.popleft() if backlog else next(lines, None)
+        if line is None and not record:
+            return
+        if line is not None:
+            record.append(line)
+            if len(record) == 1 and '"' not in line:
+                for row in csv.reader(record):
+                    records += 1
+                    yield row
+                record = []
+                continue
+        try:
+            rows = list(csv.reader(record, strict=True))
+        except csv.Error as e:
+            if "unexpected end of data" not in str(e):
+                rows = list(csv.reader(record))
+            elif line is not None and len(record) < max_lines:
+                continue
+            else:
+                cells = [value.replace('"', "") for value in next(csv.reader(record[:1], quoting=csv.QUOTE_NONE), [])]
+                records += 1
+                if report is not None:
+                    report.flag("stray_quote", records, cells)
+                backlog.extendleft(reversed(record[1:]))
+                record = []
+                yield cells
+                continue
+        record = []
+        records += len(rows)
+        yield from rows
+
+
+@telemetry.span("csv.normalize")
+def normalize_text(text):
+    """Canonical CSV text for one model response, and its QualityReport.
+
+    Tables after the first follow a blank line, each with its own header.
+    """
+    output = io.StringIO()
+    normalizer = CsvNormalizer(_TextSink(output))
+    normalizer.add(text)
+    report = normalizer.close()
+    return output.getvalue().rstrip("\n"), report
+
+
+def header_line(text):
+    """The header CsvNormalizer would pick for one model response, as a CSV line ("" when there is none).
+
+    Nothing is flagged: this only reads ahead, e.g. to quote the header in
+    the prompt for the next strip.
+    """
+    held = []
+    for row in read_rows(io.StringIO(text or "")):
+        cells, _ = _unmark(row)
+        if cells is None:
+            continue
+        if _is_header(cells):
+            return _csv_line(cells)
+        held.append(cells)
+        if len(held) > PREAMBLE_ROWS:
+            break
+    return _csv_line(held[0]) if held else ""
+
+
+def _cell(value):
+    if isinstance(value, str):
+        return value.strip()
+    return "" if value is None else str(value).strip()
+
+
+def _key(cells):
+    return [value.lower() for value in cells]
+
+
+def _unmark(row):
+    """(cells of row with markdown undone, issue) where cells is None for a line that is not table data."""
+    cells = [_cell(value) for value in row]
+    filled = [value for value in cells if value]
+    if not filled:
+        return None, "blank"
+    if len(filled) == 1 and _FENCE.match(filled[0]):
+        return None, "fence"
+    line = ",".join(cells)
+    if len(line) > 1 and line.startswith("|") and line.endswith("|"):
+        if _SEPARATOR.match(line.replace(" ", "")):
+            return None, "separator"
+        return [value.strip() for value in line[1:-1].split("|")], "markdown"
+    return cells, None
+
+
+def _is_header(cells):
+    return sum(1 for value in cells if value) >= 2 and not _reads_as_sentence(",".join(cells))
+
+
+def _row_key(cells):
+    """cells compared case-insensitively, ignoring trailing blank fields."""
+    key = _key(cells)
+    while key and not key[-1]:
+        key.pop()
+    return key
+
+
+def _csv_line(cells):
+    output = io.StringIO()
+    csv.writer(output, lineterminator="").writerow(cells)
+    return output.getvalue()
+
+
+def _reads_as_sentence(text):
+    return text.endswith(":") or (len(text.split()) >= PROSE_WORDS and text[-1:] in (".", "!", "?"))
+
+
+def _is_prose(cells, width):
+    """True for a row whose only content, or that of a short row, reads as a sentence."""
+    filled = [value for value in cells if value]
+    if width < 2 or not cells[0] or (len(filled) > 1 and len(cells) >= width):
+        return False
+    return _reads_as_sentence(",".join(filled))
+
+
+def _is_prose_line(cells, width):
+    """True for a line after a break that introduces a table, or reads as a sentence and does not fit one."""
+    text = ",".join(value for value in cells if value)
+    return text.endswith(":") or ((len(cells) != width or width == 1) and _reads_as_sentence(text))
+
+
+def _preview(row, limit=80):
+    text = ",".join(_cell(value) for value in row)
+    return text if len(text) <= limit else text[:limit - 3] + "..."
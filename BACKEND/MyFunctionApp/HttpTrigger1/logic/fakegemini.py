@@ -0,0 +1,159 @@
+"""Local stand-in for the Gemini generateContent API.
+
+Point the shared client at it with GEMINI_BASE_URL=http://127.0.0.1:<port>
+to run the pipelines and measure throughput without network access:
+
+    python -m HttpTrigger1.logic.fakegemini --port 8765 --latency 0.3
+    python -m HttpTrigger1.logic.fakegemini --bench --requests 500 --concurrency 32
+"""
+import json
+import time
+import random
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_CSV = "Item,Quantity,Price\nWidget,2,9.99\nGadget,1,24.50\nGizmo,5,3.75"
+
+
+class FakeGeminiServer:
+    """Threaded HTTP server answering generateContent calls with canned text.
+
+    latency/jitter are in seconds; error_rate is the fraction of calls that
+    fail with one of error_statuses so retry behaviour can be exercised.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, jitter=0.0, error_rate=0.0,
+                 error_statuses=(429, 503), csv_text=DEFAULT_CSV):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_statuses = error_statuses
+        self.csv_text = csv_text
+        self.requests = 0
+        self._lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def respond(self, payload):
+        """Return (status, body) for one request payload."""
+        with self._lock:
+            self.requests += 1
+        delay = self.latency + random.uniform(0, self.jitter)
+        if delay:
+            time.sleep(delay)
+        if self.error_rate and random.random() < self.error_rate:
+            status = random.choice(self.error_statuses)
+            return status, {"error": {"code": status, "message": "fake transient error"}}
+
+        parts = payload.get("contents", [{}])[0].get("parts", [])
+        prompt = " ".join(part.get("text", "") for part in parts)
+        if "JSON" in prompt:
+            text = self._json_answer(prompt)
+        else:
+            text = self.csv_text
+        return 200, {"candidates": [{"content": {"parts": [{"text": text}]}}]}
+
+    def _json_answer(self, prompt):
+        # The matcher sends "Data: <csv>"; answer with its first column and value
+        lines = [line for line in prompt.replace("Data: ", "", 1).splitlines() if line.strip()]
+        header = lines[0].split(",") if lines else ["column"]
+        row = lines[1].split(",") if len(lines) > 1 else [""] * len(header)
+        column = header[1] if len(header) > 1 and header[0] == "" else header[0]
+        value = row[1] if len(row) > 1 and header[0] == "" else row[0]
+        return json.dumps({"column": column, "value": value})
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                try:
+                    payload = json.loads(self.rfile.read(length) or b"{}")
+                except ValueError:
+                    payload = {}
+                if ":generateContent" not in self.path:
+                    status, body = 404, {"error": {"code": 404, "message": "unknown method"}}
+                else:
+                    status, body = server.respond(payload)
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def run_benchmark(requests_count, concurrency, latency, error_rate):
+    """Drive the shared client against a fake server and print throughput."""
+    from .gemini import GeminiClient
+
+    with FakeGeminiServer(latency=latency, error_rate=error_rate) as server:
+        client = GeminiClient(api_key="fake", base_url=server.url, max_concurrency=concurrency,
+                              backoff_base=0.05, backoff_max=0.5)
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(lambda _: client.generate_text("Convert this table to CSV", "fake-model"),
+                              range(requests_count)))
+        elapsed = time.perf_counter() - started
+
+    stats = client.stats.snapshot()
+    print(f"{requests_count} calls in {elapsed:.2f}s -> {requests_count / elapsed:.1f} calls/s")
+    print(json.dumps(stats, indent=2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Gemini server")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--bench", action="store_true", help="Run a client throughput benchmark and exit")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+
+    if args.bench:
+        run_benchmark(args.requests, args.concurrency, args.latency, args.error_rate)
+        return
+
+    server = FakeGeminiServer(port=args.port, latency=args.latency, jitter=args.jitter, error_rate=args.error_rate)
+    print(f"Fake Gemini listening on {server.url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
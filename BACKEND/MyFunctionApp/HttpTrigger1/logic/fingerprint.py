@@ -0,0 +1,89 @@
+import hashlib
+import numpy as np
+import pandas as pd
+from .outputformat import ColumnType
+
+# Rows looked at when profiling; enough for stable frequencies on large files
+PROFILE_ROWS = 10000
+
+# Below this many rows, frequencies say little and confidence is scaled down
+MIN_CONFIDENT_ROWS = 5
+
+# dtype_profile character per inferred column type
+TYPE_KINDS = {"boolean": "b", "integer": "i", "float": "f", "string": "O", "empty": "-"}
+
+
+def column_signature(columns):
+    """Stable hash of the normalized column names, independent of order."""
+    names = sorted(str(c).strip().lower() for c in columns)
+    return hashlib.sha1("\x1f".join(names).encode("utf-8")).hexdigest()[:16]
+
+
+def dtype_profile(df):
+    """One character per column, in column_signature's name order, for the type its values infer to.
+
+    Types are inferred from the text of the values, as for Parquet output
+    (see outputformat.ColumnType), so frames read with dtype=str still tell
+    numbers from text.
+    """
+    kinds = []
+    for column in df.columns:
+        column_type = ColumnType()
+        column_type.observe(df[column].fillna("").astype(str).str.strip().tolist())
+        kinds.append((str(column).strip().lower(), TYPE_KINDS[column_type.name]))
+    return "".join(kind for _, kind in sorted(kinds))
+
+
+def analyze_frame(df):
+    """Find the column whose most common value dominates it, without a model call.
+
+    Returns a dict with the chosen column and value, a confidence in [0, 1],
+    the column-name signature and dtype profile (of the sample), which
+    MatchIndex uses to find files of the same shape. Confidence is the share of
+    non-empty cells holding the top value, discounted when another column is
+    almost as dominant (ambiguous) or when there are too few rows to tell.
+    """
+    sample = df.head(PROFILE_ROWS)
+    result = {
+        "column": None,
+        "value": None,
+        "confidence": 0.0,
+        "signature": column_signature(df.columns),
+        "dtypes": dtype_profile(sample),
+    }
+    if sample.empty or len(sample.columns) == 0:
+        return result
+
+    # Treat blank strings like missing values so they never win
+    values = sample.replace(r"^\s*$", np.nan, regex=True)
+    filled = values.notna().sum()
+
+    shares = {}
+    top_values = {}
+    for column in values.columns:
+        if filled[column] == 0:
+            continue
+        counts = values[column].value_counts(sort=True, dropna=True)
+        shares[column] = counts.iloc[0] / filled[column]
+        top_values[column] = counts.index[0]
+
+    if not shares:
+        return result
+
+    ranked = pd.Series(shares).sort_values(ascending=False, kind="stable")
+    best_column = ranked.index[0]
+    best_share = float(ranked.iloc[0])
+    runner_up = float(ranked.iloc[1]) if len(ranked) > 1 else 0.0
+
+    confidence = best_share
+    if best_share > 0 and runner_up >= best_share * 0.95:
+        # Two columns equally dominant: the "most common" pick is a coin toss
+        confidence *= 0.5
+    confidence *= min(1.0, len(sample) / MIN_CONFIDENT_ROWS)
+
+    result.update({
+        "column": str(best_column).strip(),
+        "value": str(top_values[best_column]).strip(),
+        "confidence": round(confidence, 4),
+    })
+    return result
@@ -0,0 +1,229 @@
+import os
+import time
+import random
+import asyncio
+import logging
+import threading
+from collections import deque
+import requests
+from requests.adapters import HTTPAdapter
+from . import telemetry
+
+DEFAULT_BASE_URL = "https://generativelanguage.googleapis.com"
+
+# Status codes worth another attempt: rate limiting and transient server errors
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+# Latency samples kept for percentiles
+LATENCY_WINDOW = 2048
+
+
+class GeminiError(RuntimeError):
+    """Raised when a Gemini call fails after all retries."""
+
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class TokenBucket:
+    """Blocking token bucket: rate tokens per second, up to capacity banked."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or max(1.0, rate))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=1.0):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class CallStats:
+    """Per-call latency and outcome counters for the client."""
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self._lock = threading.Lock()
+
+    def record(self, seconds, ok, retries):
+        with self._lock:
+            self.calls += 1
+            self.retries += retries
+            if not ok:
+                self.errors += 1
+            self._latencies.append(seconds)
+
+    def snapshot(self):
+        with self._lock:
+            latencies = sorted(self._latencies)
+            calls, errors, retries = self.calls, self.errors, self.retries
+
+        def percentile(p):
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000, 1)
+
+        return {
+            "calls": calls,
+            "errors": errors,
+            "retries": retries,
+            "latency_ms": {"p50": percentile(0.50), "p95": percentile(0.95), "p99": percentile(0.99)},
+        }
+
+
+class GeminiClient:
+    """Shared Gemini REST client.
+
+    Keeps a pooled keep-alive session, caps in-flight calls with a semaphore,
+    optionally rate-limits with a token bucket, and retries 429/5xx responses
+    with jittered exponential backoff. Callers get concurrency by calling it
+    from several threads; at most max_concurrency calls are in flight. The
+    a* methods only move one blocking call onto a thread for asyncio callers.
+    """
+
+    def __init__(self, api_key=None, base_url=None, max_concurrency=8, requests_per_second=None,
+                 burst=None, max_retries=4, backoff_base=0.5, backoff_max=20.0, timeout=60):
+        self.api_key = api_key
+        self.base_url = (base_url or DEFAULT_BASE_URL).rstrip("/")
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.stats = CallStats()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self.max_concurrency = max_concurrency
+        self._semaphore = threading.BoundedSemaphore(max_concurrency)
+        self._bucket = TokenBucket(requests_per_second, burst) if requests_per_second else None
+
+    @telemetry.span("gemini")
+    def generate_content(self, parts, model, api_version="v1beta", api_key=None):
+        """Send one generateContent request and return the first candidate's text."""
+        key = api_key or self.api_key
+        if not key:
+            raise ValueError("GEMINI_API_KEY environment variable is required")
+
+        url = f"{self.base_url}/{api_version}/models/{model}:generateContent"
+        payload = {"contents": [{"parts": parts}]}
+        headers = {"x-goog-api-key": key}
+
+        started = time.perf_counter()
+        attempt = 0
+        try:
+            while True:
+                if self._bucket:
+                    self._bucket.acquire()
+                with self._semaphore:
+                    try:
+                        response = self.session.post(url, json=payload, headers=headers, timeout=self.timeout)
+                        error = None
+                    except (requests.ConnectionError, requests.Timeout) as e:
+                        response, error = None, e
+
+                if response is not None and response.status_code not in RETRYABLE_STATUS:
+                    break
+                if attempt >= self.max_retries:
+                    if response is None:
+                        raise GeminiError(f"Gemini request failed: {error}") from error
+                    raise GeminiError(f"Gemini request failed with HTTP {response.status_code}: {response.text[:200]}",
+                                      response.status_code)
+                delay = self._backoff(attempt, response)
+                logging.warning(f" Gemini call retry {attempt + 1}/{self.max_retries} in {delay:.2f}s "
+                                f"({response.status_code if response is not None else error})")
+                time.sleep(delay)
+                attempt += 1
+
+            if not response.ok:
+                raise GeminiError(f"Gemini request failed with HTTP {response.status_code}: {response.text[:200]}",
+                                  response.status_code)
+            result = response.json()
+            candidates = result.get("candidates") or []
+            if not candidates:
+                raise GeminiError("No response generated from Gemini API")
+            text = candidates[0]["content"]["parts"][0]["text"]
+        except Exception:
+            self.stats.record(time.perf_counter() - started, False, attempt)
+            raise
+
+        self.stats.record(time.perf_counter() - started, True, attempt)
+        return text
+
+    def generate_text(self, prompt, model, api_version="v1beta", api_key=None):
+        """Text-only convenience wrapper around generate_content."""
+        return self.generate_content([{"text": prompt}], model, api_version, api_key)
+
+    async def agenerate_content(self, parts, model, api_version="v1beta", api_key=None):
+        """generate_content for asyncio callers, run with asyncio.to_thread; the same limits apply."""
+        return await asyncio.to_thread(self.generate_content, parts, model, api_version, api_key)
+
+    async def agenerate_text(self, prompt, model, api_version="v1beta", api_key=None):
+        return await asyncio.to_thread(self.generate_text, prompt, model, api_version, api_key)
+
+    def _backoff(self, attempt, response):
+        """Full-jitter exponential backoff, honouring Retry-After when sent."""
+        if response is not None:
+            retry_after = response.headers.get("Retry-After")
+            if retry_after:
+                try:
+                    return min(self.backoff_max, float(retry_after))
+                except ValueError:
+                    pass
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Return the process-wide client configured from GEMINI_* environment variables."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                rps = os.environ.get("GEMINI_RPS")
+                burst = os.environ.get("GEMINI_BURST")
+                _client = GeminiClient(
+                    api_key=os.environ.get("GEMINI_API_KEY"),
+                    base_url=os.environ.get("GEMINI_BASE_URL"),
+                    max_concurrency=int(os.environ.get("GEMINI_MAX_CONCURRENCY", "8")),
+                    requests_per_second=float(rps) if rps else None,
+                    burst=float(burst) if burst else None,
+                    max_retries=int(os.environ.get("GEMINI_MAX_RETRIES", "4")),
+                    timeout=float(os.environ.get("GEMINI_TIMEOUT", "60")),
+                )
+    return _client
+
+
+def _collect_stats():
+    """Call counters of the shared client for /api/metrics, once it exists."""
+    if _client is None:
+        return []
+    stats = _client.stats.snapshot()
+    return [
+        ("gemini_calls", "counter", "Gemini calls, including failed ones.", [({}, stats["calls"])]),
+        ("gemini_errors", "counter", "Gemini calls that failed after all retries.", [({}, stats["errors"])]),
+        ("gemini_retries", "counter", "Gemini attempts retried after 429/5xx or a connection error.",
+         [({}, stats["retries"])]),
+    ]
+
+
+telemetry.register_collector("gemini", _collect_stats)
@@ -0,0 +1,87 @@
+import re
+
+_RANGE = re.compile(r"^\s*bytes\s*=\s*(\d*)\s*-\s*(\d*)\s*$")
+
+
+class RangeNotSatisfiable(ValueError):
+    """The requested byte range lies outside the resource."""
+
+
+def parse_range(header):
+    """Parse a single-range Range header into (start, end, suffix_length).
+
+    end is inclusive or None for open ranges; suffix_length is set only for
+    "bytes=-N". Returns None for absent, malformed or multi-range headers,
+    which RFC 9110 lets a server answer with the full representation.
+    """
+    if not header:
+        return None
+    match = _RANGE.match(header)
+    if not match:
+        return None
+    start, end = match.groups()
+    if not start and not end:
+        return None
+    if not start:
+        return None, None, int(end)
+    start = int(start)
+    end = int(end) if end else None
+    if end is not None and end < start:
+        return None
+    return start, end, None
+
+
+def resolve_range(parsed, size):
+    """Turn a parsed range into (offset, length) for a resource of size bytes."""
+    start, end, suffix = parsed
+    if suffix is not None:
+        if suffix == 0 or size == 0:
+            raise RangeNotSatisfiable()
+        length = min(suffix, size)
+        return size - length, length
+    if start >= size:
+        raise RangeNotSatisfiable()
+    last = size - 1 if end is None else min(end, size - 1)
+    return start, last - start + 1
+
+
+def etag_list(header):
+    """Entity tags from an If-None-Match header, weak prefixes dropped."""
+    if not header:
+        return []
+    return [tag.strip()[2:] if tag.strip().startswith("W/") else tag.strip() for tag in header.split(",")]
+
+
+def etag_matches(header, etag):
+    """True when an If-None-Match header matches etag (or is "*"), by weak comparison."""
+    tags = etag_list(header)
+    return "*" in tags or (etag is not None and _quote(etag) in [_quote(t) for t in tags])
+
+
+def strong_etag(header):
+    """The entity tag of an If-Range header if it is a strong one, else None.
+
+    RFC 9110 13.1.5 only lets a strong validator satisfy If-Range, so weak
+    tags and HTTP-dates come back as None and the client gets the full file.
+    """
+    tag = (header or "").strip()
+    return tag if len(tag) > 1 and tag.startswith('"') and tag.endswith('"') else None
+
+
+def strong_matches(header, etag):
+    """True when an If-Range header holds a strong entity tag equal to etag."""
+    tag = strong_etag(header)
+    return tag is not None and etag is not None and not etag.startswith("W/") and tag == _quote(etag)
+
+
+def _quote(tag):
+    tag = tag.strip()
+    return tag if tag.startswith('"') else f'"{tag}"'
+
+
+def content_range_total(content_range):
+    """Total size from a "bytes a-b/total" Content-Range value, or None."""
+    if not content_range or "/" not in content_range:
+        return None
+    total = content_range.rsplit("/", 1)[1]
+    return int(total) if total.isdigit() else None
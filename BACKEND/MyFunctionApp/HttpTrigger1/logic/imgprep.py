@@ -0,0 +1,213 @@
+import io
+import os
+import logging
+import zipfile
+from PIL import Image, ImageOps
+from .telemetry import span
+
+# Longest side (or width, for tiled images) sent to the model
+MAX_SIDE = int(os.environ.get("IMAGE_MAX_SIDE", "2048"))
+
+# JPEG quality used when an image has to be re-encoded
+JPEG_QUALITY = int(os.environ.get("IMAGE_JPEG_QUALITY", "85"))
+
+# Images taller than this many widths are cut into overlapping strips
+TILE_ASPECT = float(os.environ.get("IMAGE_TILE_ASPECT", "2.5"))
+
+# Fraction of a strip repeated at the top of the next one, so no row is cut in half
+TILE_OVERLAP = float(os.environ.get("IMAGE_TILE_OVERLAP", "0.1"))
+
+# Supported, unrotated images at most this size are sent untouched
+PASSTHROUGH_BYTES = int(os.environ.get("IMAGE_PASSTHROUGH_BYTES", str(1536 * 1024)))
+
+# Archive entries treated as pages
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".tif", ".tiff", ".gif", ".bmp"}
+
+# Archive entries whose frames are pages; any other entry is one page, so counting never opens it
+MULTI_PAGE_EXTENSIONS = {".tif", ".tiff", ".gif", ".webp"}
+
+# EXIF tag holding the camera orientation
+EXIF_ORIENTATION = 0x0112
+
+# Formats Gemini accepts inline, by PIL format name
+MIME_TYPES = {
+    "JPEG": "image/jpeg",
+    "PNG": "image/png",
+    "WEBP": "image/webp",
+}
+
+
+class PreparedImage:
+    """Encoded image bytes ready to send, with their real MIME type.
+
+    overlap is how many pixel rows at the top of a strip repeat the bottom of
+    the strip above it.
+    """
+
+    def __init__(self, data, mime_type, width, height, overlap=0):
+        self.data = data
+        self.mime_type = mime_type
+        self.width = width
+        self.height = height
+        self.overlap = overlap
+
+    def __repr__(self):
+        return f"PreparedImage({self.mime_type}, {self.width}x{self.height}, {len(self.data)} bytes)"
+
+
+def prepare_image(raw_bytes):
+    """Turn an uploaded image into one or more model-ready strips.
+
+    Detects the real format, applies EXIF orientation, downscales to MAX_SIDE
+    and re-encodes as JPEG at JPEG_QUALITY. Small supported images that need
+    none of that are passed through. Very tall images come back as several
+    overlapping strips, top to bottom.
+    """
+    try:
+        image = Image.open(io.BytesIO(raw_bytes))
+        image_format = image.format
+        image.load()
+    except Exception as e:
+        logging.warning(f" Could not decode image ({e}); sending it unchanged")
+        return [PreparedImage(raw_bytes, "image/jpeg", None, None)]
+
+    return prepare_frame(image, image_format, raw_bytes)
+
+
+@span("image.prepare")
+def prepare_frame(image, image_format=None, raw_bytes=None):
+    """prepare_image for an already decoded PIL image (e.g. one TIFF frame)."""
+    rotated = image.getexif().get(EXIF_ORIENTATION, 1) != 1
+    if rotated:
+        image = ImageOps.exif_transpose(image)
+    width, height = image.size
+
+    tall = height > width * TILE_ASPECT
+    if (raw_bytes is not None and not rotated and not tall and image_format in MIME_TYPES
+            and max(width, height) <= MAX_SIDE and len(raw_bytes) <= PASSTHROUGH_BYTES):
+        return [PreparedImage(raw_bytes, MIME_TYPES[image_format], width, height)]
+
+    image = _flatten(image)
+    if tall:
+        # Keep the text legible: limit the width only, then cut the height into strips
+        scale = min(1.0, MAX_SIDE / width)
+    else:
+        scale = min(1.0, MAX_SIDE / max(width, height))
+    if scale < 1.0:
+        image = image.resize((max(1, round(width * scale)), max(1, round(height * scale))), Image.LANCZOS)
+
+    strips = tile_image(image) if tall else [(image, 0)]
+    prepared = [_encode_jpeg(strip, overlap) for strip, overlap in strips]
+    logging.info(f" Prepared image {width}x{height} -> {len(prepared)} part(s), "
+                 f"{sum(len(p.data) for p in prepared)} bytes")
+    return prepared
+
+
+def tile_image(image):
+    """Cut a tall image into overlapping strips about MAX_SIDE high, as (strip, overlap in pixels) pairs."""
+    width, height = image.size
+    strip_height = max(1, min(MAX_SIDE, int(width * TILE_ASPECT)))
+    overlap = int(strip_height * TILE_OVERLAP)
+    step = max(1, strip_height - overlap)
+
+    strips = []
+    top = 0
+    previous_bottom = 0
+    while True:
+        bottom = min(height, top + strip_height)
+        strips.append((image.crop((0, top, width, bottom)), max(0, previous_bottom - top)))
+        if bottom >= height:
+            break
+        previous_bottom = bottom
+        top += step
+    return strips
+
+
+def _flatten(image):
+    """RGB copy of image; transparency is composited onto white."""
+    if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.split()[-1])
+        return background
+    if image.mode != "RGB":
+        return image.convert("RGB")
+    return image
+
+
+def _encode_jpeg(image, overlap=0):
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=JPEG_QUALITY, optimize=True)
+    return PreparedImage(buffer.getvalue(), "image/jpeg", image.width, image.height, overlap)
+
+
+def iter_pages(raw_bytes, multi_page=True):
+    """Yield the prepared strips of each page of a document, in page order.
+
+    Zip archives yield their image entries sorted by name, multi-frame images
+    (TIFF faxes, animated GIF/WebP) yield one page per frame, anything else is
+    a single page. In an archive, only MULTI_PAGE_EXTENSIONS entries are
+    split into frames. Entries and frames are decoded only when the generator
+    is advanced, so a caller consuming a bounded window holds that many pages.
+    """
+    if zipfile.is_zipfile(io.BytesIO(raw_bytes)):
+        with zipfile.ZipFile(io.BytesIO(raw_bytes)) as archive:
+            names = sorted(info.filename for info in archive.infolist() if _is_image_entry(info))
+            logging.info(f" Archive with {len(names)} images")
+            for name in names:
+                yield from iter_pages(archive.read(name), _is_multi_page_entry(name))
+        return
+
+    try:
+        image = Image.open(io.BytesIO(raw_bytes))
+        frame_count = getattr(image, "n_frames", 1) if multi_page else 1
+    except Exception:
+        frame_count = 1
+    if frame_count <= 1:
+        yield prepare_image(raw_bytes)
+        return
+
+    logging.info(f" Multi-frame {image.format} with {frame_count} pages")
+    for index in range(frame_count):
+        image.seek(index)
+        # copy() decodes just this frame; the file is re-read for the next one
+        yield prepare_frame(image.copy())
+
+
+def page_count(raw_bytes):
+    """Number of pages iter_pages will yield, without decoding any of them.
+
+    An archive is counted from its directory; only its multi-page entries
+    are opened, and only as far as their frame count.
+    """
+    if zipfile.is_zipfile(io.BytesIO(raw_bytes)):
+        with zipfile.ZipFile(io.BytesIO(raw_bytes)) as archive:
+            pages = 0
+            for info in archive.infolist():
+                if not _is_image_entry(info):
+                    continue
+                if not _is_multi_page_entry(info.filename):
+                    pages += 1
+                    continue
+                with archive.open(info) as entry:
+                    pages += _frame_count(entry)
+            return pages
+    return _frame_count(io.BytesIO(raw_bytes))
+
+
+def _frame_count(source):
+    try:
+        with Image.open(source) as image:
+            return getattr(image, "n_frames", 1)
+    except Exception:
+        return 1
+
+
+def _is_image_entry(info):
+    name = os.path.basename(info.filename)
+    return (not info.is_dir() and not name.startswith(".") and "__MACOSX" not in info.filename
+            and os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS)
+
+
+def _is_multi_page_entry(filename):
+    return os.path.splitext(filename)[1].lower() in MULTI_PAGE_EXTENSIONS
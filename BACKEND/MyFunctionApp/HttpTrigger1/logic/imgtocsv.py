@@ -2,10 +2,35 @@
 import os
 import logging
 import base64
-import requests
+import math
 from dotenv import load_dotenv
 from PIL import Image
 import io
+from .streams import is_path, read_source
+from .gemini import get_client, GeminiError
+from .imgprep import iter_pages, page_count
+from .parallel import ordered_map
+from .tablestitch import TableFileSink
+from . import csvnormalize, telemetry
+from concurrent.futures import ThreadPoolExecutor
+
+# Bump whenever a change alters the CSV produced for the same input,
+# so cached results from older versions are not served.
+PIPELINE_VERSION = "5"
+
+IMAGE_MODEL = "gemini-1.5-flash"
+
+# Strips of a tall image converted at once
+TILE_WORKERS = int(os.environ.get("IMAGE_TILE_WORKERS", "4"))
+
+# Pages of a multi-page TIFF or zip converted at once (each may use TILE_WORKERS more)
+PAGE_WORKERS = int(os.environ.get("IMAGE_PAGE_WORKERS", "4"))
+
+CONTINUATION_PROMPT = ("This image is a horizontal strip from the middle of a taller table whose CSV header is:\n"
+                       "{header}\n"
+                       "Convert the rows visible in this strip to CSV with exactly those columns. "
+                       "Start with the header line, then the rows. Only output the raw CSV data "
+                       "without any markdown formatting or additional text.")
 
 def initialize_gemini_model():
     """Initialize the Gemini API key from environment variables"""
@@ -21,49 +46,35 @@ def initialize_gemini_model():
         raise
 
 def load_image_data(image_path):
-    """Load image data from file path and encode as base64"""
-    if not os.path.exists(image_path):
+    """Load image data from a file path, bytes or file-like and encode as base64"""
+    if is_path(image_path) and not os.path.exists(image_path):
         logging.error(f" Image file not found at {image_path}")
         raise FileNotFoundError(f"Image file not found at {image_path}")
     
     try:
-        with open(image_path, "rb") as image_file:
-            return base64.b64encode(image_file.read()).decode('utf-8')
+        return base64.b64encode(read_source(image_path)).decode('utf-8')
     except Exception as e:
         logging.error(f" Failed to read image file: {str(e)}")
         raise
 
-def generate_csv_from_image(api_key, image_data, prompt=None):
-    """Generate CSV data from image using Gemini REST API"""
+def generate_csv_from_image(api_key, image_data, prompt=None, mime_type="image/jpeg"):
+    """Generate CSV data from image using the shared Gemini client"""
     default_prompt = "Convert this image table to CSV format. Only output the raw CSV data without any markdown formatting or additional text."
     
-    url = f"https://generativelanguage.googleapis.com/v1/models/gemini-1.5-flash:generateContent?key={api_key}"
-    
-    payload = {
-        "contents": [{
-            "parts": [
-                {"text": prompt or default_prompt},
-                {
-                    "inline_data": {
-                        "mime_type": "image/jpeg",
-                        "data": image_data
-                    }
-                }
-            ]
-        }]
-    }
+    parts = [
+        {"text": prompt or default_prompt},
+        {
+            "inline_data": {
+                "mime_type": mime_type,
+                "data": image_data
+            }
+        }
+    ]
     
     try:
-        response = requests.post(url, json=payload, timeout=60)
-        response.raise_for_status()
-        result = response.json()
-        
-        if 'candidates' in result and len(result['candidates']) > 0:
-            text = result['candidates'][0]['content']['parts'][0]['text']
-            return validate_and_clean_response(text)
-        else:
-            raise ValueError("No response generated from Gemini API")
-    except requests.exceptions.RequestException as e:
+        text = get_client().generate_content(parts, IMAGE_MODEL, api_version="v1", api_key=api_key)
+        return validate_and_clean_response(text)
+    except GeminiError as e:
         logging.error(f" Gemini API Request Error: {str(e)}")
         raise RuntimeError(f"Failed to process image: {str(e)}") from e
     except Exception as e:
@@ -71,43 +82,137 @@ def generate_csv_from_image(api_key, image_data, prompt=None):
         raise RuntimeError(f"Failed to process image: {str(e)}") from e
 
 def validate_and_clean_response(raw_response):
-    """Validate and clean the API response"""
+    """Validate the API response; it is cleaned up once, when written (see write_parts)"""
     if not raw_response:
         logging.error(" Empty response from API")
         raise ValueError("Empty response from API")
     
-    cleaned = raw_response.replace("```csv", "").replace("```", "").strip()
-    logging.info(f" Successfully processed response ({len(cleaned)} chars)")
-    return cleaned
+    logging.info(f" Successfully processed response ({len(raw_response)} chars)")
+    return raw_response
 
-def save_output(data, output_path):
-    """Save CSV data to output file"""
+def save_output(data, output_path, quality=None, output_format="csv"):
+    """Save CSV data to an output file path or file-like, normalized on the way into quality"""
     if not data:
         logging.error(" No data to save")
         raise ValueError("No data to save")
     
     try:
-        os.makedirs(os.path.dirname(output_path), exist_ok=True)
-        with open(output_path, "w") as file:
-            file.write(data)
-        logging.info(f" Saved output to {output_path}")
+        with TableFileSink(output_path, output_format) as sink:
+            normalizer = csvnormalize.CsvNormalizer(sink, quality)
+            normalizer.add(data)
+            normalizer.close()
+        logging.info(f" Saved output to {output_path if is_path(output_path) else 'stream'}")
         return output_path
     except Exception as e:
         logging.error(f" Failed to save output: {str(e)}")
         raise
 
-def image_to_csv_pipeline(image_path, output_path="output.csv"):
-    """Main pipeline to convert image to CSV"""
-    logging.info(f" Starting image to CSV conversion: {image_path} -> {output_path}")
+def image_to_csv_pipeline(image_path, output_path="output.csv", progress=None, report=None, output_format="csv"):
+    """Main pipeline to convert image to CSV
+
+    image_path may be a path, bytes or a binary file-like; output_path may be
+    a path or a file-like, so the pipeline can run without touching disk.
+    Multi-page TIFFs and zip archives of images become one CSV, pages in order.
+    The output is written in output_format; when the model's output holds
+    more than one table it becomes a zip with one file per table (see
+    tablestitch.TableFileSink). report, if given, receives the CSV quality
+    report (see csvnormalize) under "quality" and whether the output is a
+    zip under "archive".
+    """
+    if is_path(image_path):
+        logging.info(f" Starting image to CSV conversion: {image_path} -> {output_path}")
+    else:
+        logging.info(" Starting in-memory image to CSV conversion")
     try:
         api_key = initialize_gemini_model()
-        image_data = load_image_data(image_path)
-        csv_data = generate_csv_from_image(api_key, image_data)
-        return save_output(csv_data, output_path)
+        if is_path(image_path) and not os.path.exists(image_path):
+            raise FileNotFoundError(f"Image file not found at {image_path}")
+        raw_bytes = read_source(image_path)
+        pages = page_count(raw_bytes)
+        if pages == 0:
+            raise ValueError("Archive contains no images")
+        quality = csvnormalize.QualityReport()
+        with TableFileSink(output_path, output_format) as sink:
+            normalizer = csvnormalize.CsvNormalizer(sink, quality)
+            if pages > 1:
+                convert_pages(api_key, raw_bytes, normalizer, pages, progress)
+            else:
+                parts = next(iter_pages(raw_bytes))
+                write_parts(normalizer, parts, convert_prepared_parts(api_key, parts))
+                if progress:
+                    progress(1, 1)
+            normalizer.close()
+            if normalizer.table is None:
+                logging.error(" No data to save")
+                raise ValueError("No data to save")
+        logging.info(f" CSV normalization: {quality.describe()}")
+        if report is not None:
+            report["quality"] = quality.as_dict()
+            report["archive"] = sink.archived
+        return output_path
     except Exception as e:
         logging.error(f" Pipeline failed: {str(e)}")
         raise
 
+def convert_pages(api_key, raw_bytes, normalizer, pages, progress=None):
+    """Convert every page of a multi-page document and stream them into normalizer
+
+    At most PAGE_WORKERS pages are decoded or in flight at once; each page's
+    CSV is written as soon as the pages before it are done.
+    """
+    pages_done = 0
+    with ThreadPoolExecutor(max_workers=PAGE_WORKERS) as executor:
+        convert = telemetry.bind(lambda parts: (parts, convert_prepared_parts(api_key, parts)))
+        for parts, texts in ordered_map(executor, convert, iter_pages(raw_bytes), max_in_flight=PAGE_WORKERS):
+            write_parts(normalizer, parts, texts)
+            pages_done += 1
+            if progress:
+                progress(pages_done, pages)
+    logging.info(f" Converted {pages_done} pages, {normalizer.rows_written} rows")
+
+def convert_prepared_parts(api_key, parts):
+    """Convert prepared image strips to CSV texts, one per strip (see write_parts)
+
+    The first strip is converted on its own to learn the header; the rest run
+    in parallel with that header in the prompt.
+    """
+    first = parts[0]
+    first_csv = generate_csv_from_image(api_key, base64.b64encode(first.data).decode('utf-8'),
+                                        mime_type=first.mime_type)
+    if len(parts) == 1:
+        return [first_csv]
+
+    prompt = CONTINUATION_PROMPT.format(header=csvnormalize.header_line(first_csv))
+    logging.info(f" Converting {len(parts) - 1} more strips in parallel")
+    with ThreadPoolExecutor(max_workers=min(TILE_WORKERS, len(parts) - 1)) as executor:
+        rest = list(executor.map(telemetry.bind(
+            lambda part: generate_csv_from_image(api_key, base64.b64encode(part.data).decode('utf-8'),
+                                                 prompt=prompt, mime_type=part.mime_type)),
+            parts[1:]))
+    return [first_csv] + rest
+
+def write_parts(normalizer, parts, texts):
+    """Normalize one page's strip texts into normalizer, top to bottom
+
+    A strip after the first may start with rows the strip above ended with
+    (the strips overlap); those are dropped, but only within the rows that
+    fit in the overlap (see overlap_rows).
+    """
+    rows = 0
+    for index, text in enumerate(texts):
+        band = overlap_rows(parts[index - 1], parts[index], rows) if index else 0
+        rows = normalizer.add(text, max_overlap_rows=band)
+
+def overlap_rows(above, strip, rows):
+    """How many rows of strip can repeat the strip above, which held rows rows
+
+    Rows are taken to be evenly spaced over the strip above; one more is
+    allowed for a row cut by the edge of the overlap.
+    """
+    if not rows or not strip.overlap or not above.height:
+        return 0
+    return min(csvnormalize.MAX_OVERLAP_ROWS, math.ceil(rows * strip.overlap / above.height) + 1)
+
 if __name__ == "__main__":
     logging.basicConfig(level=logging.INFO)
     try:
@@ -0,0 +1,206 @@
+import os
+import json
+import time
+import uuid
+import queue
+import logging
+import threading
+from datetime import datetime, timezone
+from . import telemetry
+
+# Job states, in the order a job moves through them
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+# Progress writes closer together than this are coalesced
+PROGRESS_INTERVAL_SECONDS = 1.0
+
+JOB_OUTCOMES = telemetry.counter("job_attempts", "Job attempts by pipeline and resulting status.")
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat()
+
+
+def new_job(file_id, pipeline, options=None):
+    """Build the initial record for a conversion job."""
+    return {
+        "job_id": str(uuid.uuid4()),
+        "file_id": file_id,
+        "pipeline": pipeline,
+        "options": options or {},
+        "status": QUEUED,
+        "progress": {"done": 0, "total": None},
+        "output_filename": None,
+        "error": None,
+        "attempts": 0,
+        "created_at": _now(),
+        "updated_at": _now(),
+    }
+
+
+class MemoryJobStore:
+    """Job records kept in process memory; for local runs and tests."""
+
+    def __init__(self):
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def save(self, job):
+        job["updated_at"] = _now()
+        with self._lock:
+            self._jobs[job["job_id"]] = json.loads(json.dumps(job))
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return json.loads(json.dumps(job)) if job else None
+
+
+class BlobJobStore:
+    """One JSON blob per job so every function instance sees the same status."""
+
+    def __init__(self, storage, container="jobs"):
+        self.storage = storage
+        self.container = container
+
+    def save(self, job):
+        job["updated_at"] = _now()
+        self.storage.put(self.container, f"{job['job_id']}.json", json.dumps(job).encode("utf-8"),
+                         content_type="application/json")
+
+    def get(self, job_id):
+        try:
+            return json.loads(bytes(self.storage.get(self.container, f"{job_id}.json").data))
+        except Exception:
+            return None
+
+
+class LocalJobQueue:
+    """In-process queue drained by daemon threads; stands in for Storage Queues."""
+
+    def __init__(self, handler, workers=2):
+        self.handler = handler
+        self._queue = queue.Queue()
+        self._threads = []
+        for index in range(workers):
+            thread = threading.Thread(target=self._drain, name=f"job-worker-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def send(self, message):
+        self._queue.put(message)
+
+    def depth(self):
+        return self._queue.qsize()
+
+    def join(self):
+        """Block until every queued message has been handled."""
+        self._queue.join()
+
+    def _drain(self):
+        while True:
+            message = self._queue.get()
+            try:
+                self.handler(message, attempt=1, final_attempt=True)
+            except Exception as e:
+                logging.error(f" Job worker error: {e}")
+            finally:
+                self._queue.task_done()
+
+
+class AzureJobQueue:
+    """Azure Storage Queue; messages are picked up by the queue-triggered function."""
+
+    def __init__(self, connection_string, queue_name):
+        from azure.storage.queue import QueueClient, TextBase64EncodePolicy
+
+        # The Functions queue trigger expects base64 encoded messages
+        self.queue_client = QueueClient.from_connection_string(
+            connection_string, queue_name, message_encode_policy=TextBase64EncodePolicy())
+        try:
+            self.queue_client.create_queue()
+        except Exception:
+            # Queue already exists
+            pass
+
+    def send(self, message):
+        self.queue_client.send_message(json.dumps(message))
+
+    def depth(self):
+        return self.queue_client.get_queue_properties().approximate_message_count
+
+
+class JobProgress:
+    """Progress callback that writes pages done/total to the job store, throttled."""
+
+    def __init__(self, store, job):
+        self.store = store
+        self.job = job
+        self._last_write = 0.0
+
+    def __call__(self, done, total):
+        self.job["progress"] = {"done": done, "total": total}
+        now = time.monotonic()
+        if done == total or now - self._last_write >= PROGRESS_INTERVAL_SECONDS:
+            self._last_write = now
+            self.store.save(self.job)
+
+
+def run_job(store, job_id, run_pipeline, attempt=1, final_attempt=True):
+    """Run one queued job through run_pipeline and record the outcome.
+
+    run_pipeline(file_id, pipeline, options, progress) must return the output
+    blob name. Failures are re-raised unless this is the final attempt, so the
+    queue can redeliver the message.
+    """
+    job = store.get(job_id)
+    if job is None:
+        logging.error(f" Job {job_id} not found")
+        return None
+    if job["status"] == SUCCEEDED:
+        # Duplicate delivery of a finished job
+        return job
+
+    job["status"] = RUNNING
+    job["attempts"] = attempt
+    job["error"] = None
+    store.save(job)
+
+    try:
+        output_filename = run_pipeline(job["file_id"], job["pipeline"], job["options"], JobProgress(store, job))
+    except FileNotFoundError as e:
+        # Retrying will not make a missing upload appear
+        job["status"] = FAILED
+        job["error"] = str(e)
+        store.save(job)
+        JOB_OUTCOMES.inc(pipeline=job["pipeline"], status=FAILED)
+        return job
+    except Exception as e:
+        logging.error(f" Job {job_id} attempt {attempt} failed: {e}")
+        job["status"] = FAILED if final_attempt else QUEUED
+        job["error"] = str(e)
+        store.save(job)
+        JOB_OUTCOMES.inc(pipeline=job["pipeline"], status=job["status"])
+        if not final_attempt:
+            raise
+        return job
+
+    job["status"] = SUCCEEDED
+    job["output_filename"] = output_filename
+    store.save(job)
+    JOB_OUTCOMES.inc(pipeline=job["pipeline"], status=SUCCEEDED)
+    logging.info(f" Job {job_id} finished: {output_filename}")
+    return job
+
+
+def create_job_backend(handler, storage=None, connection_string=None, queue_name="conversion-jobs"):
+    """Create the (store, queue) pair selected by JOB_QUEUE (azure or local)."""
+    backend = os.environ.get("JOB_QUEUE", "azure").lower()
+    if backend == "local":
+        return MemoryJobStore(), LocalJobQueue(handler, int(os.environ.get("JOB_WORKERS", "2")))
+    if backend != "azure":
+        logging.warning(f" Unknown JOB_QUEUE backend '{backend}', using azure")
+    return BlobJobStore(storage), AzureJobQueue(connection_string, queue_name)
@@ -0,0 +1,142 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+
+
+def normalize_column(name):
+    """Key used to match columns across files: trimmed and case-insensitive."""
+    return str(name).strip().lower()
+
+
+class MatchIndex:
+    """SQLite-backed catalogue of analyzed CSVs, indexed by normalized column and column-name signature.
+
+    Replaces rewriting matches.json on every insert: upserts touch one row and
+    match lookups use the indexes instead of scanning every entry. WAL
+    mode plus a busy timeout lets several function instances share one file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=30000")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS analyses ("
+            " filename TEXT PRIMARY KEY,"
+            " column_name TEXT NOT NULL,"
+            " column_key TEXT NOT NULL,"
+            " value TEXT NOT NULL,"
+            " updated_at REAL NOT NULL,"
+            " signature TEXT,"
+            " dtypes TEXT)"
+        )
+        # Indexes written before signatures were kept
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(analyses)")}
+        for name in ("signature", "dtypes"):
+            if name not in columns:
+                self._conn.execute(f"ALTER TABLE analyses ADD COLUMN {name} TEXT")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS analyses_column_key ON analyses (column_key)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS analyses_signature ON analyses (signature)")
+
+    def upsert(self, filename, column, value, signature=None, dtypes=None):
+        """Insert or replace the analysis of one file, with its column-name signature and dtype profile if known."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO analyses (filename, column_name, column_key, value, updated_at, signature, dtypes)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT (filename) DO UPDATE SET column_name = excluded.column_name,"
+                " column_key = excluded.column_key, value = excluded.value, updated_at = excluded.updated_at,"
+                " signature = excluded.signature, dtypes = excluded.dtypes",
+                (filename, column, normalize_column(column), str(value), time.time(), signature, dtypes),
+            )
+
+    def upsert_many(self, entries):
+        """Upsert (filename, column, value) tuples in one transaction."""
+        rows = [(f, c, normalize_column(c), str(v), time.time()) for f, c, v in entries]
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(
+                    "INSERT INTO analyses (filename, column_name, column_key, value, updated_at)"
+                    " VALUES (?, ?, ?, ?, ?)"
+                    " ON CONFLICT (filename) DO UPDATE SET column_name = excluded.column_name,"
+                    " column_key = excluded.column_key, value = excluded.value, updated_at = excluded.updated_at",
+                    rows,
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def get(self, filename):
+        """Return (column, value) for filename, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT column_name, value FROM analyses WHERE filename = ?", (filename,)).fetchone()
+        return tuple(row) if row else None
+
+    def delete(self, filename):
+        with self._lock:
+            self._conn.execute("DELETE FROM analyses WHERE filename = ?", (filename,))
+
+    def matches(self, column, exclude=None, signature=None, dtypes=None):
+        """Files whose analyzed column matches column, excluding exclude.
+
+        With a signature, files with the same column names and dtype profile
+        (see fingerprint.analyze_frame) match too, whatever column their
+        analysis picked.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT filename FROM analyses WHERE (column_key = ? OR (signature = ? AND dtypes = ?))"
+                " AND filename != ? ORDER BY filename",
+                (normalize_column(column), signature, dtypes, exclude or ""),
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def schema(self, filename):
+        """Return (signature, dtypes) for filename, or None when it was stored without them."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT signature, dtypes FROM analyses WHERE filename = ?", (filename,)).fetchone()
+        return tuple(row) if row and row[0] else None
+
+    def items(self):
+        """All (filename, (column, value)) pairs."""
+        with self._lock:
+            rows = self._conn.execute("SELECT filename, column_name, value FROM analyses ORDER BY filename").fetchall()
+        return [(filename, (column, value)) for filename, column, value in rows]
+
+    def __contains__(self, filename):
+        return self.get(filename) is not None
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM analyses").fetchone()[0]
+
+    def import_json(self, json_path):
+        """Load a legacy matches.json ({filename: [column, value]}) into the index."""
+        if not os.path.exists(json_path):
+            return 0
+        try:
+            with open(json_path, "r") as f:
+                legacy = json.load(f)
+        except (OSError, ValueError):
+            logging.error(" JSON could not be loaded")
+            return 0
+        self.upsert_many((filename, col, val) for filename, (col, val) in legacy.items())
+        logging.info(f" Imported {len(legacy)} entries from {json_path}")
+        return len(legacy)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,232 @@
+import os
+import re
+import gzip
+import shutil
+from .streams import open_source, open_binary_output, open_text_output
+
+# Output formats: name -> (file extension, content type)
+FORMATS = {
+    "csv": (".csv", "text/csv"),
+    "csv.gz": (".csv.gz", "application/gzip"),
+    "parquet": (".parquet", "application/vnd.apache.parquet"),
+    "arrow": (".arrow", "application/vnd.apache.arrow.file"),
+}
+
+DEFAULT_FORMAT = "csv"
+
+# Other outputs that can be downloaded, by extension
+EXTRA_CONTENT_TYPES = {".zip": "application/zip"}
+
+# Formats that store typed columns rather than text
+TYPED_FORMATS = ("parquet", "arrow")
+
+# Rows per Parquet row group or Arrow record batch when a table is written in pieces
+BATCH_ROWS = int(os.environ.get("TYPED_BATCH_ROWS", "65536"))
+
+# Values with a leading zero ("007", "0123") are codes, not numbers
+_LEADING_ZERO = re.compile(r"^[+-]?0\d")
+_NUMBER = re.compile(r"^[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?$")
+
+
+def validate_format(output_format):
+    """Return a known format name (DEFAULT_FORMAT for None), or raise ValueError."""
+    if output_format is None:
+        return DEFAULT_FORMAT
+    output_format = str(output_format).lower()
+    if output_format not in FORMATS:
+        raise ValueError(f"Unknown output_format '{output_format}'. Use one of: {', '.join(FORMATS)}.")
+    return output_format
+
+
+def extension(output_format):
+    return FORMATS[output_format][0]
+
+
+def content_type_for(filename):
+    """Content type of an output blob, from its name."""
+    name = filename.lower()
+    for file_extension, content_type in sorted(FORMATS.values(), key=lambda f: -len(f[0])):
+        if name.endswith(file_extension):
+            return content_type
+    for file_extension, content_type in EXTRA_CONTENT_TYPES.items():
+        if name.endswith(file_extension):
+            return content_type
+    return "text/csv"
+
+
+def unique_columns(header):
+    """Header names made unique the way pandas.read_csv does (name, name.1, ...)."""
+    seen = {}
+    columns = []
+    for name in header:
+        name = "" if name is None else str(name)
+        count = seen.get(name, 0)
+        seen[name] = count + 1
+        columns.append(name if count == 0 else f"{name}.{count}")
+    return columns
+
+
+def frame_from_rows(header, rows):
+    """String DataFrame for a header row and data rows of any length."""
+    import pandas as pd
+
+    columns = unique_columns(header)
+    width = len(columns)
+    rows = [list(row[:width]) + [""] * (width - len(row)) for row in rows]
+    return pd.DataFrame(rows, columns=columns, dtype=object).fillna("").astype(str)
+
+
+def column_types(frame):
+    """ColumnType name of each column of a string DataFrame."""
+    types = []
+    for name in frame.columns:
+        column_type = ColumnType()
+        column_type.observe(frame[name].astype(str).tolist())
+        types.append(column_type.name)
+    return types
+
+
+class ColumnType:
+    """Running type of one column: the narrowest of boolean, integer, float and string that fits every value.
+
+    Values are taken a batch at a time, so a column's type can be decided
+    while its rows stream past; column_types runs one over a whole column.
+    Surrounding whitespace is ignored and blank values fit every type (they
+    become nulls). Only values written without a decimal point or exponent
+    make an integer, and values with leading zeros keep the column a string
+    so codes are not mangled.
+    """
+
+    __slots__ = ("filled", "blank", "boolean", "integer", "number")
+
+    def __init__(self):
+        self.filled = 0
+        self.blank = 0
+        self.boolean = self.integer = self.number = True
+
+    def observe(self, values):
+        distinct = set(values)
+        blank = sum(values.count(value) for value in distinct if not value.strip())
+        self.blank += blank
+        self.filled += len(values) - blank
+        for value in distinct:
+            if not (self.boolean or self.number):
+                return
+            value = value.strip()
+            if not value:
+                continue
+            if self.boolean and value.lower() not in ("true", "false"):
+                self.boolean = False
+            if self.number:
+                if not _NUMBER.match(value) or _LEADING_ZERO.match(value):
+                    self.number = self.integer = False
+                elif self.integer and (any(c in value for c in ".eE") or abs(int(value)) >= 2 ** 53):
+                    self.integer = False
+
+    @property
+    def name(self):
+        if not self.filled:
+            return "empty"
+        if self.boolean:
+            return "boolean"
+        if self.number:
+            return "integer" if self.integer else "float"
+        return "string"
+
+
+def cast_frame(frame, types):
+    """Typed copy of a string DataFrame whose column types were already decided (ColumnType names)."""
+    import pandas as pd
+
+    typed = {}
+    for name, column_type in zip(frame.columns, types):
+        values = frame[name].astype(str).str.strip()
+        if column_type == "boolean":
+            typed[name] = values.str.lower().map({"true": True, "false": False}).astype("boolean")
+        elif column_type in ("integer", "float"):
+            parsed = pd.to_numeric(values.where(values != ""), errors="coerce")
+            typed[name] = parsed.astype("Int64" if column_type == "integer" else "float64")
+        else:
+            typed[name] = frame[name].astype("string")
+    return pd.DataFrame(typed, columns=frame.columns)
+
+
+def arrow_schema(columns, types):
+    """Arrow schema for columns of the given ColumnType names; empty columns are strings."""
+    import pyarrow as pa
+
+    arrow_types = {"boolean": pa.bool_(), "integer": pa.int64(), "float": pa.float64()}
+    return pa.schema([(name, arrow_types.get(column_type, pa.string())) for name, column_type in zip(columns, types)])
+
+
+def write_row_batches(header, batches, types, output, output_format):
+    """Write one table, given as batches of string rows, to a path or binary file-like as Parquet or Arrow.
+
+    types (ColumnType names, one per column) are decided beforehand, so each
+    batch becomes its own row group or record batch as it arrives and only
+    one batch is held in memory.
+    """
+    import pyarrow as pa
+
+    schema = arrow_schema(unique_columns(header), types)
+    with open_binary_output(output) as raw:
+        if output_format == "parquet":
+            import pyarrow.parquet as pq
+
+            writer = pq.ParquetWriter(raw, schema, compression="zstd")
+        else:
+            writer = pa.ipc.new_file(raw, schema)
+        with writer:
+            for rows in batches:
+                frame = cast_frame(frame_from_rows(header, rows), types)
+                writer.write_table(pa.Table.from_pandas(frame, schema=schema, preserve_index=False))
+
+
+def write_frame(frame, output, output_format):
+    """Write a string DataFrame to a path or binary file-like in output_format."""
+    if output_format == "csv":
+        with open_text_output(output) as out_file:
+            frame.to_csv(out_file, index=False)
+        return
+    if output_format == "csv.gz":
+        with open_binary_output(output) as raw, gzip.GzipFile(fileobj=raw, mode="wb") as compressed, \
+                open_text_output(compressed) as out_file:
+            frame.to_csv(out_file, index=False)
+        return
+
+    import pyarrow as pa
+
+    # Typed the same way as write_row_batches, so both paths give one table the same schema
+    types = column_types(frame)
+    table = pa.Table.from_pandas(cast_frame(frame, types), schema=arrow_schema(frame.columns, types),
+                                 preserve_index=False)
+    with open_binary_output(output) as raw:
+        if output_format == "parquet":
+            import pyarrow.parquet as pq
+
+            pq.write_table(table, raw, compression="zstd")
+        else:
+            with pa.ipc.new_file(raw, table.schema) as writer:
+                writer.write_table(table)
+
+
+def convert_csv(source, output, output_format):
+    """Rewrite a finished CSV (path, bytes or file-like) in output_format."""
+    if output_format == "csv":
+        with open_source(source) as src, open_binary_output(output) as raw:
+            shutil.copyfileobj(src, raw)
+        return
+    if output_format == "csv.gz":
+        with open_source(source) as src, open_binary_output(output) as raw, \
+                gzip.GzipFile(fileobj=raw, mode="wb") as compressed:
+            shutil.copyfileobj(src, compressed)
+        return
+
+    import pandas as pd
+
+    with open_source(source) as src:
+        try:
+            frame = pd.read_csv(src, dtype=str, keep_default_na=False)
+        except pd.errors.EmptyDataError:
+            frame = pd.DataFrame()
+    write_frame(frame, output, output_format)
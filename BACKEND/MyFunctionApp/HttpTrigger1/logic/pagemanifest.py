@@ -0,0 +1,130 @@
+"""Per-page manifest of a PDF extraction, for re-processing a new version incrementally.
+
+A manifest records a content hash for every page and the tables extracted
+from it. When a corrected version of a document is processed against the
+manifest of the earlier one, pages whose hash is unchanged take their tables
+from the manifest and only edited, added or moved-in pages are extracted.
+"""
+import gzip
+import json
+import hashlib
+import logging
+from pdfminer.pdftypes import PDFObjRef, PDFStream
+from pdfminer.psparser import PSKeyword, PSLiteral
+from .tablestitch import ExtractedTable
+
+# Bump when the manifest layout changes; older manifests are then ignored
+MANIFEST_FORMAT = 1
+
+# Keys leading from a page's resources back up the page tree
+_SKIPPED_KEYS = ("Parent", "P")
+
+
+def manifest_name(content_hash, version):
+    """Blob name of the manifest for a source document and extraction version."""
+    return f"manifests/{content_hash}-{version}.json.gz"
+
+
+def page_hashes(pdf):
+    """Content hash of every page of an open pdfplumber PDF, in page order.
+
+    A hash covers the page's boxes and rotation, its content streams and
+    everything its resources reference (fonts, images, forms), so it changes
+    whenever what is drawn on the page does. Streams are hashed as stored,
+    without decompressing them, and objects shared by several pages once.
+    """
+    memo = {}
+    return [_page_hash(page.page_obj, memo) for page in pdf.pages]
+
+
+def _page_hash(page_obj, memo):
+    digest = hashlib.sha256()
+    digest.update(repr((page_obj.mediabox, page_obj.cropbox, page_obj.rotate)).encode("utf-8"))
+    _feed(digest, page_obj.attrs.get("Contents"), memo)
+    _feed(digest, page_obj.resources, memo)
+    return digest.hexdigest()
+
+
+def _feed(digest, value, memo):
+    if isinstance(value, PDFObjRef):
+        objid = value.objid
+        if objid not in memo:
+            # Stands in for the object while it is being hashed, in case it refers back to itself
+            memo[objid] = b"cycle"
+            inner = hashlib.sha256()
+            _feed(inner, value.resolve(), memo)
+            memo[objid] = inner.digest()
+        digest.update(b"R" + memo[objid])
+    elif isinstance(value, PDFStream):
+        _feed(digest, {key: item for key, item in value.attrs.items() if key != "Length"}, memo)
+        data = value.get_rawdata()
+        if data is None:
+            data = b"decoded:" + value.get_data()
+        digest.update(b"S%d:" % len(data) + data)
+    elif isinstance(value, dict):
+        digest.update(b"{")
+        for key in sorted(value, key=str):
+            if key not in _SKIPPED_KEYS:
+                digest.update(f"{key}=".encode("utf-8"))
+                _feed(digest, value[key], memo)
+        digest.update(b"}")
+    elif isinstance(value, (list, tuple)):
+        digest.update(b"[")
+        for item in value:
+            _feed(digest, item, memo)
+        digest.update(b"]")
+    elif isinstance(value, (PSLiteral, PSKeyword)):
+        digest.update(b"/" + str(value.name).encode("utf-8"))
+    elif isinstance(value, bytes):
+        digest.update(b"b%d:" % len(value) + value)
+    else:
+        digest.update(repr(value).encode("utf-8"))
+
+
+def new_manifest(version, pages):
+    """Manifest for one extraction; pages holds one {"hash", "action", "tables"} entry per page."""
+    return {"format": MANIFEST_FORMAT, "version": version, "pages": pages}
+
+
+def page_entry(page_hash, action, tables):
+    return {"hash": page_hash, "action": action,
+            "tables": [{"rows": table.rows, "columns": table.columns} for table in tables]}
+
+
+def dump(manifest):
+    """Gzipped JSON bytes of a manifest."""
+    return gzip.compress(json.dumps(manifest, separators=(",", ":")).encode("utf-8"), compresslevel=6)
+
+
+def load(data):
+    """Parse bytes written by dump; None when they are not a usable manifest."""
+    try:
+        manifest = json.loads(gzip.decompress(bytes(data)))
+    except (OSError, ValueError) as e:
+        logging.warning(f" Ignoring unreadable page manifest: {e}")
+        return None
+    if not isinstance(manifest, dict) or manifest.get("format") != MANIFEST_FORMAT:
+        return None
+    return manifest
+
+
+def reusable_pages(manifest, version, hashes):
+    """{page_number: manifest entry} for pages of a document whose hash the manifest already holds.
+
+    Pages are matched by hash rather than position, so pages inserted or
+    removed earlier in the document do not invalidate the ones after them.
+    A manifest from another extraction version reuses nothing.
+    """
+    if not manifest or manifest.get("version") != version:
+        return {}
+    by_hash = {}
+    for entry in manifest.get("pages") or []:
+        by_hash.setdefault(entry["hash"], entry)
+    return {page_number: by_hash[page_hash] for page_number, page_hash in enumerate(hashes, start=1)
+            if page_hash in by_hash}
+
+
+def entry_tables(entry, page_number):
+    """The tables of a manifest entry, placed on page_number of the new document."""
+    return [ExtractedTable(table["rows"], tuple(table["columns"]) if table["columns"] else None, page_number)
+            for table in entry["tables"]]
@@ -0,0 +1,16 @@
+from collections import deque
+
+
+def ordered_map(executor, fn, items, max_in_flight):
+    """Like executor.map, but never keeps more than max_in_flight tasks pending.
+
+    items is consumed lazily, so a generator that decodes pages on demand only
+    ever has a window of them alive at once. Results come back in input order.
+    """
+    pending = deque()
+    for item in items:
+        pending.append(executor.submit(fn, item))
+        if len(pending) >= max_in_flight:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
@@ -1,56 +1,582 @@
 import os
+import json
+import time
+import hashlib
+import logging
+from collections import deque, namedtuple
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
 import pandas as pd
 import pdfplumber
+import pypdfium2
+import pypdfium2.raw as pdfium_c
+from pdfplumber.table import TableSettings
+from .streams import BufferReader, is_path, read_source, source_buffer, open_source, open_binary_output
+from .parallel import ordered_map
+from .imgprep import prepare_frame
+from .imgtocsv import initialize_gemini_model, convert_prepared_parts, write_parts
+from .tablestitch import ExtractedTable, TableStitcher, TableFileSink, table_columns
+from . import csvnormalize, pagemanifest, telemetry
 
-def pdf_to_csv(source_path, output_path):
+# Bump whenever a change alters the CSV produced for the same input,
+# so cached results from older versions are not served.
+PIPELINE_VERSION = "7"
+
+# Pages handed to one worker task in streaming mode. Small enough that a
+# worker's result stays cheap to hold, large enough to amortize task overhead.
+PAGES_PER_TASK = 8
+
+# Pages with fewer extractable characters than this but an embedded image are
+# treated as scans and converted by the image model instead of pdfplumber
+MIN_TEXT_CHARS = int(os.environ.get("PDF_MIN_TEXT_CHARS", "20"))
+
+# Resolution scanned pages are rendered at before going to the image model
+OCR_RESOLUTION = int(os.environ.get("PDF_OCR_RESOLUTION", "200"))
+
+# Scanned pages converted by the image model at once
+OCR_WORKERS = int(os.environ.get("PDF_OCR_WORKERS", "4"))
+
+# Set PDF_OCR=0 to leave scanned pages out instead of sending them to the model
+OCR_ENABLED = os.environ.get("PDF_OCR", "1") != "0"
+
+# Skip extract_tables on pages that cannot hold a table (see has_table_structure);
+# a request can override this with the "prescreen" option
+PRESCREEN = os.environ.get("PDF_PRESCREEN", "1") != "0"
+
+# Table strategies that build cells from ruling lines, rects and curves
+LINE_STRATEGIES = ("lines", "lines_strict")
+
+# Keys accepted in a request's PDF options
+OPTION_KEYS = ("table_settings", "crop_box", "prescreen", "split_tables")
+
+PAGE_SECONDS = telemetry.histogram("pdf_page_seconds", "Time per PDF page by action (extracted, skipped, scanned, reused).",
+                                   (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0))
+
+
+def pdf_to_csv(source_path, output_path, workers=None, pages_per_task=PAGES_PER_TASK, progress=None, options=None,
+               output_format="csv", previous_manifest=None, manifest_output=None):
     """
     Extracts all tables from a PDF, combines them, and saves to a single CSV file.
     
+    Pages with a text layer are read with pdfplumber; scanned pages (see
+    needs_ocr) are rendered and converted by the image model in parallel, and
+    their tables are merged in at their page position. Tables continuing
+    across pages are stitched into logical tables (see TableStitcher). One
+    logical table is written as a single CSV; with more than one, or with
+    the "split_tables" option, each becomes its own CSV inside a zip archive
+    (see TableFileSink) and the report's "archive" is True.
+
     Args:
-        source_path: Path to the source PDF file.
-        output_path: Path where the final single CSV file will be saved.
+        source_path: Path, bytes or binary file-like of the source PDF.
+        output_path: Path or file-like where the final CSV (or zip) will be written.
+        workers: If greater than 1, page ranges are extracted on a process pool
+            and streamed to the output in page order (see pdf_to_csv_streaming).
+        pages_per_task: Number of pages per worker task in streaming mode.
+        progress: Optional callable(pages_done, total_pages).
+        options: Optional request options, see resolve_options.
+        output_format: One of outputformat.FORMATS; typed formats get their
+            column types inferred once per logical table.
+        previous_manifest: Page manifest of an earlier version of the document
+            (see pagemanifest). Pages whose content hash it holds are taken from
+            it instead of being extracted again.
+        manifest_output: Optional path or binary file-like the page manifest
+            of this run is written to.
+
+    Returns:
+        A report dict with per-page actions and timings (see new_report).
     """
-    print(f"Processing PDF: {source_path}")
+    settings = resolve_options(options)
+    if workers and workers > 1:
+        return pdf_to_csv_streaming(source_path, output_path, workers, pages_per_task, progress, options,
+                                    output_format, previous_manifest, manifest_output)
+    if not is_path(source_path):
+        # pdfplumber and the pdfium pre-screen each read their own view of the document's one buffer
+        source_path = source_buffer(source_path)
+
+    logging.info(f" Processing PDF: {source_path if is_path(source_path) else 'in-memory document'}")
     
     try:
-        all_tables = []
+        report = new_report()
         
-        with pdfplumber.open(source_path) as pdf:
-            for page in pdf.pages:
-                tables = page.extract_tables()
-                if tables:
-                    all_tables.extend(tables)
-
-        if not all_tables:
-            print("No tables found in the PDF.")
-            # Ek khaali CSV file bana dein taaki error na aaye
-            pd.DataFrame().to_csv(output_path, index=False)
-            return
+        with PageScreen(source_path) as screen, open_source(source_path) as source, pdfplumber.open(source) as pdf, \
+                TableFileSink(output_path, output_format, split_tables(options)) as sink:
+            page_count = len(pdf.pages)
+            plan = PagePlan(pdf, settings, report, previous_manifest, manifest_output is not None)
+            _stitch_pages(plan.splice(_iter_pages(pdf, settings, screen, plan.reused), page_count), sink, report,
+                          page_count, progress, plan)
+        report["archive"] = sink.archived
+        plan.write_manifest(manifest_output)
 
-        list_of_dfs = []
-        
-        print(f"Found {len(all_tables)} tables. Combining them into one CSV.")
-        for table in all_tables:
-            if table and len(table) > 0:
-                # Convert table to DataFrame
-                df = pd.DataFrame(table[1:], columns=table[0])
-                df = df.fillna("")
-                list_of_dfs.append(df)
-        
-        # Saare DataFrames ko ek mein jodein
-        if list_of_dfs:
-            combined_df = pd.concat(list_of_dfs, ignore_index=True)
-            # Final combined CSV ko save karein
-            combined_df.to_csv(output_path, index=False)
-            print(f"Successfully saved combined CSV to: {output_path}")
+        if report["tables"] == 0:
+            logging.info(" No tables found in the PDF.")
+            if not split_tables(options) and output_format == "csv":
+                # Ek khaali CSV file bana dein taaki error na aaye
+                _write_empty_csv(output_path)
         else:
-            # Agar koi valid table nahi mili toh khaali CSV banayein
-            print("No valid dataframes to combine.")
-            pd.DataFrame().to_csv(output_path, index=False)
+            logging.info(f" Found {report['tables']} tables, saved as {report['logical_tables']} logical tables.")
+        return report
 
     except Exception as e:
-        print(f"An error occurred during PDF processing: {e}")
+        logging.error(f" An error occurred during PDF processing: {e}")
         # Error ki sthiti mein bhi ek khaali CSV bana dein taaki process na ruke
-        pd.DataFrame().to_csv(output_path, index=False)
+        _write_empty_csv(output_path)
         # Error ko dobara raise karein taaki main function use log kar sake
-        raise e
\ No newline at end of file
+        raise e
+
+
+def pdf_to_csv_streaming(source_path, output_path, workers, pages_per_task=PAGES_PER_TASK, progress=None,
+                         options=None, output_format="csv", previous_manifest=None, manifest_output=None):
+    """
+    Extracts tables on a process pool and streams them to the output in page order.
+
+    Only a bounded window of page ranges is in flight at any time, so peak
+    memory depends on the worker count rather than on the number of pages.
+    Results are stitched into logical tables as they arrive, through the
+    same stitcher and sink as the serial path, so the output is identical. Workers render
+    scanned pages, which are then converted by the image model on a thread
+    pool while extraction continues. Pages taken from previous_manifest are
+    never sent to a worker.
+
+    Args:
+        source_path: Path, bytes or binary file-like of the source PDF.
+        output_path: Path or file-like where the final CSV (or zip) will be written.
+        workers: Number of worker processes.
+        pages_per_task: Number of pages extracted per worker task.
+        progress: Optional callable(pages_done, total_pages).
+        options: Optional request options, see resolve_options.
+        output_format: One of outputformat.FORMATS.
+        previous_manifest, manifest_output: As for pdf_to_csv.
+
+    Returns:
+        A report dict with per-page actions and timings (see new_report).
+    """
+    logging.info(f" Streaming PDF extraction with {workers} workers")
+    settings = resolve_options(options)
+    report = new_report()
+
+    # Workers receive the document once, when they start, instead of per task
+    if not is_path(source_path):
+        source_path = read_source(source_path)
+
+    with open_source(source_path) as source, pdfplumber.open(source) as pdf:
+        page_count = len(pdf.pages)
+        plan = PagePlan(pdf, settings, report, previous_manifest, manifest_output is not None)
+
+    to_extract = [page_number for page_number in range(1, page_count + 1) if page_number not in plan.reused]
+    tasks = [to_extract[start:start + pages_per_task] for start in range(0, len(to_extract), pages_per_task)]
+
+    try:
+        with TableFileSink(output_path, output_format, split_tables(options)) as sink, \
+                ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                    initargs=(source_path, settings)) as executor:
+            results = ordered_map(executor, _extract_pages, tasks, max_in_flight=workers * 2)
+            _stitch_pages(plan.splice(((task[-1], pages) for task, pages in zip(tasks, results)), page_count),
+                          sink, report, page_count, progress, plan)
+        report["archive"] = sink.archived
+        plan.write_manifest(manifest_output)
+
+        if report["tables"] == 0:
+            logging.info(" No tables found in the PDF.")
+        else:
+            logging.info(f" Streamed {report['tables']} tables from {page_count} pages")
+        return report
+
+    except Exception as e:
+        logging.error(f" An error occurred during PDF processing: {e}")
+        # Error ki sthiti mein bhi ek khaali CSV bana dein taaki process na ruke
+        _write_empty_csv(output_path)
+        raise
+
+
+def _stitch_pages(results, sink, report, page_count, progress=None, plan=None):
+    """Feed (pages_done, page_results) batches, in page order, through a TableStitcher.
+
+    Scanned pages are sent to the image model as they arrive; tables are
+    written as soon as every page before them is done, waiting on a scan only
+    once too many pages are held back behind it. Each page's final tables are
+    handed to plan, when given, for the page manifest. Rows reach the sink
+    normalized to their table's header (see csvnormalize), and the quality
+    report lands in report["quality"].
+    """
+    quality = csvnormalize.QualityReport()
+    stitcher = TableStitcher(csvnormalize.NormalizingTableSink(sink, quality))
+    # Per page, in order: its timing and its tables, or a future for a scanned page's tables
+    pending = deque()
+
+    def flush_one():
+        timing, entry = pending.popleft()
+        tables = _resolve(entry)
+        if plan is not None:
+            plan.record(timing, tables)
+        for table in tables:
+            stitcher.add(table)
+
+    with ScannedPageConverter(quality) as converter:
+        for pages_done, pages in results:
+            for tables, parts, timing in pages:
+                _record(report, timing)
+                pending.append((timing, converter.submit(parts, timing["page"]) if parts else tables))
+            while pending and (not isinstance(pending[0][1], Future) or pending[0][1].done()
+                               or len(pending) > OCR_WORKERS * PAGES_PER_TASK):
+                flush_one()
+            if progress:
+                progress(pages_done, page_count)
+        while pending:
+            flush_one()
+
+    report["tables"] = stitcher.tables_in
+    report["logical_tables"] = stitcher.logical_tables
+    report["quality"] = quality.as_dict()
+    _log_report(report)
+    logging.info(f" CSV normalization: {quality.describe()}")
+
+
+def resolve_options(options):
+    """Validate request options into (table_settings, crop_box, prescreen).
+
+    options may hold "table_settings" (pdfplumber table settings, e.g.
+    {"vertical_strategy": "text"}), "crop_box" ([x0, top, x1, bottom] in PDF
+    points, applied to every page) and "prescreen" (bool), plus the output
+    option "split_tables" (see split_tables). Raises ValueError for anything
+    pdfplumber would reject.
+    """
+    options = options or {}
+    if not isinstance(options, dict):
+        raise ValueError("'options' must be an object.")
+    unknown = sorted(set(options) - set(OPTION_KEYS))
+    if unknown:
+        raise ValueError(f"Unknown PDF options: {', '.join(unknown)}. Use: {', '.join(OPTION_KEYS)}.")
+
+    table_settings = options.get("table_settings") or {}
+    if not isinstance(table_settings, dict):
+        raise ValueError("'table_settings' must be an object.")
+    try:
+        TableSettings.resolve(table_settings)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid table_settings: {e}")
+
+    crop_box = options.get("crop_box")
+    if crop_box is not None:
+        if (not isinstance(crop_box, (list, tuple)) or len(crop_box) != 4
+                or not all(isinstance(v, (int, float)) for v in crop_box)
+                or crop_box[0] >= crop_box[2] or crop_box[1] >= crop_box[3]):
+            raise ValueError("'crop_box' must be [x0, top, x1, bottom] in PDF points.")
+        crop_box = tuple(float(v) for v in crop_box)
+
+    return table_settings, crop_box, bool(options.get("prescreen", PRESCREEN))
+
+
+def split_tables(options=None):
+    """True when the request asked for a zip of per-table files even for a single logical table."""
+    return bool((options or {}).get("split_tables"))
+
+
+def pipeline_version(options=None):
+    """PIPELINE_VERSION qualified by the options, so each setting is cached separately."""
+    if not options:
+        return PIPELINE_VERSION
+    digest = hashlib.sha256(json.dumps(options, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+    return f"{PIPELINE_VERSION}-{digest}"
+
+
+def extraction_version(settings):
+    """PIPELINE_VERSION qualified by the settings that change what is extracted from a page.
+
+    Output-only options (split_tables, the output format) and the pre-screen,
+    which only skips pages that cannot hold a table, leave page tables alone,
+    so page manifests stay reusable across them.
+    """
+    table_settings, crop_box, _ = settings
+    digest = hashlib.sha256(json.dumps([table_settings, crop_box, OCR_ENABLED], sort_keys=True)
+                            .encode("utf-8")).hexdigest()[:16]
+    return f"{PIPELINE_VERSION}-{digest}"
+
+
+class PagePlan:
+    """Which pages of a run come from an earlier page manifest, and the manifest the run leaves.
+
+    Page hashes are only computed when there is a manifest to match or one
+    to write. reused maps page numbers to the earlier manifest's entries.
+    """
+
+    def __init__(self, pdf, settings, report, previous_manifest=None, record=False):
+        self.version = extraction_version(settings)
+        self.hashes = None
+        self.reused = {}
+        self.pages = [] if record else None
+        if previous_manifest or record:
+            started = time.perf_counter()
+            self.hashes = pagemanifest.page_hashes(pdf)
+            report["hash_seconds"] = round(time.perf_counter() - started, 4)
+        if previous_manifest:
+            self.reused = pagemanifest.reusable_pages(previous_manifest, self.version, self.hashes)
+            logging.info(f" {len(self.reused)} of {len(self.hashes)} pages unchanged since the previous version")
+
+    def splice(self, batches, page_count):
+        """Merge reused pages into (pages_done, page_results) batches of extracted pages, in page order."""
+        upcoming = deque(sorted(self.reused))
+        for _, pages in batches:
+            merged = []
+            for result in pages:
+                while upcoming and upcoming[0] < result[2]["page"]:
+                    merged.append(self._reused_result(upcoming.popleft()))
+                merged.append(result)
+            yield merged[-1][2]["page"], merged
+        if upcoming:
+            yield page_count, [self._reused_result(page_number) for page_number in upcoming]
+
+    def _reused_result(self, page_number):
+        started = time.perf_counter()
+        tables = pagemanifest.entry_tables(self.reused[page_number], page_number)
+        return tables, None, _timing(page_number, "reused", started, len(tables))
+
+    def record(self, timing, tables):
+        if self.pages is not None:
+            self.pages.append((timing, tables))
+
+    def write_manifest(self, manifest_output):
+        if manifest_output is None or self.pages is None:
+            return
+        entries = []
+        for timing, tables in self.pages:
+            page_number = timing["page"]
+            # A reused page keeps what was originally done with it
+            action = self.reused[page_number]["action"] if timing["action"] == "reused" else timing["action"]
+            entries.append(pagemanifest.page_entry(self.hashes[page_number - 1], action, tables))
+        with open_binary_output(manifest_output) as out:
+            out.write(pagemanifest.dump(pagemanifest.new_manifest(self.version, entries)))
+
+
+def has_table_structure(page, table_settings, counts=None):
+    """Cheap pre-screen: False when extract_tables cannot find a table on the page.
+
+    A page without text has nothing to extract, and a ruling-line strategy
+    needs at least one line, rect or curve unless explicit lines are given.
+    counts (whole-page pdfium counts) avoid parsing the page with pdfplumber.
+    """
+    if counts is not None:
+        has_text, has_rulings = counts.texts > 0, counts.paths > 0
+    else:
+        has_text, has_rulings = bool(page.chars), bool(page.lines or page.rects or page.curves)
+    if not has_text:
+        return False
+    for axis in ("vertical", "horizontal"):
+        if (table_settings.get(f"{axis}_strategy", "lines") in LINE_STRATEGIES
+                and not table_settings.get(f"explicit_{axis}_lines") and not has_rulings):
+            return False
+    return True
+
+
+def new_report():
+    """Empty per-document extraction report."""
+    return {
+        "pages": 0,
+        "extracted": 0,
+        "skipped": 0,
+        "scanned": 0,
+        "reused": 0,
+        "tables": 0,
+        "logical_tables": 0,
+        "archive": False,
+        "extract_seconds": 0.0,
+        "skip_seconds": 0.0,
+        "scan_seconds": 0.0,
+        "reuse_seconds": 0.0,
+        "hash_seconds": 0.0,
+        "page_timings": [],
+    }
+
+
+def _record(report, timing):
+    action = timing["action"]
+    report["pages"] += 1
+    report[action] += 1
+    key = {"extracted": "extract_seconds", "skipped": "skip_seconds", "scanned": "scan_seconds",
+           "reused": "reuse_seconds"}[action]
+    report[key] = round(report[key] + timing["seconds"], 4)
+    report["page_timings"].append(timing)
+    PAGE_SECONDS.observe(timing["seconds"], action=action)
+
+
+def _log_report(report):
+    logging.info(f" {report['pages']} pages: {report['extracted']} extracted in {report['extract_seconds']}s, "
+                 f"{report['skipped']} skipped in {report['skip_seconds']}s, "
+                 f"{report['scanned']} scanned rendered in {report['scan_seconds']}s, "
+                 f"{report['reused']} reused from the previous version")
+
+
+# Objects on one page as counted by pdfium
+PageCounts = namedtuple("PageCounts", ["paths", "texts", "images"])
+
+
+class PageScreen:
+    """Per-page object counts read with pdfium.
+
+    pdfium walks a page's objects far faster than pdfplumber parses its
+    characters, so pages can be ruled out before pdfplumber touches them.
+    Counts are None when pdfium cannot read the document; callers then fall
+    back to pdfplumber's own objects.
+    """
+
+    def __init__(self, source):
+        # pdfium takes bytes or a stream, so a memoryview is read in place through a BufferReader
+        self.reader = BufferReader(source) if isinstance(source, memoryview) else None
+        try:
+            self.document = pypdfium2.PdfDocument(self.reader or source)
+        except pypdfium2.PdfiumError as e:
+            logging.warning(f" pdfium could not open the PDF, pre-screening with pdfplumber: {e}")
+            self.document = None
+
+    def counts(self, page_number):
+        if self.document is None:
+            return None
+        page = self.document[page_number - 1]
+        try:
+            return PageCounts(*(sum(1 for _ in page.get_objects(filter=(kind,)))
+                                for kind in (pdfium_c.FPDF_PAGEOBJ_PATH, pdfium_c.FPDF_PAGEOBJ_TEXT,
+                                             pdfium_c.FPDF_PAGEOBJ_IMAGE)))
+        finally:
+            page.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if self.document is not None:
+            self.document.close()
+        if self.reader is not None:
+            self.reader.close()
+
+
+def needs_ocr(page, counts=None):
+    """True for a page without a usable text layer that carries an image, i.e. a scan."""
+    if counts is not None and not counts.images:
+        return False
+    return len(page.chars) < MIN_TEXT_CHARS and bool(page.images)
+
+
+class ScannedPageConverter:
+    """Converts rendered scanned pages with the image model on a thread pool.
+
+    The API key and threads are only set up when the first scan shows up, so
+    text-only PDFs never need Gemini. Each page's model output is normalized
+    into its own tables, whose counts and samples are added to quality.
+    """
+
+    def __init__(self, quality=None, workers=OCR_WORKERS):
+        self.quality = quality
+        self.workers = workers
+        self.pages = 0
+        self._api_key = None
+        self._executor = None
+
+    def submit(self, parts, page_number):
+        """Start converting one page's prepared image; the future yields its tables."""
+        if self._executor is None:
+            self._api_key = initialize_gemini_model()
+            self._executor = ThreadPoolExecutor(max_workers=self.workers)
+        self.pages += 1
+        return self._executor.submit(telemetry.bind(self._convert), parts, page_number)
+
+    def _convert(self, parts, page_number):
+        tables = csvnormalize.TableListSink()
+        normalizer = csvnormalize.CsvNormalizer(tables)
+        write_parts(normalizer, parts, convert_prepared_parts(self._api_key, parts))
+        page_quality = normalizer.close()
+        if self.quality is not None:
+            self.quality.merge(page_quality)
+        return [ExtractedTable([header] + rows, None, page_number) for header, rows in tables.tables]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=exc[0] is not None)
+            logging.info(f" {self.pages} scanned pages converted by the image model")
+
+
+def _extract_page(page, settings, screen=None):
+    """Return (tables, parts, timing) for one page.
+
+    parts is the prepared image of a scanned page and None otherwise; timing
+    records what was done with the page and how long it took. The
+    PageScreen counts cover the whole page even when it is cropped, which
+    keeps the pre-screen conservative.
+    """
+    table_settings, crop_box, prescreen = settings
+    started = time.perf_counter()
+    page_number = page.page_number
+    counts = screen.counts(page_number) if screen else None
+    if crop_box:
+        page = _crop(page, crop_box)
+        if page is None:
+            return [], None, _timing(page_number, "skipped", started)
+    if OCR_ENABLED and needs_ocr(page, counts):
+        image = page.to_image(resolution=OCR_RESOLUTION).original
+        return [], prepare_frame(image), _timing(page_number, "scanned", started)
+    if prescreen and not has_table_structure(page, table_settings, counts):
+        return [], None, _timing(page_number, "skipped", started)
+    tables = []
+    for table in page.find_tables(table_settings):
+        rows = table.extract()
+        if rows:
+            tables.append(ExtractedTable(rows, table_columns(table), page_number))
+    return tables, None, _timing(page_number, "extracted", started, len(tables))
+
+
+def _iter_pages(pdf, settings, screen, skip=()):
+    """Yield (page_number, [page result]) for each page of an open PDF not in skip."""
+    for page_number, page in enumerate(pdf.pages, start=1):
+        if page_number in skip:
+            continue
+        result = _extract_page(page, settings, screen)
+        # pdfplumber caches parsed layout objects on the page
+        page.close()
+        yield page_number, [result]
+
+
+def _crop(page, crop_box):
+    """The part of page inside crop_box, or None when they do not overlap."""
+    x0, top, x1, bottom = page.bbox
+    box = (max(x0, crop_box[0]), max(top, crop_box[1]), min(x1, crop_box[2]), min(bottom, crop_box[3]))
+    if box[0] >= box[2] or box[1] >= box[3]:
+        return None
+    return page.crop(box)
+
+
+def _timing(page_number, action, started, tables=0):
+    return {"page": page_number, "action": action, "seconds": round(time.perf_counter() - started, 4),
+            "tables": tables}
+
+
+def _resolve(entry):
+    return entry.result() if isinstance(entry, Future) else entry
+
+
+def _write_empty_csv(output_path):
+    """Leave an empty CSV behind at a path; streams are left to the caller."""
+    if is_path(output_path):
+        pd.DataFrame().to_csv(output_path, index=False)
+
+
+# Set in each worker process by _init_worker
+_worker_source = None
+_worker_settings = None
+
+
+def _init_worker(source, settings):
+    global _worker_source, _worker_settings
+    _worker_source = source
+    _worker_settings = settings
+
+
+def _extract_pages(page_numbers):
+    """Worker: (tables, parts, timing) for each of the given (1-based) pages of the worker's PDF."""
+    pages = []
+    with open_source(_worker_source) as source, PageScreen(_worker_source) as screen, \
+            pdfplumber.open(source, pages=page_numbers) as pdf:
+        for page in pdf.pages:
+            pages.append(_extract_page(page, _worker_settings, screen))
+            # pdfplumber caches parsed layout objects on the page
+            page.close()
+    return pages
@@ -0,0 +1,218 @@
+import os
+import json
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+# Read size used when hashing uploads that have no stored content hash
+HASH_CHUNK_SIZE = 4 * 1024 * 1024
+
+
+def content_hash(data):
+    """Return the hex SHA-256 of bytes or of an iterable of byte chunks."""
+    digest = hashlib.sha256()
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        digest.update(data)
+    else:
+        for chunk in data:
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cache_key(file_hash, pipeline, version):
+    """Build the cache key for one upload run through one pipeline version."""
+    return hashlib.sha256(f"{pipeline}:{version}:{file_hash}".encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """Maps cache keys to output blob names and counts hits and misses."""
+
+    backend = "none"
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the cached output blob name for key, or None."""
+        value = self._get(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def put(self, key, value):
+        """Remember that key produced the output blob named value."""
+        self._put(key, value)
+
+    def discard(self, key):
+        """Forget key, e.g. when its output blob has been deleted."""
+        self._discard(key)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "backend": self.backend,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "entries": self._size(),
+            }
+
+    def _get(self, key):
+        return None
+
+    def _put(self, key, value):
+        pass
+
+    def _discard(self, key):
+        pass
+
+    def _size(self):
+        return 0
+
+
+class MemoryCache(ResultCache):
+    """In-process LRU cache with a cap on the number of entries."""
+
+    backend = "memory"
+
+    def __init__(self, max_entries=1024):
+        super().__init__()
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+
+    def _get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def _put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def _discard(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def _size(self):
+        return len(self._entries)
+
+
+class DiskCache(ResultCache):
+    """One small JSON file per key in a local directory, oldest evicted first."""
+
+    backend = "disk"
+
+    def __init__(self, directory, max_entries=10000):
+        super().__init__()
+        self.directory = directory
+        self.max_entries = max_entries
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "r") as f:
+                value = json.load(f)["output"]
+        except (OSError, ValueError, KeyError):
+            return None
+        # Touch the entry so eviction order follows use, not creation
+        os.utime(path)
+        return value
+
+    def _put(self, key, value):
+        path = self._path(key)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump({"output": value}, f)
+        os.replace(temp_path, path)
+        self._evict()
+
+    def _discard(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def _entries(self):
+        return [e for e in os.scandir(self.directory) if e.name.endswith(".json")]
+
+    def _evict(self):
+        entries = self._entries()
+        excess = len(entries) - self.max_entries
+        if excess <= 0:
+            return
+        entries.sort(key=lambda e: e.stat().st_mtime)
+        for entry in entries[:excess]:
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                continue
+            with self._lock:
+                self.evictions += 1
+
+    def _size(self):
+        return len(self._entries())
+
+
+class BlobCache(ResultCache):
+    """Stores each key as a tiny blob so every function instance shares hits."""
+
+    backend = "blob"
+
+    def __init__(self, storage, container="cache"):
+        super().__init__()
+        self.storage = storage
+        self.container = container
+
+    def _get(self, key):
+        try:
+            return bytes(self.storage.get(self.container, key).data).decode("utf-8")
+        except Exception:
+            return None
+
+    def _put(self, key, value):
+        self.storage.put(self.container, key, value.encode("utf-8"))
+
+    def _discard(self, key):
+        try:
+            self.storage.delete(self.container, key)
+        except Exception:
+            pass
+
+    def _size(self):
+        # Listing the container is too expensive for a stats call
+        return None
+
+
+def create_cache(backend=None, storage=None):
+    """Create the cache selected by RESULT_CACHE (memory, disk, blob or none); blob keeps entries in storage."""
+    backend = (backend or os.environ.get("RESULT_CACHE", "memory")).lower()
+    if backend == "memory":
+        return MemoryCache(int(os.environ.get("RESULT_CACHE_MAX_ENTRIES", "1024")))
+    if backend == "disk":
+        return DiskCache(os.environ.get("RESULT_CACHE_DIR", "/tmp/result-cache"),
+                         int(os.environ.get("RESULT_CACHE_MAX_ENTRIES", "10000")))
+    if backend == "blob":
+        return BlobCache(storage, os.environ.get("RESULT_CACHE_CONTAINER", "cache"))
+    if backend == "none":
+        return ResultCache()
+    logging.warning(f" Unknown RESULT_CACHE backend '{backend}', caching disabled")
+    return ResultCache()
@@ -0,0 +1,602 @@
+"""Blob storage behind one interface: Azure Blob, a local directory or process memory.
+
+STORAGE_BACKEND picks the backend: azure (default, AzureWebJobsStorage),
+local (files under LOCAL_STORAGE_DIR) or memory. Every backend offers
+head/get/put/set_metadata/delete/list on (container, name), batched *_many variants that
+run on a shared thread pool, and async a* variants. Large transfers are
+split into STORAGE_BLOCK_SIZE blocks moved STORAGE_MAX_CONCURRENCY at a time.
+
+Each operation is timed into docscanner_storage_op_seconds{backend, op},
+counted by outcome in docscanner_storage_ops_total, and shows up in the
+request's Server-Timing as storage.<op>.
+"""
+import os
+import time
+import uuid
+import json
+import shutil
+import asyncio
+import logging
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from . import telemetry
+from .httprange import RangeNotSatisfiable, content_range_total, etag_matches
+
+# Transfers larger than two blocks are split and moved in parallel
+BLOCK_SIZE = int(os.environ.get("STORAGE_BLOCK_SIZE", str(4 * 1024 * 1024)))
+MAX_CONCURRENCY = int(os.environ.get("STORAGE_MAX_CONCURRENCY", "4"))
+# Operations in flight for one *_many call
+BATCH_WORKERS = int(os.environ.get("STORAGE_BATCH_WORKERS", "16"))
+
+OP_SECONDS = telemetry.histogram("storage_op_seconds", "Storage operation latency by backend and operation.")
+OPS = telemetry.counter("storage_ops", "Storage operations by backend, operation and outcome.")
+BYTES = telemetry.counter("storage_bytes", "Bytes read and written by backend and operation.")
+
+# What head() and list() report about a blob; get() returns the data with it
+BlobInfo = namedtuple("BlobInfo", "name size etag last_modified metadata content_type")
+Blob = namedtuple("Blob", "data info offset")
+
+
+class StorageError(Exception):
+    outcome = "error"
+
+
+class BlobNotFound(StorageError, FileNotFoundError):
+    outcome = "not_found"
+
+
+class BlobNotModified(StorageError):
+    """If-None-Match matched the blob's ETag."""
+
+    outcome = "not_modified"
+
+
+class BlobModified(StorageError):
+    """If-Match did not match the blob's ETag."""
+
+    outcome = "modified"
+
+
+class RangeOutOfBounds(StorageError, RangeNotSatisfiable):
+    """The requested offset lies past the end of a blob of size bytes."""
+
+    outcome = "range_not_satisfiable"
+
+    def __init__(self, size):
+        super().__init__(f"Offset beyond blob size {size}")
+        self.size = size
+
+
+class Storage:
+    """Timing, batching and async around the backend's _head/_get/_put/_delete/_list."""
+
+    backend = "none"
+
+    def __init__(self, block_size=BLOCK_SIZE, max_concurrency=MAX_CONCURRENCY, batch_workers=BATCH_WORKERS):
+        self.block_size = block_size
+        self.max_concurrency = max(1, max_concurrency)
+        self.batch_workers = max(1, batch_workers)
+        self._pools = {}
+        self._pools_lock = threading.Lock()
+
+    def head(self, container, name):
+        """BlobInfo for the blob, or None when it does not exist."""
+        try:
+            return self._timed("head", self._head, container, name)
+        except BlobNotFound:
+            return None
+
+    def exists(self, container, name):
+        return self.head(container, name) is not None
+
+    def get(self, container, name, offset=None, length=None, if_none_match=None, if_match=None):
+        """Read a blob, or length bytes of it from offset, as a Blob.
+
+        info.size is the size of the whole blob. Raises BlobNotFound,
+        BlobNotModified when if_none_match matches, BlobModified when
+        if_match does not, and RangeOutOfBounds for an offset past the end.
+        """
+        blob = self._timed("get", self._get, container, name, offset, length, if_none_match, if_match)
+        BYTES.inc(len(blob.data), backend=self.backend, op="get")
+        return blob
+
+    def put(self, container, name, data, metadata=None, content_type=None):
+        """Write bytes (or a binary file object, from its position) as the blob, replacing it."""
+        info = self._timed("put", self._put, container, name, data, metadata or {}, content_type)
+        BYTES.inc(info.size or 0, backend=self.backend, op="put")
+        return info
+
+    def set_metadata(self, container, name, metadata):
+        """Replace the blob's metadata, leaving its data alone; the ETag changes as on Azure. Raises BlobNotFound."""
+        self._timed("set_metadata", self._set_metadata, container, name, dict(metadata))
+
+    def delete(self, container, name):
+        """Delete the blob; False when it did not exist."""
+        try:
+            self._timed("delete", self._delete, container, name)
+            return True
+        except BlobNotFound:
+            return False
+
+    def read_url(self, container, name, expires_in=300):
+        """A URL that reads the blob directly for expires_in seconds, or None when the backend has none."""
+        return None
+
+    def list(self, container, prefix=""):
+        """BlobInfo for every blob in container whose name starts with prefix (metadata not loaded)."""
+        return self._timed("list", self._list, container, prefix)
+
+    # --- Batches: results in the order of the input, run on a shared pool ---
+
+    def head_many(self, keys):
+        return self._map(lambda key: self.head(*key), keys)
+
+    def get_many(self, keys):
+        """Blob (or None when missing) for every (container, name) in keys."""
+        return self._map(self._get_or_none, keys)
+
+    def put_many(self, items):
+        """Write every item, a dict of put() arguments; returns their BlobInfo."""
+        return self._map(lambda item: self.put(**item), items)
+
+    def delete_many(self, keys):
+        return self._map(lambda key: self.delete(*key), keys)
+
+    def _get_or_none(self, key):
+        try:
+            return self.get(*key)
+        except BlobNotFound:
+            return None
+
+    def _map(self, fn, items):
+        items = list(items)
+        if len(items) < 2:
+            return [fn(item) for item in items]
+        return list(self._pool("batch", self.batch_workers).map(telemetry.bind(fn), items))
+
+    # --- Async: the same operations off the event loop ---
+
+    async def ahead(self, container, name):
+        return await asyncio.to_thread(self.head, container, name)
+
+    async def aget(self, container, name, **kwargs):
+        return await asyncio.to_thread(self.get, container, name, **kwargs)
+
+    async def aput(self, container, name, data, **kwargs):
+        return await asyncio.to_thread(self.put, container, name, data, **kwargs)
+
+    async def adelete(self, container, name):
+        return await asyncio.to_thread(self.delete, container, name)
+
+    async def ahead_many(self, keys):
+        return await asyncio.to_thread(self.head_many, keys)
+
+    async def aget_many(self, keys):
+        return await asyncio.to_thread(self.get_many, keys)
+
+    async def aput_many(self, items):
+        return await asyncio.to_thread(self.put_many, items)
+
+    def _pool(self, name, workers):
+        pool = self._pools.get(name)
+        if pool is None:
+            with self._pools_lock:
+                pool = self._pools.get(name)
+                if pool is None:
+                    pool = self._pools[name] = ThreadPoolExecutor(max_workers=workers,
+                                                                  thread_name_prefix=f"storage-{name}")
+        return pool
+
+    def _timed(self, op, call, *args):
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            result = call(*args)
+            outcome = "ok"
+            return result
+        except StorageError as e:
+            outcome = e.outcome
+            raise
+        finally:
+            seconds = time.perf_counter() - started
+            OP_SECONDS.observe(seconds, backend=self.backend, op=op)
+            OPS.inc(backend=self.backend, op=op, outcome=outcome)
+            telemetry.record_stage(f"storage.{op}", seconds, failed=outcome == "error")
+
+    def _head(self, container, name):
+        raise NotImplementedError
+
+    def _get(self, container, name, offset, length, if_none_match, if_match):
+        raise NotImplementedError
+
+    def _put(self, container, name, data, metadata, content_type):
+        raise NotImplementedError
+
+    def _set_metadata(self, container, name, metadata):
+        raise NotImplementedError
+
+    def _delete(self, container, name):
+        raise NotImplementedError
+
+    def _list(self, container, prefix):
+        raise NotImplementedError
+
+
+def _check_conditions(info, if_none_match, if_match):
+    if if_none_match and etag_matches(if_none_match, info.etag):
+        raise BlobNotModified(info.name)
+    if if_match and not etag_matches(if_match, info.etag):
+        raise BlobModified(info.name)
+
+
+def _resolve_span(size, offset, length):
+    """(offset, length) actually read; ranges running past the end are cut short like Azure does."""
+    if offset is None:
+        return 0, size
+    if offset >= size:
+        raise RangeOutOfBounds(size)
+    return offset, size - offset if length is None else min(length, size - offset)
+
+
+def _read_all(data):
+    if hasattr(data, "read"):
+        return data.read()
+    return bytes(data)
+
+
+class MemoryStorage(Storage):
+    """Blobs in a dict; for tests, benchmarks and single-process runs."""
+
+    backend = "memory"
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._blobs = {}
+        self._lock = threading.Lock()
+
+    def _entry(self, container, name):
+        entry = self._blobs.get((container, name))
+        if entry is None:
+            raise BlobNotFound(f"Blob '{name}' not found in '{container}'")
+        return entry
+
+    def _head(self, container, name):
+        return self._entry(container, name)[1]
+
+    def _get(self, container, name, offset, length, if_none_match, if_match):
+        data, info = self._entry(container, name)
+        _check_conditions(info, if_none_match, if_match)
+        offset, length = _resolve_span(info.size, offset, length)
+        return Blob(data if length == info.size else data[offset:offset + length], info, offset)
+
+    def _put(self, container, name, data, metadata, content_type):
+        data = _read_all(data)
+        info = BlobInfo(name, len(data), f'"{uuid.uuid4().hex}"', datetime.now(timezone.utc), dict(metadata),
+                        content_type)
+        with self._lock:
+            self._blobs[(container, name)] = (data, info)
+        return info
+
+    def _set_metadata(self, container, name, metadata):
+        with self._lock:
+            data, info = self._entry(container, name)
+            self._blobs[(container, name)] = (data, info._replace(etag=f'"{uuid.uuid4().hex}"', metadata=metadata))
+
+    def _delete(self, container, name):
+        with self._lock:
+            if self._blobs.pop((container, name), None) is None:
+                raise BlobNotFound(f"Blob '{name}' not found in '{container}'")
+
+    def _list(self, container, prefix):
+        with self._lock:
+            entries = [info for (c, name), (_, info) in self._blobs.items() if c == container and name.startswith(prefix)]
+        return sorted(entries, key=lambda info: info.name)
+
+
+class LocalStorage(Storage):
+    """Blobs as files under root/<container>/<name>.
+
+    ETag, content type and metadata live in a JSON sidecar under
+    root/<container>/.meta/, and writes land through a rename, so several
+    worker processes on one machine can share the directory.
+    """
+
+    backend = "local"
+    META_DIR = ".meta"
+
+    def __init__(self, root, **kwargs):
+        super().__init__(**kwargs)
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, container, name):
+        parts = (name or "").split("/")
+        if not container or "/" in container or container.startswith(".") or "\\" in name \
+                or any(part in ("", ".", "..") for part in parts) or parts[0] == self.META_DIR:
+            raise ValueError(f"Invalid blob name '{name}'.")
+        return os.path.join(self.root, container, *parts)
+
+    def _meta_path(self, container, name):
+        return os.path.join(self.root, container, self.META_DIR, *name.split("/")) + ".json"
+
+    def _head(self, container, name):
+        path = self._path(container, name)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            raise BlobNotFound(f"Blob '{name}' not found in '{container}'")
+        try:
+            with open(self._meta_path(container, name)) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            # A file dropped in by hand: derive what the sidecar would hold
+            meta = {"etag": f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"', "metadata": {}, "content_type": None}
+        return BlobInfo(name, stat.st_size, meta["etag"], datetime.fromtimestamp(stat.st_mtime, timezone.utc),
+                        meta.get("metadata") or {}, meta.get("content_type"))
+
+    def _get(self, container, name, offset, length, if_none_match, if_match):
+        info = self._head(container, name)
+        _check_conditions(info, if_none_match, if_match)
+        offset, length = _resolve_span(info.size, offset, length)
+        try:
+            with open(self._path(container, name), "rb") as f:
+                data = self._read(f, offset, length)
+        except FileNotFoundError:
+            raise BlobNotFound(f"Blob '{name}' not found in '{container}'")
+        return Blob(data, info, offset)
+
+    def _read(self, f, offset, length):
+        if length < 2 * self.block_size or self.max_concurrency < 2 or not hasattr(os, "preadv"):
+            f.seek(offset)
+            return f.read(length)
+        buffer = bytearray(length)
+        view = memoryview(buffer)
+        fd = f.fileno()
+
+        def read_block(start):
+            block = view[start:start + self.block_size]
+            done = 0
+            while done < len(block):
+                count = os.preadv(fd, [block[done:]], offset + start + done)
+                if count == 0:
+                    raise OSError("File shrank while it was being read")
+                done += count
+
+        list(self._pool("transfer", self.max_concurrency).map(read_block, range(0, length, self.block_size)))
+        return buffer
+
+    def _put(self, container, name, data, metadata, content_type):
+        path = self._path(container, name)
+        meta_path = self._meta_path(container, name)
+        temp_dir = os.path.join(self.root, container, self.META_DIR, ".tmp")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.makedirs(os.path.dirname(meta_path), exist_ok=True)
+        os.makedirs(temp_dir, exist_ok=True)
+
+        temp_path = os.path.join(temp_dir, uuid.uuid4().hex)
+        with open(temp_path, "wb") as f:
+            if hasattr(data, "read"):
+                shutil.copyfileobj(data, f, self.block_size)
+            else:
+                self._write(f, memoryview(data))
+            size = f.tell()
+        info = BlobInfo(name, size, f'"{uuid.uuid4().hex}"', datetime.now(timezone.utc), dict(metadata), content_type)
+        with open(f"{temp_path}.json", "w") as f:
+            json.dump({"etag": info.etag, "metadata": info.metadata, "content_type": content_type}, f)
+        os.replace(temp_path, path)
+        os.replace(f"{temp_path}.json", meta_path)
+        return info
+
+    def _set_metadata(self, container, name, metadata):
+        info = self._head(container, name)
+        meta_path = self._meta_path(container, name)
+        temp_dir = os.path.join(self.root, container, self.META_DIR, ".tmp")
+        os.makedirs(os.path.dirname(meta_path), exist_ok=True)
+        os.makedirs(temp_dir, exist_ok=True)
+        temp_path = os.path.join(temp_dir, f"{uuid.uuid4().hex}.json")
+        with open(temp_path, "w") as f:
+            json.dump({"etag": f'"{uuid.uuid4().hex}"', "metadata": metadata, "content_type": info.content_type}, f)
+        os.replace(temp_path, meta_path)
+
+    def _write(self, f, view):
+        if len(view) < 2 * self.block_size or self.max_concurrency < 2 or not hasattr(os, "pwrite"):
+            f.write(view)
+            return
+        fd = f.fileno()
+        os.ftruncate(fd, len(view))
+
+        def write_block(start):
+            block = view[start:start + self.block_size]
+            done = 0
+            while done < len(block):
+                done += os.pwrite(fd, block[done:], start + done)
+
+        list(self._pool("transfer", self.max_concurrency).map(write_block, range(0, len(view), self.block_size)))
+        f.seek(len(view))
+
+    def _delete(self, container, name):
+        try:
+            os.remove(self._path(container, name))
+        except FileNotFoundError:
+            raise BlobNotFound(f"Blob '{name}' not found in '{container}'")
+        try:
+            os.remove(self._meta_path(container, name))
+        except FileNotFoundError:
+            pass
+        # Drop directories a "prefix/name" blob leaves empty, up to the container
+        directory = os.path.dirname(self._path(container, name))
+        while directory != os.path.join(self.root, container):
+            try:
+                os.rmdir(directory)
+            except OSError:
+                break
+            directory = os.path.dirname(directory)
+
+    def _list(self, container, prefix):
+        container_dir = os.path.join(self.root, container)
+        names = []
+        for directory, subdirectories, files in os.walk(container_dir):
+            if directory == container_dir and self.META_DIR in subdirectories:
+                subdirectories.remove(self.META_DIR)
+            relative = os.path.relpath(directory, container_dir)
+            for filename in files:
+                name = filename if relative == "." else "/".join(relative.split(os.sep) + [filename])
+                if name.startswith(prefix):
+                    names.append(name)
+        return [info for info in (self.head(container, name) for name in sorted(names)) if info is not None]
+
+
+class AzureStorage(Storage):
+    """Azure Blob Storage; the SDK moves large blobs in parallel blocks."""
+
+    backend = "azure"
+
+    def __init__(self, connection_string=None, client=None, **kwargs):
+        super().__init__(**kwargs)
+        self.connection_string = connection_string
+        self._client = client
+        self._client_lock = threading.Lock()
+
+    @property
+    def client(self):
+        """The BlobServiceClient, created on first use with this storage's transfer sizes."""
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    from azure.storage.blob import BlobServiceClient
+
+                    self._client = BlobServiceClient.from_connection_string(
+                        self.connection_string, max_block_size=self.block_size,
+                        max_single_put_size=2 * self.block_size, max_chunk_get_size=self.block_size,
+                        max_single_get_size=2 * self.block_size)
+        return self._client
+
+    def _blob(self, container, name):
+        return self.client.get_blob_client(container=container, blob=name)
+
+    def _head(self, container, name):
+        from azure.core.exceptions import ResourceNotFoundError
+
+        try:
+            properties = self._blob(container, name).get_blob_properties()
+        except ResourceNotFoundError:
+            raise BlobNotFound(f"Blob '{name}' not found in '{container}'")
+        return self._info(name, properties)
+
+    @staticmethod
+    def _info(name, properties, size=None):
+        content_settings = getattr(properties, "content_settings", None)
+        return BlobInfo(name, properties.size if size is None else size, properties.etag, properties.last_modified,
+                        properties.metadata or {}, getattr(content_settings, "content_type", None))
+
+    def _get(self, container, name, offset, length, if_none_match, if_match):
+        from azure.core import MatchConditions
+        from azure.core.exceptions import (HttpResponseError, ResourceModifiedError, ResourceNotFoundError,
+                                           ResourceNotModifiedError)
+
+        kwargs = {"max_concurrency": self.max_concurrency}
+        if offset is not None:
+            kwargs.update(offset=offset, length=length)
+        # The service takes one condition per call; the route resolves anything richer with head() first
+        if if_none_match:
+            kwargs.update(etag=if_none_match, match_condition=MatchConditions.IfModified)
+        elif if_match:
+            kwargs.update(etag=if_match, match_condition=MatchConditions.IfNotModified)
+        blob_client = self._blob(container, name)
+        try:
+            downloader = blob_client.download_blob(**kwargs)
+            data = downloader.readall()
+        except ResourceNotFoundError:
+            raise BlobNotFound(f"Blob '{name}' not found in '{container}'")
+        except ResourceNotModifiedError:
+            raise BlobNotModified(name)
+        except ResourceModifiedError:
+            raise BlobModified(name)
+        except HttpResponseError as e:
+            if e.status_code == 416:
+                raise RangeOutOfBounds(blob_client.get_blob_properties().size)
+            raise
+        properties = downloader.properties
+        size = content_range_total(properties.content_range) or properties.size
+        return Blob(data, self._info(name, properties, size), offset or 0)
+
+    def _put(self, container, name, data, metadata, content_type):
+        from azure.core.exceptions import ResourceExistsError, ResourceNotFoundError
+        from azure.storage.blob import ContentSettings
+
+        start = data.tell() if hasattr(data, "seek") else None
+        length = None
+        if start is not None:
+            length = data.seek(0, os.SEEK_END) - start
+            data.seek(start)
+        elif not hasattr(data, "read"):
+            length = len(data)
+        kwargs = {"overwrite": True, "metadata": metadata, "length": length, "max_concurrency": self.max_concurrency}
+        if content_type:
+            kwargs["content_settings"] = ContentSettings(content_type=content_type)
+        blob_client = self._blob(container, name)
+        try:
+            result = blob_client.upload_blob(data, **kwargs)
+        except ResourceNotFoundError as e:
+            if getattr(e, "error_code", None) != "ContainerNotFound" or (start is None and hasattr(data, "read")):
+                raise
+            try:
+                self.client.create_container(container)
+            except ResourceExistsError:
+                pass
+            if start is not None:
+                data.seek(start)
+            result = blob_client.upload_blob(data, **kwargs)
+        return BlobInfo(name, length, result.get("etag"), result.get("last_modified"), metadata, content_type)
+
+    def read_url(self, container, name, expires_in=300):
+        """A read-only SAS URL for the blob; None unless the client holds an account key to sign it."""
+        from azure.storage.blob import BlobSasPermissions, generate_blob_sas
+
+        account_key = getattr(self.client.credential, "account_key", None)
+        if not account_key:
+            return None
+        blob_client = self._blob(container, name)
+        sas = generate_blob_sas(self.client.account_name, container, name, account_key=account_key,
+                                permission=BlobSasPermissions(read=True),
+                                expiry=datetime.now(timezone.utc) + timedelta(seconds=expires_in))
+        return f"{blob_client.url}?{sas}"
+
+    def _set_metadata(self, container, name, metadata):
+        from azure.core.exceptions import ResourceNotFoundError
+
+        try:
+            self._blob(container, name).set_blob_metadata(metadata)
+        except ResourceNotFoundError:
+            raise BlobNotFound(f"Blob '{name}' not found in '{container}'")
+
+    def _delete(self, container, name):
+        from azure.core.exceptions import ResourceNotFoundError
+
+        try:
+            self._blob(container, name).delete_blob()
+        except ResourceNotFoundError:
+            raise BlobNotFound(f"Blob '{name}' not found in '{container}'")
+
+    def _list(self, container, prefix):
+        from azure.core.exceptions import ResourceNotFoundError
+
+        try:
+            return [self._info(properties.name, properties)
+                    for properties in self.client.get_container_client(container).list_blobs(name_starts_with=prefix)]
+        except ResourceNotFoundError:
+            return []
+
+
+def create_storage(backend=None, connection_string=None):
+    """Create the storage selected by STORAGE_BACKEND (azure, local or memory)."""
+    backend = (backend or os.environ.get("STORAGE_BACKEND", "azure")).lower()
+    if backend == "local":
+        return LocalStorage(os.environ.get("LOCAL_STORAGE_DIR", "/tmp/docscanner-storage"))
+    if backend == "memory":
+        return MemoryStorage()
+    if backend != "azure":
+        logging.warning(f" Unknown STORAGE_BACKEND '{backend}', using azure")
+    return AzureStorage(connection_string or os.environ.get("AzureWebJobsStorage"))
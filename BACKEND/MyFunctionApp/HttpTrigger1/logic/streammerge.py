@@ -0,0 +1,196 @@
+import os
+import json
+import sqlite3
+import logging
+import tempfile
+import numpy as np
+import pandas as pd
+
+# Rows read per chunk from each input
+CHUNK_ROWS = 100_000
+
+# Distinct rows tracked in a dict before the index spills to disk; each costs about 150 bytes, however wide
+MEMORY_ROWS = int(os.environ.get("MERGE_MEMORY_ROWS", "1000000"))
+
+# Bound parameters per SQLite IN (...) lookup
+SQLITE_BATCH = 500
+
+
+class RowIndex:
+    """Maps each distinct row, by its row_keys digest, to the position of its last occurrence.
+
+    Digests are 128 bits of keyed SipHash over every value of the row, so two
+    different rows share one with a chance of about n**2 / 2**129 for n
+    distinct rows. Every entry has the same small size, whatever the width
+    of the rows. The index lives in a dict until it holds max_memory_rows
+    entries, then moves into a temporary SQLite file of those digests.
+    """
+
+    def __init__(self, max_memory_rows=MEMORY_ROWS, spill_dir=None):
+        self.max_memory_rows = max_memory_rows
+        self.spill_dir = spill_dir
+        self._memory = {}
+        self._conn = None
+        self._path = None
+
+    @property
+    def spilled(self):
+        return self._conn is not None
+
+    def update(self, rows, start):
+        """Record that the row with digest rows[i] (see row_keys) was seen at position start + i (later wins)."""
+        positions = range(start, start + len(rows))
+        if self._conn is None:
+            self._memory.update(zip(rows, positions))
+            if len(self._memory) > self.max_memory_rows:
+                self._spill()
+            return
+        self._conn.executemany(
+            "INSERT INTO rows (row, pos) VALUES (?, ?) ON CONFLICT (row) DO UPDATE SET pos = excluded.pos",
+            zip(rows, positions))
+
+    def last_positions(self, rows):
+        """Array of last-seen positions for row digests."""
+        if self._conn is None:
+            return np.fromiter((self._memory[row] for row in rows), dtype=np.int64, count=len(rows))
+
+        found = {}
+        unique = list(set(rows))
+        for offset in range(0, len(unique), SQLITE_BATCH):
+            batch = unique[offset:offset + SQLITE_BATCH]
+            placeholders = ",".join("?" * len(batch))
+            found.update(self._conn.execute(
+                f"SELECT row, pos FROM rows WHERE row IN ({placeholders})", batch).fetchall())
+        return np.fromiter((found[row] for row in rows), dtype=np.int64, count=len(rows))
+
+    def _spill(self):
+        handle, self._path = tempfile.mkstemp(suffix=".rowindex.db", dir=self.spill_dir)
+        os.close(handle)
+        logging.info(f" Row index exceeded {self.max_memory_rows} rows, spilling to {self._path}")
+        self._conn = sqlite3.connect(self._path)
+        self._conn.execute("PRAGMA journal_mode=OFF")
+        self._conn.execute("PRAGMA synchronous=OFF")
+        self._conn.execute("CREATE TABLE rows (row BLOB PRIMARY KEY, pos INTEGER NOT NULL) WITHOUT ROWID")
+        self._conn.executemany("INSERT INTO rows (row, pos) VALUES (?, ?)", self._memory.items())
+        self._conn.commit()
+        self._memory = {}
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            os.remove(self._path)
+            self._conn = None
+        self._memory = {}
+
+
+# Written between the values of a row, and before the list of its missing columns, when digesting it
+SEPARATOR = "\x1f"
+MISSING = "\x1e"
+
+# 16-character keys of the two halves of a row digest
+DIGEST_KEYS = ("streammerge-row1", "streammerge-row2")
+
+
+def read_header(source):
+    """Column names of a CSV path or file-like, as pandas would name them."""
+    if hasattr(source, "seek"):
+        source.seek(0)
+    return list(pd.read_csv(source, nrows=0).columns)
+
+
+def read_chunks(source, columns, chunksize=CHUNK_ROWS):
+    """Yield string-typed chunks of a CSV (or a DataFrame) aligned to columns; missing columns are NaN."""
+    if isinstance(source, pd.DataFrame):
+        frames = (source.iloc[i:i + chunksize] for i in range(0, len(source), chunksize))
+    else:
+        if hasattr(source, "seek"):
+            source.seek(0)
+        frames = pd.read_csv(source, dtype=str, keep_default_na=False, chunksize=chunksize)
+    for chunk in frames:
+        yield chunk.reindex(columns=columns)
+
+
+def row_keys(chunk):
+    """A 16-byte digest of each row of chunk (string values or NaN), for RowIndex.
+
+    The digest covers the values and which of them are NaN, so missing
+    values match each other but not "", as in drop_duplicates. Values are
+    joined with SEPARATOR; a row holding SEPARATOR or MISSING itself is
+    digested as JSON instead, so no two rows can give the same text.
+    """
+    columns, missing_columns = [], []
+    for index, (_, values) in enumerate(chunk.items()):
+        missing = values.isna()
+        if missing.any():
+            missing_columns.append((str(index), missing.tolist()))
+            values = values.where(~missing, "")
+        columns.append(values.tolist())
+    texts = [SEPARATOR.join(row) for row in zip(*columns)]
+    if missing_columns:
+        flags = zip(*(mask for _, mask in missing_columns))
+        suffixes = [",".join(index for (index, _), flag in zip(missing_columns, row_flags) if flag)
+                    for row_flags in flags]
+    else:
+        suffixes = [""] * len(texts)
+
+    separators = len(columns) - 1
+    texts = np.array([text + MISSING + suffix if text.count(SEPARATOR) == separators and MISSING not in text
+                      else MISSING + json.dumps([row, suffix], ensure_ascii=False)
+                      for text, suffix, row in zip(texts, suffixes, zip(*columns))], dtype=object)
+    # Two SipHash digests under independent keys make one of 128 bits
+    digests = np.stack([pd.util.hash_array(texts, hash_key=key) for key in DIGEST_KEYS], axis=1).tobytes()
+    return [digests[offset:offset + 16] for offset in range(0, len(digests), 16)]
+
+
+def merge_csv_streaming(sources, merged_path, chunksize=CHUNK_ROWS, max_memory_rows=MEMORY_ROWS,
+                        sample_rows=20):
+    """Concatenate CSVs and drop duplicate rows with keep='last', out of core.
+
+    Equivalent to pd.concat(sources).drop_duplicates(keep='last') written with
+    index=False, for sources read with dtype=str and keep_default_na=False,
+    but reads in chunks: pass one records the last position of every
+    distinct row, pass two writes each row only at that position. As in
+    concat, a column a source lacks is NaN in its rows (written empty), so
+    such a row is not a duplicate of one with an empty value there. Unlike a
+    default read_csv, values are kept as the original text: numbers are
+    never reformatted, "1" and "1.0" differ, and "NA" or "null" are text,
+    not missing. Sources may be paths, file-likes or already parsed string
+    DataFrames.
+
+    Returns (rows_in, rows_out, sample) where sample holds the first
+    sample_rows merged rows for analysis.
+    """
+    columns = []
+    for source in sources:
+        header = list(source.columns) if isinstance(source, pd.DataFrame) else read_header(source)
+        columns.extend(c for c in header if c not in columns)
+
+    index = RowIndex(max_memory_rows, spill_dir=os.path.dirname(merged_path) or None)
+    try:
+        position = 0
+        for source in sources:
+            for chunk in read_chunks(source, columns, chunksize):
+                index.update(row_keys(chunk), position)
+                position += len(chunk)
+        rows_in = position
+
+        rows_out = 0
+        samples = []
+        position = 0
+        with open(merged_path, "w", newline="", encoding="utf-8") as out_file:
+            pd.DataFrame(columns=columns).to_csv(out_file, index=False)
+            for source in sources:
+                for chunk in read_chunks(source, columns, chunksize):
+                    positions = np.arange(position, position + len(chunk))
+                    keep = index.last_positions(row_keys(chunk)) == positions
+                    kept = chunk[keep]
+                    kept.to_csv(out_file, index=False, header=False)
+                    position += len(chunk)
+                    rows_out += len(kept)
+                    if sum(len(s) for s in samples) < sample_rows:
+                        samples.append(kept.head(sample_rows))
+    finally:
+        index.close()
+
+    sample = pd.concat(samples, ignore_index=True).head(sample_rows) if samples else pd.DataFrame(columns=columns)
+    return rows_in, rows_out, sample
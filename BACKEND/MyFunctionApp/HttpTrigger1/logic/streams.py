@@ -0,0 +1,129 @@
+import io
+import os
+from contextlib import contextmanager
+
+
+def is_path(target):
+    """True when target names a file on disk rather than holding data."""
+    return isinstance(target, (str, os.PathLike))
+
+
+def read_source(source):
+    """Return the full contents of a path, bytes object or binary file-like."""
+    if is_path(source):
+        with open(source, "rb") as f:
+            return f.read()
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return bytes(source)
+    if hasattr(source, "getvalue"):
+        return source.getvalue()
+    return source.read()
+
+
+def source_buffer(source):
+    """Like read_source, but bytes-like data and in-memory streams come back uncopied, as a memoryview."""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return memoryview(source)
+    if hasattr(source, "getbuffer"):
+        return source.getbuffer()
+    return read_source(source)
+
+
+class BufferReader(io.RawIOBase):
+    """Seekable binary file-like over a bytes-like object, reading from its memory instead of a copy.
+
+    Each reader keeps its own position, so several libraries can read one
+    in-memory document at once.
+    """
+
+    def __init__(self, data):
+        super().__init__()
+        self._view = memoryview(data).cast("B")
+        self._position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_CUR:
+            offset += self._position
+        elif whence == os.SEEK_END:
+            offset += len(self._view)
+        if offset < 0:
+            raise ValueError(f"Negative seek position {offset}")
+        self._position = offset
+        return offset
+
+    def read(self, size=-1):
+        end = len(self._view) if size is None or size < 0 else min(self._position + size, len(self._view))
+        data = self._view[self._position:end].tobytes() if end > self._position else b""
+        self._position = max(self._position, end)
+        return data
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        if not self.closed:
+            # Let the owner of the data resize or close it again
+            self._view.release()
+        super().close()
+
+
+@contextmanager
+def open_source(source):
+    """Yield a seekable binary file-like for a path, bytes-like object or file-like."""
+    if is_path(source):
+        with open(source, "rb") as f:
+            yield f
+    elif isinstance(source, (bytes, bytearray, memoryview)):
+        with BufferReader(source) as reader:
+            yield reader
+    else:
+        source.seek(0)
+        yield source
+
+
+@contextmanager
+def open_text_output(destination):
+    """Yield a text handle writing to a path or to a text/binary file-like.
+
+    File-like destinations are left open so the caller can rewind and
+    upload them; binary ones receive UTF-8.
+    """
+    if is_path(destination):
+        directory = os.path.dirname(destination)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(destination, "w", newline="", encoding="utf-8") as f:
+            yield f
+    elif isinstance(destination, io.TextIOBase):
+        yield destination
+    else:
+        wrapper = io.TextIOWrapper(destination, encoding="utf-8", newline="")
+        try:
+            yield wrapper
+        finally:
+            wrapper.flush()
+            wrapper.detach()
+
+
+@contextmanager
+def open_binary_output(destination):
+    """Yield a binary handle writing to a path or to a binary file-like (left open)."""
+    if is_path(destination):
+        directory = os.path.dirname(destination)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(destination, "wb") as f:
+            yield f
+    else:
+        yield destination
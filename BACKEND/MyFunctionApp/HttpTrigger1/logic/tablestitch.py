@@ -0,0 +1,217 @@
+import os
+import csv
+import gzip
+import shutil
+import zipfile
+import tempfile
+import itertools
+from collections import namedtuple
+import pandas as pd
+from .streams import open_text_output, open_binary_output
+from .outputformat import TYPED_FORMATS, BATCH_ROWS, ColumnType, extension, write_frame, write_row_batches
+
+# Column boundaries closer than this many points count as the same column
+COLUMN_TOLERANCE = float(os.environ.get("PDF_COLUMN_TOLERANCE", "3"))
+
+# Bytes of one table's CSV text held in memory before it spills to a temporary file
+SPOOL_BYTES = int(os.environ.get("TABLE_SPOOL_BYTES", str(16 * 1024 * 1024)))
+
+# One table found on a page. columns holds the x positions of its column
+# boundaries, or None when unknown (e.g. a table read from a scanned page).
+ExtractedTable = namedtuple("ExtractedTable", ["rows", "columns", "page"])
+
+
+def table_columns(table):
+    """x positions of the column boundaries of a pdfplumber Table."""
+    columns = table.columns
+    if not columns:
+        return None
+    return tuple(round(column.bbox[0], 1) for column in columns) + (round(columns[-1].bbox[2], 1),)
+
+
+class TableStitcher:
+    """Joins tables that continue across pages into logical tables, incrementally.
+
+    A table continues the current logical table when it has as many columns
+    and either repeats the header row (which is dropped) or sits on the next
+    page with the same column boundaries, in which case its first row is data.
+    Anything else starts a new logical table headed by its first row. Only the
+    current table's header and geometry are kept, so tables can be fed
+    straight from the page stream.
+    """
+
+    def __init__(self, sink, tolerance=COLUMN_TOLERANCE):
+        self.sink = sink
+        self.tolerance = tolerance
+        self.header = None
+        self.columns = None
+        self.page = None
+        self.tables_in = 0
+        self.logical_tables = 0
+
+    def add(self, table):
+        rows = [[_cell(c) for c in row] for row in table.rows]
+        if not rows:
+            return
+        self.tables_in += 1
+        if self._repeats_header(rows[0]):
+            rows = rows[1:]
+        elif not self._continues(table, rows[0]):
+            self.header = rows[0]
+            rows = rows[1:]
+            self.logical_tables += 1
+            self.sink.start_table(self.header)
+        self.columns = table.columns or self.columns
+        self.page = table.page
+        self.sink.write_rows(rows)
+
+    def _repeats_header(self, first_row):
+        return self.header is not None and _normalized(first_row) == _normalized(self.header)
+
+    def _continues(self, table, first_row):
+        if self.header is None or len(first_row) != len(self.header):
+            return False
+        if table.columns is None or self.columns is None or len(table.columns) != len(self.columns):
+            return False
+        if self.page is None or table.page != self.page + 1:
+            return False
+        return all(abs(a - b) <= self.tolerance for a, b in zip(table.columns, self.columns))
+
+
+class TableFileSink:
+    """The logical tables of a document as one file in output_format, or a zip with one file per table.
+
+    A document with a single logical table becomes a single file. As soon as
+    a second table starts, the output becomes a zip archive (table_001.csv,
+    ...), so no file ever mixes two headers; split_tables asks for the
+    archive even for one table, and archived tells which was written. Each
+    table's rows are spooled as CSV text (see SPOOL_BYTES) until the next
+    table starts, when its place is known. For Parquet and Arrow, column
+    types are followed as the rows arrive, so a column's type reflects the
+    whole table, and the spool is then written in batches of BATCH_ROWS.
+    """
+
+    def __init__(self, output, output_format="csv", split_tables=False):
+        self.output = output
+        self.output_format = output_format
+        self.split_tables = split_tables
+        self.count = 0
+        self.archive = None
+        # The first table waits until it is clear whether a second one follows
+        self._pending = None
+        self._table = None
+
+    @property
+    def archived(self):
+        return self.archive is not None
+
+    def start_table(self, header):
+        self._finish_table()
+        self.count += 1
+        self._table = _SpooledTable(header, self.output_format in TYPED_FORMATS)
+
+    def write_rows(self, rows):
+        self._table.write(rows)
+
+    def close(self):
+        """Write whatever is still spooled; a document without tables leaves an empty file (or archive)."""
+        self._finish_table()
+        if self.split_tables and self.archive is None:
+            self._open_archive()
+        if self.archive is not None:
+            self.archive.close()
+        elif self._pending is not None:
+            self._pending.write_to(self.output, self.output_format)
+            self._pending.discard()
+        elif self.output_format != "csv":
+            write_frame(pd.DataFrame(), self.output, self.output_format)
+
+    def discard(self):
+        for table in (self._pending, self._table):
+            if table is not None:
+                table.discard()
+
+    def _finish_table(self):
+        table, self._table = self._table, None
+        if table is None:
+            return
+        if self.archive is None and not self.split_tables and self.count == 1:
+            self._pending = table
+            return
+        if self.archive is None:
+            self._open_archive()
+        self._write_entry(table, self.count)
+
+    def _open_archive(self):
+        self.archive = zipfile.ZipFile(self.output, "w", zipfile.ZIP_DEFLATED)
+        if self._pending is not None:
+            pending, self._pending = self._pending, None
+            self._write_entry(pending, 1)
+
+    def _write_entry(self, table, number):
+        # The archive is already compressed, so gzip CSV entries would gain nothing
+        entry_format = self.output_format if self.output_format in TYPED_FORMATS else "csv"
+        with self.archive.open(f"table_{number:03d}{extension(entry_format)}", "w") as entry:
+            table.write_to(entry, entry_format)
+        table.discard()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+
+class _SpooledTable:
+    """One logical table: its header and its rows as CSV text, in memory up to SPOOL_BYTES and on disk after.
+
+    With typed, the type of each column is followed as rows are written.
+    """
+
+    def __init__(self, header, typed=False):
+        self.header = header
+        self.rows = 0
+        self.file = tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES, mode="w+", newline="", encoding="utf-8")
+        self.writer = csv.writer(self.file)
+        self.types = [ColumnType() for _ in header] if typed else None
+
+    def write(self, rows):
+        self.writer.writerows(rows)
+        self.rows += len(rows)
+        if self.types is not None and rows:
+            width = len(self.header)
+            rows = [row if len(row) == width else list(row[:width]) + [""] * (width - len(row)) for row in rows]
+            for column, values in zip(self.types, zip(*rows)):
+                column.observe(values)
+
+    def write_to(self, output, output_format):
+        self.file.seek(0)
+        if output_format in TYPED_FORMATS:
+            reader = csv.reader(self.file)
+            batches = iter(lambda: list(itertools.islice(reader, BATCH_ROWS)), [])
+            write_row_batches(self.header, batches, [column.name for column in self.types], output, output_format)
+        elif output_format == "csv.gz":
+            with open_binary_output(output) as raw, gzip.GzipFile(fileobj=raw, mode="wb") as compressed, \
+                    open_text_output(compressed) as out_file:
+                self._copy(out_file)
+        else:
+            with open_text_output(output) as out_file:
+                self._copy(out_file)
+
+    def _copy(self, out_file):
+        csv.writer(out_file).writerow(self.header)
+        shutil.copyfileobj(self.file, out_file)
+
+    def discard(self):
+        self.file.close()
+
+
+def _normalized(row):
+    return [cell.strip().lower() for cell in row]
+
+
+def _cell(value):
+    return "" if value is None else value
@@ -0,0 +1,302 @@
+"""Request tracing and metrics for the function app.
+
+Each request runs in a request_context carrying a correlation id. Spans time
+the stages of a request; every span feeds the stage histogram and, when the
+client asks for it, the request's Server-Timing header. Counters, histograms
+and registered collectors are rendered by render() in the OpenMetrics text
+format served at /api/metrics.
+"""
+import os
+import time
+import uuid
+import logging
+import functools
+import threading
+import contextvars
+from contextlib import contextmanager
+
+METRIC_PREFIX = "docscanner"
+
+# Request header carrying a caller's correlation id; echoed on every response
+CORRELATION_HEADER = "X-Correlation-ID"
+
+# Request header asking for a Server-Timing breakdown; STAGE_TIMINGS_HEADER=1 sends it always
+TIMINGS_REQUEST_HEADER = "X-Stage-Timings"
+TIMINGS_ALWAYS = os.environ.get("STAGE_TIMINGS_HEADER", "0") == "1"
+
+# Histogram buckets in seconds, from blob round trips up to long PDFs
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+OPENMETRICS_CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_correlation_id = contextvars.ContextVar("correlation_id", default=None)
+_stage_timings = contextvars.ContextVar("stage_timings", default=None)
+
+
+def correlation_id():
+    """Correlation id of the current request, or None outside one."""
+    return _correlation_id.get()
+
+
+@contextmanager
+def request_context(incoming_id=None):
+    """Run a request under a correlation id (incoming_id or a new one).
+
+    Yields the list the request's spans append (stage, seconds) to.
+    """
+    timings = []
+    tokens = (_correlation_id.set(incoming_id or uuid.uuid4().hex), _stage_timings.set(timings))
+    try:
+        yield timings
+    finally:
+        _stage_timings.reset(tokens[1])
+        _correlation_id.reset(tokens[0])
+
+
+@contextmanager
+def span(stage):
+    """Time one stage of the current request; usable as a decorator too."""
+    started = time.perf_counter()
+    failed = True
+    try:
+        yield
+        failed = False
+    finally:
+        record_stage(stage, time.perf_counter() - started, failed)
+
+
+def record_stage(stage, seconds, failed=False):
+    """Account a stage timed elsewhere the same way span() does."""
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    if failed:
+        STAGE_ERRORS.inc(stage=stage)
+    timings = _stage_timings.get()
+    if timings is not None:
+        timings.append((stage, seconds))
+    logging.debug(f" [{correlation_id()}] {stage} {'failed after' if failed else 'took'} {seconds * 1000:.1f}ms")
+
+
+def bind(fn):
+    """Wrap fn to run in the caller's request context, e.g. on a pool thread.
+
+    Each call gets its own copy of the context, so the wrapper may run on
+    several threads at once; spans still land in the request's timings.
+    """
+    context = contextvars.copy_context()
+
+    @functools.wraps(fn)
+    def bound(*args, **kwargs):
+        return context.copy().run(fn, *args, **kwargs)
+    return bound
+
+
+def server_timing(timings):
+    """Server-Timing header value summing repeated stages, in first-seen order."""
+    totals = {}
+    for stage, seconds in timings:
+        total, count = totals.get(stage, (0.0, 0))
+        totals[stage] = (total + seconds, count + 1)
+    return ", ".join(f'{stage};dur={total * 1000:.1f}' + (f';desc="x{count}"' if count > 1 else "")
+                     for stage, (total, count) in totals.items())
+
+
+def instrument_route(route):
+    """Decorator for an HTTP function: request context, counters and response headers.
+
+    Place it under @app.route; the wrapper keeps the handler's name and its
+    'req' parameter, which the Functions host binds by name.
+    """
+    def decorator(handler):
+        @functools.wraps(handler)
+        def wrapper(req):
+            with request_context(req.headers.get(CORRELATION_HEADER)) as timings:
+                started = time.perf_counter()
+                response = None
+                try:
+                    response = handler(req)
+                    return response
+                finally:
+                    seconds = time.perf_counter() - started
+                    status = response.status_code if response is not None else 500
+                    HTTP_REQUESTS.inc(route=route, method=req.method, status=str(status))
+                    HTTP_SECONDS.observe(seconds, route=route)
+                    if response is not None:
+                        response.headers[CORRELATION_HEADER] = correlation_id()
+                        if timings and (TIMINGS_ALWAYS or req.headers.get(TIMINGS_REQUEST_HEADER)):
+                            response.headers["Server-Timing"] = server_timing(timings + [("total", seconds)])
+                    logging.info(f"{route} {req.method} {status} in {seconds * 1000:.1f}ms "
+                                 f"[correlation_id={correlation_id()}]")
+        return wrapper
+    return decorator
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+               for value in labels.values())
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(labels, escaped)) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic count per label set."""
+
+    kind = "counter"
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(sorted(labels.items())), 0)
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [("_total", dict(key), value) for key, value in items]
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label set."""
+
+    kind = "histogram"
+
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0, 0.0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][index] += 1
+                    break
+            series[1] += 1
+            series[2] += value
+
+    def count(self, **labels):
+        series = self._series.get(tuple(sorted(labels.items())))
+        return series[1] if series else 0
+
+    def samples(self):
+        with self._lock:
+            items = [(key, list(series[0]), series[1], series[2]) for key, series in self._series.items()]
+        samples = []
+        for key, bucket_counts, count, total in items:
+            labels = dict(key)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, bucket_counts):
+                cumulative += bucket_count
+                samples.append(("_bucket", {**labels, "le": _format_value(float(bound))}, cumulative))
+            samples.append(("_count", labels, count))
+            samples.append(("_sum", labels, total))
+        return samples
+
+
+class Registry:
+    """Metrics created in this process plus collectors polled at render time.
+
+    A collector is a callable returning (name, kind, help, [(labels, value)])
+    tuples, for state that already has its own counters (cache, Gemini
+    client, job queue). kind is "counter" or "gauge".
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name, help_text):
+        return self._get_or_create(Counter, name, help_text)
+
+    def histogram(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        return self._get_or_create(Histogram, name, help_text, buckets)
+
+    def _get_or_create(self, cls, name, *args):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(f"{METRIC_PREFIX}_{name}", *args)
+            return metric
+
+    def register_collector(self, name, collect):
+        """Add collect under name, replacing an earlier collector of that name."""
+        with self._lock:
+            self._collectors[name] = collect
+
+    def render(self, openmetrics=True):
+        """All metrics as OpenMetrics text, or Prometheus 0.0.4 text when openmetrics is False."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors.items())
+        lines = []
+        for metric in metrics:
+            _render_family(lines, metric.name, metric.kind, metric.help, metric.samples(), openmetrics)
+        for collector_name, collect in collectors:
+            try:
+                families = collect()
+            except Exception as e:
+                logging.warning(f" Metrics collector '{collector_name}' failed: {e}")
+                continue
+            for name, kind, help_text, values in families:
+                samples = [("_total" if kind == "counter" else "", labels, value) for labels, value in values]
+                _render_family(lines, f"{METRIC_PREFIX}_{name}", kind, help_text, samples, openmetrics)
+        if openmetrics:
+            lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+
+def _render_family(lines, name, kind, help_text, samples, openmetrics):
+    # Prometheus text names a counter family after its _total sample
+    family = name if openmetrics or kind != "counter" else f"{name}_total"
+    lines.append(f"# HELP {family} {help_text}")
+    lines.append(f"# TYPE {family} {kind}")
+    for suffix, labels, value in samples:
+        lines.append(f"{name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+
+
+registry = Registry()
+
+STAGE_SECONDS = registry.histogram("stage_seconds", "Time spent in each request stage.")
+STAGE_ERRORS = registry.counter("stage_errors", "Stages that ended with an exception.")
+HTTP_REQUESTS = registry.counter("http_requests", "HTTP requests by route, method and status.")
+HTTP_SECONDS = registry.histogram("http_request_seconds", "HTTP request latency by route.")
+
+
+def counter(name, help_text):
+    """Process-wide counter docscanner_<name>_total."""
+    return registry.counter(name, help_text)
+
+
+def histogram(name, help_text, buckets=DEFAULT_BUCKETS):
+    """Process-wide histogram docscanner_<name>."""
+    return registry.histogram(name, help_text, buckets)
+
+
+def register_collector(name, collect):
+    registry.register_collector(name, collect)
+
+
+def render(openmetrics=True):
+    return registry.render(openmetrics)
@@ -0,0 +1 @@
+"""Offline benchmarks for the function app; see README.md "Benchmarks"."""
@@ -0,0 +1,110 @@
+"""Cold-start benchmark: import time and first vs. second request latency per endpoint.
+
+Every run is a fresh interpreter, like a new Functions worker, so the first
+request pays for whatever the route imports and creates lazily. Storage is
+in memory and Gemini the local fake server, so no network is used:
+
+    python -m benchmarks.coldstart --runs 5
+    python -m benchmarks.coldstart --endpoints upload pdf --runs 10
+"""
+import os
+import sys
+import json
+import time
+import pickle
+import shutil
+import argparse
+import tempfile
+import statistics
+import subprocess
+from .harness import APP_DIR, build_document, http_request, local_env
+
+ENDPOINTS = ("upload", "download", "cache-stats", "image", "pdf", "merge")
+
+# Modules whose presence after a request shows what the route pulled in
+HEAVY_MODULES = ("pandas", "numpy", "pdfplumber", "pypdfium2", "PIL", "pyarrow")
+
+
+def run_child(endpoint, document_path):
+    """One cold start: import the app, then time two identical requests."""
+    from HttpTrigger1.logic.fakegemini import FakeGeminiServer
+
+    # Built by the parent, so generating it (with PIL) does not warm anything up here
+    with open(document_path, "rb") as f:
+        document = pickle.load(f)
+    gemini = FakeGeminiServer().start()
+    os.environ["GEMINI_BASE_URL"] = gemini.url
+
+    started = time.perf_counter()
+    import function_app
+    import_seconds = time.perf_counter() - started
+    import azure.functions as func
+
+    blob_storage = function_app.get_storage()
+    inputs = dict(document)
+    if endpoint in ("image", "pdf"):
+        inputs["file_id"] = "sample" + os.path.splitext(document["filename"])[1]
+        blob_storage.put(function_app.UPLOADS_CONTAINER, inputs["file_id"], document["data"])
+    elif endpoint == "download":
+        inputs["file_id"] = "sample.csv"
+        blob_storage.put(function_app.OUTPUTS_CONTAINER, "sample.csv", document["data"], content_type="text/csv")
+
+    timings = []
+    statuses = []
+    for _ in range(2):
+        route, request = http_request(func, endpoint, inputs)
+        handler = getattr(function_app, route)
+        started = time.perf_counter()
+        response = handler(request)
+        timings.append(time.perf_counter() - started)
+        statuses.append(response.status_code)
+    gemini.stop()
+    print(json.dumps({
+        "endpoint": endpoint,
+        "import_seconds": import_seconds,
+        "first_seconds": timings[0],
+        "second_seconds": timings[1],
+        "statuses": statuses,
+        "modules": [m for m in HEAVY_MODULES if m in sys.modules],
+    }))
+
+
+def spawn(endpoint, document_path):
+    completed = subprocess.run([sys.executable, "-m", "benchmarks.coldstart", "--child", endpoint, document_path],
+                               cwd=APP_DIR, env=local_env(), capture_output=True, text=True, check=True)
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--endpoints", nargs="+", choices=ENDPOINTS, default=list(ENDPOINTS))
+    parser.add_argument("--runs", type=int, default=3, help="fresh processes per endpoint")
+    parser.add_argument("--json", action="store_true", help="print raw results as JSON lines")
+    parser.add_argument("--child", nargs=2, metavar=("ENDPOINT", "DOCUMENT"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(*args.child)
+        return
+
+    work_dir = tempfile.mkdtemp()
+    print(f"{'endpoint':<12} {'import ms':>10} {'first ms':>10} {'second ms':>10}  status  modules loaded")
+    for endpoint in args.endpoints:
+        document_path = os.path.join(work_dir, f"{endpoint}.pickle")
+        with open(document_path, "wb") as f:
+            pickle.dump(build_document(endpoint, "small"), f)
+        results = [spawn(endpoint, document_path) for _ in range(args.runs)]
+        if args.json:
+            for result in results:
+                print(json.dumps(result))
+            continue
+        median = lambda key: statistics.median(r[key] for r in results) * 1000
+        print(f"{endpoint:<12} {median('import_seconds'):>10.1f} {median('first_seconds'):>10.1f} "
+              f"{median('second_seconds'):>10.1f}  {'/'.join(map(str, results[-1]['statuses'])):<7} "
+              f"{','.join(results[-1]['modules']) or '-'}")
+
+    shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,327 @@
+"""Shared pieces of the benchmarks: the app on in-memory storage, requests and statistics."""
+import os
+import sys
+import json
+import time
+import uuid
+import resource
+import threading
+from .samples import SIZES, table_pdf, table_image, scanned_pdf, csv_bytes
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Sent with a client id, which admission control only honors from a request with a key it knows
+API_KEY = os.environ.get("BENCHMARK_API_KEY", "benchmark")
+
+# Endpoint name -> (route function, HTTP method, route path)
+ROUTES = {
+    "upload": ("upload_file", "POST", "upload"),
+    "download": ("download_file", "GET", "download/{file_id}"),
+    "cache-stats": ("cache_stats", "GET", "cache/stats"),
+    "image": ("process_image_to_csv", "POST", "process/image-to-csv"),
+    "pdf": ("process_pdf_to_csv", "POST", "process/pdf-to-csv"),
+    "pdf-scanned": ("process_pdf_to_csv", "POST", "process/pdf-to-csv"),
+    # A revised PDF with one page edited, re-processed against the original's page manifest
+    "pdf-revision": ("process_pdf_to_csv", "POST", "process/pdf-to-csv"),
+    "merge": ("process_merge_csv", "POST", "process/merge-csv"),
+}
+
+
+def local_env(**overrides):
+    """Environment for running the app offline; results are not cached and requests not throttled unless asked.
+
+    Storage is in memory unless STORAGE_BACKEND is set, e.g. to local.
+    """
+    env = dict(os.environ)
+    env.update(JOB_QUEUE="local", GEMINI_API_KEY="fake", PYTHONPATH=APP_DIR)
+    env.setdefault("STORAGE_BACKEND", "memory")
+    env.setdefault("RESULT_CACHE", "none")
+    env.setdefault("ADMISSION_CONTROL", "0")
+    env.setdefault("ADMISSION_API_KEYS", API_KEY)
+    env.update(overrides)
+    return env
+
+
+class LocalApp:
+    """function_app running in this process on in-memory storage and the fake Gemini server.
+
+    gemini_latency (seconds) makes every model call take that long, as a
+    stand-in for the real service's response time.
+    """
+
+    def __init__(self, gemini_latency=0.0):
+        from HttpTrigger1.logic.fakegemini import FakeGeminiServer
+
+        self.gemini = FakeGeminiServer(latency=gemini_latency).start()
+        for key, value in local_env(GEMINI_BASE_URL=self.gemini.url).items():
+            os.environ.setdefault(key, value)
+        os.environ["GEMINI_BASE_URL"] = self.gemini.url
+
+        import function_app
+        import azure.functions as func
+
+        self.app = function_app
+        self.func = func
+        self.storage = function_app.get_storage()
+
+    def seed(self, container, name, data):
+        self.storage.put(container, name, data)
+        return name
+
+    def call(self, endpoint, inputs):
+        """Send one request to endpoint; returns (status, parsed JSON body or None)."""
+        route_function, request = http_request(self.func, endpoint, inputs)
+        response = getattr(self.app, route_function)(request)
+        return response.status_code, _json_or_none(response.get_body())
+
+    def stage(self, endpoint, document):
+        """Inputs for calling endpoint with document, storing the file where the route reads it."""
+        extension = os.path.splitext(document.get("filename", ""))[1]
+        if endpoint in ("image", "pdf", "pdf-scanned"):
+            return {"file_id": self.seed(self.app.UPLOADS_CONTAINER, f"{uuid.uuid4()}{extension}", document["data"])}
+        if endpoint == "download":
+            return {"file_id": self.seed(self.app.OUTPUTS_CONTAINER, f"{uuid.uuid4()}{extension}", document["data"])}
+        if endpoint == "pdf-revision":
+            previous = self.seed(self.app.UPLOADS_CONTAINER, f"{uuid.uuid4()}{extension}", document["data"])
+            status, body = self.call("pdf", {"file_id": previous})
+            if status != 200:
+                raise RuntimeError(f"Converting the original failed with HTTP {status}: {body}")
+            return {"file_id": self.seed(self.app.UPLOADS_CONTAINER, f"{uuid.uuid4()}{extension}", document["revision"]),
+                    "previous_file_id": previous}
+        return document
+
+    def close(self):
+        self.gemini.stop()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class HttpTarget:
+    """A running function host, e.g. `func start`, reached over HTTP.
+
+    Each thread keeps its own keep-alive session.
+    """
+
+    def __init__(self, base_url, timeout=300):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _session(self):
+        session = getattr(self._local, "session", None)
+        if session is None:
+            import requests
+
+            session = self._local.session = requests.Session()
+        return session
+
+    def call(self, endpoint, inputs):
+        method, path, headers, body = request_parts(endpoint, inputs)
+        response = self._session().request(method, f"{self.base_url}/{path}", headers=headers, data=body,
+                                           timeout=self.timeout)
+        return response.status_code, _json_or_none(response.content)
+
+    def stage(self, endpoint, document):
+        """Upload document through the API and return the inputs endpoint needs."""
+        if endpoint == "pdf-revision":
+            previous = self.stage("pdf", document)["file_id"]
+            status, body = self.call("pdf", {"file_id": previous})
+            if status != 200:
+                raise RuntimeError(f"Converting the original failed with HTTP {status}: {body}")
+            revision = self.stage("pdf", {"filename": document["filename"], "data": document["revision"]})
+            return {"file_id": revision["file_id"], "previous_file_id": previous}
+        if endpoint not in ("image", "pdf", "pdf-scanned", "download"):
+            return document
+        if endpoint == "download":
+            # Only conversions write to the outputs container, so convert a PDF and download its CSV
+            document = {"filename": "source.pdf", "data": document["source"]}
+        status, body = self.call("upload", document)
+        if status != 200:
+            raise RuntimeError(f"Upload failed with HTTP {status}: {body}")
+        if endpoint != "download":
+            return {"file_id": body["file_id"]}
+        # Something has to be in the outputs container to download it
+        status, body = self.call("pdf", {"file_id": body["file_id"]})
+        if status != 200:
+            raise RuntimeError(f"Conversion for the download benchmark failed with HTTP {status}: {body}")
+        return {"file_id": body["output_filename"]}
+
+    def close(self):
+        pass
+
+
+def run_load(target, calls, concurrency=1, total=None, duration=None):
+    """Send calls (a list of (endpoint, inputs)) round-robin from concurrency threads.
+
+    Stops after total requests or duration seconds, whichever is given (total
+    defaults to one pass over calls). Returns (elapsed, records) with one
+    (endpoint, seconds, status) record per request; exceptions count as
+    status 0.
+    """
+    if total is None and duration is None:
+        total = len(calls)
+    lock = threading.Lock()
+    records = []
+    issued = [0]
+    started = time.perf_counter()
+    deadline = started + duration if duration else None
+
+    def next_call():
+        with lock:
+            if total is not None and issued[0] >= total:
+                return None
+            if deadline is not None and time.perf_counter() >= deadline:
+                return None
+            issued[0] += 1
+            return calls[(issued[0] - 1) % len(calls)]
+
+    def worker():
+        while True:
+            call = next_call()
+            if call is None:
+                return
+            endpoint, inputs = call
+            call_started = time.perf_counter()
+            try:
+                status, _ = target.call(endpoint, inputs)
+            except Exception:
+                status = 0
+            with lock:
+                records.append((endpoint, time.perf_counter() - call_started, status))
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - started, records
+
+
+def build_document(endpoint, size):
+    """Synthetic input for endpoint at one of SIZES, with the work it represents.
+
+    Returns a dict holding the file ("filename", "data") or the merge pair
+    ("base_csv", "new_csv"), plus "units" and "unit" for throughput.
+    """
+    preset = SIZES[size]
+    if endpoint == "image":
+        return {"filename": "table.png", "data": table_image(rows=preset["image_rows"]), "units": 1, "unit": "images"}
+    if endpoint == "pdf":
+        return {"filename": "tables.pdf", "data": table_pdf(pages=preset["pages"], rows=preset["rows"]),
+                "units": preset["pages"], "unit": "pages"}
+    if endpoint == "pdf-scanned":
+        return {"filename": "scan.pdf", "data": scanned_pdf(pages=preset["pages"]), "units": preset["pages"],
+                "unit": "pages"}
+    if endpoint == "pdf-revision":
+        return {"filename": "tables.pdf", "data": table_pdf(pages=preset["pages"], rows=preset["rows"]),
+                "revision": table_pdf(pages=preset["pages"], rows=preset["rows"], edited_pages={preset["pages"] // 2}),
+                "units": preset["pages"], "unit": "pages"}
+    if endpoint == "merge":
+        rows = preset["csv_rows"]
+        return {"base_csv": csv_bytes(rows=rows, seed=1),
+                "new_csv": csv_bytes(rows=max(1, rows // 4), seed=2, key_offset=rows - rows // 8),
+                "units": rows + max(1, rows // 4), "unit": "rows"}
+    if endpoint in ("upload", "download"):
+        data = table_pdf(pages=preset["pages"], rows=preset["rows"]) if endpoint == "upload" \
+            else csv_bytes(rows=preset["csv_rows"])
+        document = {"filename": "document.pdf" if endpoint == "upload" else "table.csv", "data": data,
+                    "units": round(len(data) / 2 ** 20, 3), "unit": "MiB"}
+        if endpoint == "download":
+            document["source"] = table_pdf(pages=preset["pages"], rows=preset["rows"])
+        return document
+    return {"units": 1, "unit": "requests"}
+
+
+def _json_or_none(body):
+    try:
+        return json.loads(body)
+    except ValueError:
+        return None
+
+
+def multipart(fields, files):
+    """(body, content_type) of a multipart/form-data request."""
+    boundary = "----docscanner-benchmark-boundary"
+    body = bytearray()
+    for name, value in fields.items():
+        body += (f"--{boundary}\r\nContent-Disposition: form-data; name=\"{name}\"\r\n\r\n{value}\r\n").encode()
+    for name, (filename, data) in files.items():
+        body += (f"--{boundary}\r\nContent-Disposition: form-data; name=\"{name}\"; filename=\"{filename}\"\r\n"
+                 f"Content-Type: application/octet-stream\r\n\r\n").encode()
+        body += data + b"\r\n"
+    body += f"--{boundary}--\r\n".encode()
+    return bytes(body), f"multipart/form-data; boundary={boundary}"
+
+
+def request_parts(endpoint, inputs):
+    """(method, path, headers, body) for one call to endpoint.
+
+    inputs holds "file_id" for the endpoints reading a stored file (plus
+    "previous_file_id" for pdf-revision), "data" for upload, and
+    "base_csv"/"new_csv" for merge. An optional "client_id" is sent as the
+    X-Client-ID header admission control charges, with API_KEY.
+    """
+    _, method, path = ROUTES[endpoint]
+    headers = {"X-Client-ID": inputs["client_id"], "X-API-Key": API_KEY} if inputs.get("client_id") else {}
+    if endpoint == "upload":
+        body, content_type = multipart({}, {"file": (inputs.get("filename", "document.pdf"), inputs["data"])})
+        return method, path, {**headers, "Content-Type": content_type}, body
+    if endpoint == "merge":
+        body, content_type = multipart({}, {"base_file": ("base.csv", inputs["base_csv"]),
+                                            "new_file": ("new.csv", inputs["new_csv"])})
+        return method, path, {**headers, "Content-Type": content_type}, body
+    if endpoint in ("image", "pdf", "pdf-scanned", "pdf-revision"):
+        body = {"file_id": inputs["file_id"]}
+        if inputs.get("previous_file_id"):
+            body["options"] = {"previous_file_id": inputs["previous_file_id"]}
+        return method, path, {**headers, "Content-Type": "application/json"}, json.dumps(body).encode()
+    return method, path.format(file_id=inputs.get("file_id", "")), headers, b""
+
+
+def http_request(func, endpoint, inputs):
+    """(route function name, azure.functions.HttpRequest) for an in-process call."""
+    method, path, headers, body = request_parts(endpoint, inputs)
+    route_params = {"filename": inputs["file_id"]} if endpoint == "download" else {}
+    return ROUTES[endpoint][0], func.HttpRequest(method, f"/api/{path}", headers=headers, body=body,
+                                                 route_params=route_params)
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an ascending list, or None when empty."""
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(p * len(sorted_values)))]
+
+
+def summarize(latencies, elapsed, errors=0, units=1):
+    """Throughput and latency percentiles (ms) for one run.
+
+    units is the work in one request (pages, rows, ...), so throughput can
+    be reported per unit as well as per request.
+    """
+    ordered = sorted(latencies)
+    ms = lambda value: round(value * 1000, 1) if value is not None else None
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "requests_per_second": round(len(latencies) / elapsed, 2) if elapsed else None,
+        "units_per_second": round(len(latencies) * units / elapsed, 1) if elapsed else None,
+        "p50_ms": ms(percentile(ordered, 0.50)),
+        "p95_ms": ms(percentile(ordered, 0.95)),
+        "p99_ms": ms(percentile(ordered, 0.99)),
+        "max_ms": ms(ordered[-1] if ordered else None),
+    }
+
+
+def peak_rss_mb():
+    """Peak resident memory of this process and of its finished children, in MiB."""
+    # ru_maxrss is in bytes on macOS and in KiB on Linux
+    scale = 1 if sys.platform == "darwin" else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale
+    return round(own / 2 ** 20, 1), round(children / 2 ** 20, 1)
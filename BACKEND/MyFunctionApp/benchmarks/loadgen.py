@@ -0,0 +1,92 @@
+"""Load generator: drive the HTTP routes concurrently and report latency and throughput.
+
+Against a running host (`func start`, or a deployed app) over HTTP:
+
+    python -m benchmarks.loadgen --url http://localhost:7071/api --endpoints pdf --concurrency 16 --duration 30
+
+Or in this process, on in-memory storage and the fake Gemini server:
+
+    python -m benchmarks.loadgen --in-process --endpoints image pdf merge --concurrency 8 --requests 200
+
+Several endpoints are interleaved round-robin. Documents are uploaded once
+before the clock starts, so with the result cache on a remote host later
+conversions are cache hits; run the host with RESULT_CACHE=none to load the
+pipelines themselves, and with ADMISSION_CONTROL=0 unless the admission
+limits are what is being measured. --clients spreads the requests over
+several X-Client-ID values, to watch admission control share the worker:
+
+    ADMISSION_CONTROL=1 python -m benchmarks.loadgen --in-process --endpoints pdf --clients 4 --concurrency 16
+"""
+import json
+import argparse
+from collections import Counter
+from .harness import ROUTES, HttpTarget, build_document, peak_rss_mb, run_load, summarize
+from .samples import SIZES
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    target_group = parser.add_mutually_exclusive_group(required=True)
+    target_group.add_argument("--url", help="base URL of the API, e.g. http://localhost:7071/api")
+    target_group.add_argument("--in-process", action="store_true", help="run the app in this process on in-memory storage")
+    parser.add_argument("--endpoints", nargs="+", choices=list(ROUTES), default=["pdf"])
+    parser.add_argument("--size", choices=list(SIZES), default="small")
+    parser.add_argument("--concurrency", type=int, default=8)
+    stop_group = parser.add_mutually_exclusive_group()
+    stop_group.add_argument("--requests", type=int, help="stop after this many requests")
+    stop_group.add_argument("--duration", type=float, help="stop after this many seconds")
+    parser.add_argument("--documents", type=int, default=4, help="distinct documents staged per endpoint")
+    parser.add_argument("--clients", type=int, default=0, help="send requests as this many X-Client-ID values")
+    parser.add_argument("--gemini-latency", type=float, default=0.0, help="in-process only: seconds per model call")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+    if args.requests is None and args.duration is None:
+        args.duration = 10.0
+
+    if args.url:
+        target = HttpTarget(args.url)
+    else:
+        from .harness import LocalApp
+
+        target = LocalApp(gemini_latency=args.gemini_latency)
+    try:
+        documents = {endpoint: build_document(endpoint, args.size) for endpoint in args.endpoints}
+        calls = [(endpoint, target.stage(endpoint, documents[endpoint]))
+                 for _ in range(args.documents) for endpoint in args.endpoints]
+        if args.clients:
+            calls = [(endpoint, dict(inputs, client_id=f"loadgen-{index % args.clients}"))
+                     for index, (endpoint, inputs) in enumerate(calls)]
+        elapsed, records = run_load(target, calls, args.concurrency, args.requests, args.duration)
+    finally:
+        target.close()
+
+    report = {"concurrency": args.concurrency, "size": args.size, "endpoints": {}}
+    for endpoint in args.endpoints:
+        mine = [(seconds, status) for name, seconds, status in records if name == endpoint]
+        statuses = Counter(status for _, status in mine)
+        summary = summarize([seconds for seconds, _ in mine], elapsed,
+                            sum(count for status, count in statuses.items() if status == 0 or status >= 400),
+                            documents[endpoint]["units"])
+        summary["unit"] = documents[endpoint]["unit"]
+        summary["statuses"] = {str(status): count for status, count in sorted(statuses.items())}
+        report["endpoints"][endpoint] = summary
+    report["total"] = summarize([seconds for _, seconds, _ in records], elapsed,
+                                sum(1 for _, _, status in records if status == 0 or status >= 400))
+    if args.in_process:
+        report["peak_rss_mb"] = peak_rss_mb()[0]
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(f"{len(records)} requests in {elapsed:.1f}s at concurrency {args.concurrency}")
+    print(f"{'endpoint':<12} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}  statuses")
+    for endpoint, summary in list(report["endpoints"].items()) + [("total", report["total"])]:
+        statuses = " ".join(f"{status}x{count}" for status, count in summary.get("statuses", {}).items())
+        print(f"{endpoint:<12} {summary['requests_per_second']:>8} {summary['p50_ms']:>9} {summary['p95_ms']:>9} "
+              f"{summary['p99_ms']:>9} {summary['max_ms']:>9}  {statuses}")
+    if "peak_rss_mb" in report:
+        print(f"Peak RSS: {report['peak_rss_mb']} MiB")
+
+
+if __name__ == "__main__":
+    main()
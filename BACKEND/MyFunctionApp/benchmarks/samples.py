@@ -0,0 +1,111 @@
+"""Synthetic input documents for the benchmarks, built without extra dependencies."""
+import io
+import csv
+import random
+
+# Document sizes used by the benchmark suite and the load generator
+SIZES = {
+    "small": {"pages": 1, "rows": 20, "image_rows": 10, "csv_rows": 1000},
+    "medium": {"pages": 10, "rows": 30, "image_rows": 40, "csv_rows": 20000},
+    "large": {"pages": 50, "rows": 38, "image_rows": 120, "csv_rows": 100000},
+}
+
+
+def table_pdf(pages=1, rows=20, columns=4, seed=0, edited_pages=()):
+    """PDF bytes with one ruled table per page; the header repeats on every page.
+
+    Written by hand so only the extraction code under test needs pdfplumber.
+    Pages listed (0-based) in edited_pages get different row labels, giving a
+    revised version of the same document.
+    """
+    rng = random.Random(seed)
+    header = ["Item"] + [f"Col{c}" for c in range(1, columns)]
+    left, top, cell_width, row_height = 50, 750, 120, 18
+
+    streams = []
+    for page in range(pages):
+        commands = ["0.5 w"]
+        label = "Revised" if page in edited_pages else "Row"
+        table_rows = [header] + [[f"{label} {page * rows + r + 1}"] + [f"{rng.uniform(0, 1000):.2f}" for _ in range(columns - 1)]
+                                 for r in range(rows)]
+        bottom = top - row_height * len(table_rows)
+        right = left + cell_width * columns
+        for r in range(len(table_rows) + 1):
+            y = top - r * row_height
+            commands.append(f"{left} {y} m {right} {y} l S")
+        for c in range(columns + 1):
+            x = left + c * cell_width
+            commands.append(f"{x} {top} m {x} {bottom} l S")
+        for r, row in enumerate(table_rows):
+            y = top - (r + 1) * row_height + 5
+            for c, value in enumerate(row):
+                commands.append(f"BT /F1 9 Tf {left + c * cell_width + 4} {y} Td ({value}) Tj ET")
+        streams.append("\n".join(commands).encode("latin-1"))
+
+    # Objects: 1 catalog, 2 pages, 3 font, then a page and its content stream per page
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>",
+               None,
+               b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for stream in streams:
+        page_number = len(objects) + 1
+        kids.append(f"{page_number} 0 R")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents {page_number + 1} 0 R "
+                       f"/Resources << /Font << /F1 3 0 R >> >> >>".encode("latin-1"))
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n".encode("latin-1") + stream + b"\nendstream")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>".encode("latin-1")
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(out.tell())
+        out.write(f"{number} 0 obj\n".encode("latin-1") + body + b"\nendobj\n")
+    xref = out.tell()
+    out.write(f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1"))
+    for offset in offsets:
+        out.write(f"{offset:010d} 00000 n \n".encode("latin-1"))
+    out.write(f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1"))
+    return out.getvalue()
+
+
+def table_image(width=1200, rows=20, image_format="PNG"):
+    """Image bytes of a ruled table, for the image pipeline (uses PIL)."""
+    from PIL import Image, ImageDraw
+
+    row_height = 40
+    image = Image.new("RGB", (width, row_height * (rows + 1) + 20), "white")
+    draw = ImageDraw.Draw(image)
+    for r in range(rows + 2):
+        draw.line([(10, 10 + r * row_height), (width - 10, 10 + r * row_height)], fill="black")
+    for r in range(rows + 1):
+        draw.text((20, 22 + r * row_height), "Item" if r == 0 else f"Row {r}", fill="black")
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format)
+    return buffer.getvalue()
+
+
+def scanned_pdf(pages=1, rows=20):
+    """Image-only PDF (no text layer), so every page goes through the image model."""
+    from PIL import Image
+
+    images = [Image.open(io.BytesIO(table_image(rows=rows))).convert("RGB") for _ in range(pages)]
+    buffer = io.BytesIO()
+    images[0].save(buffer, format="PDF", save_all=True, append_images=images[1:], resolution=150)
+    return buffer.getvalue()
+
+
+def csv_bytes(rows=100, columns=5, seed=0, key_offset=0):
+    """CSV bytes with an ID key column, so two files with overlapping ids merge.
+
+    Most rows share one Region, which makes Region the column the matcher
+    picks for every file generated here.
+    """
+    rng = random.Random(seed)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(["ID", "Region"] + [f"Field{c}" for c in range(1, columns - 1)])
+    for r in range(rows):
+        region = "North" if rng.random() < 0.8 else rng.choice(["South", "East", "West"])
+        writer.writerow([f"ID{key_offset + r:05d}", region] + [rng.randint(0, 9999) for _ in range(columns - 2)])
+    return buffer.getvalue().encode("utf-8")
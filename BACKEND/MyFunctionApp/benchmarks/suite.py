@@ -0,0 +1,170 @@
+"""Benchmark suite: every endpoint at several document sizes, fully offline.
+
+Each (endpoint, size) case runs in a fresh process against in-memory storage
+and the fake Gemini server, so peak RSS belongs to that case alone. One
+untimed request warms the worker up first (imports, clients); the timed
+requests then report throughput, p50/p95/p99 latency and peak RSS.
+
+    python -m benchmarks.suite
+    python -m benchmarks.suite --endpoints pdf merge --sizes medium large --iterations 20
+    python -m benchmarks.suite --output before.json
+    python -m benchmarks.suite --baseline before.json     # exit 1 on a p50 regression
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+from .harness import APP_DIR, ROUTES, local_env, summarize, peak_rss_mb, run_load, build_document
+from .samples import SIZES
+
+# "matcher" runs CSVMatcher directly: the merge route indexes only the new file,
+# so it never finds a match in a fresh directory and measures analysis alone
+ENDPOINTS = ("upload", "download", "image", "pdf", "pdf-scanned", "pdf-revision", "merge", "matcher")
+
+
+class MatcherTarget:
+    """Indexes the base CSV and matches the new one into it, in a fresh directory per call."""
+
+    def call(self, endpoint, inputs):
+        from HttpTrigger1.logic.mergecsv import CSVMatcher
+
+        work_dir = tempfile.mkdtemp()
+        try:
+            data_dir, output_dir = os.path.join(work_dir, "data"), os.path.join(work_dir, "output")
+            os.makedirs(data_dir)
+            os.makedirs(output_dir)
+            with open(os.path.join(data_dir, "base.csv"), "wb") as f:
+                f.write(inputs["base_csv"])
+            new_path = os.path.join(output_dir, "new.csv")
+            with open(new_path, "wb") as f:
+                f.write(inputs["new_csv"])
+            matcher = CSVMatcher(data_dir=data_dir, output_dir=output_dir)
+            matcher.load_all_csvs()
+            merged = matcher.match_input_csv(new_path)
+            return (200 if merged else 404), merged
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    def stage(self, endpoint, document):
+        return document
+
+
+def run_case(endpoint, size, iterations, concurrency, gemini_latency):
+    """Child process: warm up, then time iterations requests to endpoint."""
+    from .harness import LocalApp
+
+    document = build_document("merge" if endpoint == "matcher" else endpoint, size)
+    with LocalApp(gemini_latency=gemini_latency) as app:
+        target = MatcherTarget() if endpoint == "matcher" else app
+        inputs = target.stage(endpoint, document)
+        first_started = time.perf_counter()
+        status, body = target.call(endpoint, inputs)
+        first_seconds = time.perf_counter() - first_started
+        if status >= 400:
+            raise RuntimeError(f"{endpoint} failed with HTTP {status}: {body}")
+        # Uploads and downloads reuse their input; conversions get a fresh copy each time
+        calls = [(endpoint, target.stage(endpoint, document) if endpoint in ("image", "pdf", "pdf-scanned") else inputs)
+                 for _ in range(iterations)]
+        elapsed, records = run_load(target, calls, concurrency)
+
+    errors = sum(1 for _, _, status in records if status == 0 or status >= 400)
+    result = summarize([seconds for _, seconds, _ in records], elapsed, errors, document["units"])
+    own, children = peak_rss_mb()
+    result.update(endpoint=endpoint, size=size, concurrency=concurrency, unit=document["unit"],
+                  first_ms=round(first_seconds * 1000, 1), peak_rss_mb=own, children_peak_rss_mb=children)
+    return result
+
+
+def spawn(endpoint, size, args):
+    command = [sys.executable, "-m", "benchmarks.suite", "--child", endpoint, size,
+               "--iterations", str(args.iterations), "--concurrency", str(args.concurrency),
+               "--gemini-latency", str(args.gemini_latency)]
+    completed = subprocess.run(command, cwd=APP_DIR, env=local_env(), capture_output=True, text=True)
+    if completed.returncode != 0:
+        tail = completed.stderr.strip().splitlines()[-1:] or ["no output"]
+        return {"endpoint": endpoint, "size": size, "error": tail[0]}
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def print_table(results, baseline=None):
+    print(f"{'endpoint':<12} {'size':<7} {'req/s':>7} {'units/s':>12} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+          f"{'first ms':>9} {'RSS MiB':>8}" + ("  p50 vs baseline" if baseline else ""))
+    for result in results:
+        if "error" in result:
+            print(f"{result['endpoint']:<12} {result['size']:<7} failed: {result['error']}")
+            continue
+        line = (f"{result['endpoint']:<12} {result['size']:<7} {result['requests_per_second']:>7} "
+                f"{str(result['units_per_second']) + ' ' + result['unit']:>12} {result['p50_ms']:>9} "
+                f"{result['p95_ms']:>9} {result['p99_ms']:>9} {result['first_ms']:>9} "
+                f"{max(result['peak_rss_mb'], result['children_peak_rss_mb']):>8}")
+        previous = (baseline or {}).get((result["endpoint"], result["size"]))
+        if previous and previous.get("p50_ms"):
+            line += f"  {(result['p50_ms'] / previous['p50_ms'] - 1) * 100:+.1f}%"
+        print(line)
+
+
+def regressions(results, baseline, tolerance, min_delta_ms):
+    """Cases whose p50 grew by more than tolerance (a fraction) and min_delta_ms over baseline.
+
+    The absolute floor keeps sub-millisecond cases from failing on timer noise.
+    """
+    slower = []
+    for result in results:
+        previous = baseline.get((result["endpoint"], result["size"]))
+        if previous and previous.get("p50_ms") and result.get("p50_ms") \
+                and result["p50_ms"] > previous["p50_ms"] * (1 + tolerance) \
+                and result["p50_ms"] - previous["p50_ms"] >= min_delta_ms:
+            slower.append(result)
+    return slower
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--endpoints", nargs="+", choices=ENDPOINTS, default=list(ENDPOINTS))
+    parser.add_argument("--sizes", nargs="+", choices=list(SIZES), default=["small", "medium"])
+    parser.add_argument("--iterations", type=int, default=10, help="timed requests per case")
+    parser.add_argument("--concurrency", type=int, default=1, help="requests in flight per case")
+    parser.add_argument("--gemini-latency", type=float, default=0.0, help="seconds per fake model call")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare p50 latency against an earlier --output file")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="p50 growth counted as a regression")
+    parser.add_argument("--min-delta-ms", type=float, default=5.0, help="smallest p50 growth counted, in ms")
+    parser.add_argument("--child", nargs=2, metavar=("ENDPOINT", "SIZE"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        endpoint, size = args.child
+        if endpoint not in ROUTES and endpoint != "matcher":
+            parser.error(f"unknown endpoint {endpoint}")
+        print(json.dumps(run_case(endpoint, size, args.iterations, args.concurrency, args.gemini_latency)))
+        return
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = {(r["endpoint"], r["size"]): r for r in json.load(f)["results"]}
+
+    results = []
+    for endpoint in args.endpoints:
+        for size in args.sizes:
+            results.append(spawn(endpoint, size, args))
+    print_table(results, baseline)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+    if baseline:
+        slower = regressions(results, baseline, args.tolerance, args.min_delta_ms)
+        for result in slower:
+            print(f"Regression: {result['endpoint']} {result['size']} p50 {result['p50_ms']}ms "
+                  f"(baseline {baseline[(result['endpoint'], result['size'])]['p50_ms']}ms)")
+        if slower:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
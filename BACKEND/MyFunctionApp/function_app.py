@@ -1,31 +1,99 @@
 import azure.functions as func
 import logging
+import io
 import os
 import json
 import uuid
 import shutil
+import functools
+import threading
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
 from datetime import datetime
-from azure.storage.blob import BlobServiceClient
+from email.utils import format_datetime
 
 # Aapke logic functions
-from HttpTrigger1.logic.imgtocsv import image_to_csv_pipeline
-from HttpTrigger1.logic.pdfcsv import pdf_to_csv
-from HttpTrigger1.logic.mergecsv import CSVMatcher
+# The pipelines (imgtocsv, pdfcsv, mergecsv) pull in pandas, pdfplumber and PIL, so
+# they are imported inside the routes that use them, keeping cold starts of the
+# upload/download routes light. Only stdlib-weight modules are imported here.
+from HttpTrigger1.logic.resultcache import create_cache, cache_key, content_hash
+from HttpTrigger1.logic import admission, jobs, chunkupload, outputformat, storage, telemetry
+from HttpTrigger1.logic.telemetry import instrument_route, span
+from HttpTrigger1.logic.httprange import (RangeNotSatisfiable, etag_list, etag_matches, parse_range, resolve_range,
+                                         strong_etag, strong_matches)
 
 app = func.FunctionApp()
 
 # --- Configuration ---
-CONNECTION_STRING = os.environ["AzureWebJobsStorage"]
+# Only the azure storage backend and the Storage Queue need it (see STORAGE_BACKEND, JOB_QUEUE)
+CONNECTION_STRING = os.environ.get("AzureWebJobsStorage", "")
 UPLOADS_CONTAINER = "uploads"
 OUTPUTS_CONTAINER = "outputs"
-blob_service_client = BlobServiceClient.from_connection_string(CONNECTION_STRING)
+# Worker processes for PDF table extraction; 0 or 1 keeps the single-process path
+PDF_WORKERS = int(os.environ.get("PDF_WORKERS", "0"))
+JOB_QUEUE_NAME = "conversion-jobs"
+# Concurrent conversions per batch request, and the largest batch accepted
+BATCH_WORKERS = int(os.environ.get("BATCH_WORKERS", "8"))
+BATCH_MAX_ITEMS = int(os.environ.get("BATCH_MAX_ITEMS", "500"))
+# Keep a per-page manifest of every PDF, so a later version can be re-processed incrementally
+PAGE_MANIFESTS = os.environ.get("PDF_PAGE_MANIFEST", "1") != "0"
+# Largest body a download reads into memory; bigger files are redirected or served in ranges of this size
+DOWNLOAD_MAX_BODY_BYTES = int(os.environ.get("DOWNLOAD_MAX_BODY_BYTES", str(64 * 1024 * 1024)))
+# Lifetime of the signed URL a large download is redirected to
+DOWNLOAD_URL_SECONDS = int(os.environ.get("DOWNLOAD_URL_SECONDS", "300"))
+
+
+# --- Shared clients ---
+# Created on first use and reused by every invocation this worker handles
+_shared = {}
+_shared_lock = threading.RLock()
+
+
+def shared(name, factory):
+    """Return the worker-wide object called name, creating it with factory once."""
+    value = _shared.get(name)
+    if value is None:
+        with _shared_lock:
+            value = _shared.get(name)
+            if value is None:
+                value = _shared[name] = factory()
+    return value
+
+
+def get_storage():
+    """Blob storage for uploads, outputs, cache entries and job records, see STORAGE_BACKEND."""
+    return shared("storage", lambda: storage.create_storage(connection_string=CONNECTION_STRING))
+
+
+def get_result_cache():
+    """Content-addressed cache of finished conversions, see RESULT_CACHE."""
+    return shared("result_cache", lambda: create_cache(storage=get_storage()))
+
+
+def get_chunk_store():
+    """Staged blocks for chunked uploads, see UPLOAD_STAGING."""
+    return shared("chunk_store", lambda: chunkupload.create_chunk_store(get_storage(), UPLOADS_CONTAINER))
+
+
+def get_job_backend():
+    """(job_store, job_queue) for async conversion jobs, see JOB_QUEUE."""
+    return shared("job_backend", lambda: jobs.create_job_backend(handle_job_message, get_storage(),
+                                                                 CONNECTION_STRING, JOB_QUEUE_NAME))
+
+
+def get_admission():
+    """Per-client quotas and the fair-share wait queue of the conversion routes, see ADMISSION_CONTROL."""
+    return shared("admission", admission.AdmissionController)
 
 
 # --- Standardized Responses ---
 CORS_HEADERS = {
     "Access-Control-Allow-Origin": "*",
     "Access-Control-Allow-Methods": "POST, GET, OPTIONS",
-    "Access-Control-Allow-Headers": "Content-Type, Authorization",
+    "Access-Control-Allow-Headers": "Content-Type, Authorization, X-Correlation-ID, X-Stage-Timings, X-Client-ID, "
+                                    "X-API-Key",
+    "Access-Control-Expose-Headers": "X-Correlation-ID, Server-Timing, Retry-After",
 }
 
 def create_response(data, status_code=200):
@@ -39,11 +107,85 @@ def create_error_response(message, status_code=400):
     return create_response({"error": True, "message": message}, status_code)
 
 
+# --- Admission Control ---
+def admission_controlled(route, estimate):
+    """Decorator for a conversion route: the request's cost, from estimate(req), is admitted first.
+
+    Place it under @instrument_route, so rejections are counted and carry a
+    correlation id. A rejected request gets 429 with Retry-After and never
+    reaches the handler.
+    """
+    def decorator(handler):
+        @functools.wraps(handler)
+        def wrapper(req):
+            if req.method == "OPTIONS" or not admission.ENABLED:
+                return handler(req)
+            client = admission.client_id(req.headers)
+            try:
+                with get_admission().admit(client, estimate(req), route):
+                    return handler(req)
+            except admission.Rejected as e:
+                response = create_error_response(str(e), 429)
+                response.headers["Retry-After"] = str(e.retry_after)
+                return response
+        return wrapper
+    return decorator
+
+
+def estimate_file_cost(req, pipeline):
+    """Cost of converting the upload named by a JSON body's file_id, from its stored size and page count."""
+    try:
+        file_id = (req.get_json() or {}).get("file_id")
+    except (ValueError, AttributeError):
+        file_id = None
+    if not isinstance(file_id, str) or not file_id:
+        # The handler answers 400 without doing any work
+        return admission.estimate_cost(pipeline)
+    try:
+        properties = get_storage().head(UPLOADS_CONTAINER, file_id)
+    except (ValueError, storage.StorageError):
+        properties = None
+    if properties is None:
+        return admission.estimate_cost(pipeline, file_id)
+    return admission.estimate_cost(pipeline, file_id, properties.size, properties.metadata)
+
+
+def estimate_merge_cost(req):
+    return admission.estimate_cost("merge-csv", size=len(req.get_body() or b""))
+
+
+def estimate_batch_cost(req):
+    """Sum of the item costs of a batch: uploaded files by size, file_ids from their stored properties."""
+    if req.files:
+        uploads = req.files.getlist('files')
+        pipeline = req.form.get('pipeline')
+        # Each upload is priced at an equal share of the body
+        size = len(req.get_body() or b"") / max(len(uploads), 1)
+        return sum(admission.estimate_cost(pipeline if pipeline in PIPELINES else pipeline_for(f.filename or ""),
+                                           f.filename or "", size) for f in uploads)
+    try:
+        req_body = req.get_json() or {}
+        items = req_body.get('items') or [{"file_id": file_id} for file_id in req_body.get('file_ids') or []]
+        items = [(item["file_id"], item.get("pipeline") or req_body.get('pipeline')) for item in items
+                 if isinstance(item, dict) and isinstance(item.get("file_id"), str) and item["file_id"]]
+    except (ValueError, AttributeError, TypeError):
+        # The handler rejects a body it cannot read
+        return admission.estimate_cost("pdf-to-csv")
+    try:
+        properties = get_storage().head_many([(UPLOADS_CONTAINER, name) for name, _ in items])
+    except (ValueError, storage.StorageError):
+        properties = [None] * len(items)
+    return sum(admission.estimate_cost(pipeline if pipeline in PIPELINES else pipeline_for(name), name,
+                                       info.size if info else 0, info.metadata if info else None)
+               for (name, pipeline), info in zip(items, properties))
+
+
 # --- API Functions ---
 
 @app.route(route="upload", methods=["POST", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@instrument_route("upload")
 def upload_file(req: func.HttpRequest) -> func.HttpResponse:
-    """Handles file upload and saves it directly to Azure Blob Storage."""
+    """Handles file upload and saves it directly to storage."""
     if req.method == "OPTIONS":
         return func.HttpResponse(status_code=204, headers=CORS_HEADERS)
 
@@ -54,13 +196,7 @@ def upload_file(req: func.HttpRequest) -> func.HttpResponse:
             return create_error_response("No file found in the request. Make sure to use 'file' as the key.", 400)
 
         original_filename = uploaded_file.filename
-        file_extension = os.path.splitext(original_filename)[1]
-        blob_name = f"{uuid.uuid4()}{file_extension}"
-
-        blob_client = blob_service_client.get_blob_client(container=UPLOADS_CONTAINER, blob=blob_name)
-        blob_client.upload_blob(uploaded_file.read(), overwrite=True)
-
-        logging.info(f"File '{original_filename}' uploaded to blob storage as '{blob_name}'.")
+        blob_name = save_upload(uploaded_file)
 
         return create_response({
             "success": True,
@@ -74,38 +210,347 @@ def upload_file(req: func.HttpRequest) -> func.HttpResponse:
         return create_error_response(f"An unexpected error occurred during upload: {e}", 500)
 
 
-def process_and_upload(file_id: str, source_container: str, dest_container: str, processing_function, file_extension: str):
-    """Generic function to download, process, and re-upload a file."""
-    source_blob_client = blob_service_client.get_blob_client(container=source_container, blob=file_id)
-    if not source_blob_client.exists():
+@app.route(route="upload/init", methods=["POST", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@instrument_route("upload/init")
+def init_chunked_upload(req: func.HttpRequest) -> func.HttpResponse:
+    """Starts a chunked upload and returns the upload_id to send chunks to."""
+    if req.method == "OPTIONS":
+        return func.HttpResponse(status_code=204, headers=CORS_HEADERS)
+
+    try:
+        req_body = req.get_json()
+    except ValueError:
+        req_body = {}
+    original_filename = req_body.get('filename') or ""
+    try:
+        upload_id = chunkupload.new_upload_id(original_filename)
+    except chunkupload.ChunkError as e:
+        return create_error_response(str(e), 400)
+
+    logging.info(f"Chunked upload '{upload_id}' started for '{original_filename}'.")
+    return create_response({
+        "success": True,
+        "upload_id": upload_id,
+        "max_chunk_bytes": chunkupload.MAX_CHUNK_BYTES,
+        "max_chunks": chunkupload.MAX_CHUNKS,
+        "chunk_url": f"/api/upload/{upload_id}/chunks/{{index}}",
+        "commit_url": f"/api/upload/{upload_id}/commit"
+    })
+
+
+@app.route(route="upload/{upload_id}/chunks/{index:int}", methods=["PUT", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@instrument_route("upload/{upload_id}/chunks/{index:int}")
+def put_upload_chunk(req: func.HttpRequest) -> func.HttpResponse:
+    """Stages one chunk; X-Chunk-SHA256 (hex) is verified when sent. Re-sending a chunk is safe."""
+    if req.method == "OPTIONS":
+        return func.HttpResponse(status_code=204, headers=CORS_HEADERS)
+
+    try:
+        upload_id = chunkupload.validate_upload_id(req.route_params.get('upload_id'))
+        index = int(req.route_params.get('index'))
+        data = req.get_body()
+        sha256_hex = chunkupload.verify_chunk(index, data, req.headers.get("X-Chunk-SHA256"))
+        get_chunk_store().put_chunk(upload_id, index, data, sha256_hex)
+        return create_response({"success": True, "upload_id": upload_id, "index": index,
+                                "size": len(data), "sha256": sha256_hex})
+    except chunkupload.ChunkError as e:
+        return create_error_response(str(e), 400)
+    except Exception as e:
+        logging.error(f"Chunk upload error: {e}")
+        return create_error_response(f"An unexpected error occurred during chunk upload: {e}", 500)
+
+
+@app.route(route="upload/{upload_id}", methods=["GET"], auth_level=func.AuthLevel.ANONYMOUS)
+@instrument_route("upload/{upload_id}")
+def get_upload_status(req: func.HttpRequest) -> func.HttpResponse:
+    """Lists the chunks staged so far, so a dropped client can resume where it stopped."""
+    try:
+        upload_id = chunkupload.validate_upload_id(req.route_params.get('upload_id'))
+        staged, sizes, committed = get_chunk_store().staged_chunks(upload_id)
+        chunks = [{"index": index, "sha256": sha, "size": sizes.get((index, sha))}
+                  for index in sorted(staged) for sha in staged[index]]
+        return create_response({"upload_id": upload_id, "committed": committed, "chunks": chunks})
+    except chunkupload.ChunkError as e:
+        return create_error_response(str(e), 400)
+    except Exception as e:
+        logging.error(f"Upload status error: {e}")
+        return create_error_response(f"An unexpected error occurred: {e}", 500)
+
+
+@app.route(route="upload/{upload_id}/commit", methods=["POST", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@instrument_route("upload/{upload_id}/commit")
+def commit_chunked_upload(req: func.HttpRequest) -> func.HttpResponse:
+    """Assembles the staged chunks into the uploaded file.
+
+    Body: {"chunk_sha256": [...]} listing every chunk's checksum in order, or
+    {"chunks": N} when no chunk was sent twice. The reply's sha256 is null
+    for blocks staged on Azure, which get theirs when first processed.
+    """
+    if req.method == "OPTIONS":
+        return func.HttpResponse(status_code=204, headers=CORS_HEADERS)
+
+    try:
+        upload_id = chunkupload.validate_upload_id(req.route_params.get('upload_id'))
+        try:
+            req_body = req.get_json()
+        except ValueError:
+            return create_error_response("Request body must be JSON.", 400)
+
+        staged, sizes, committed = get_chunk_store().staged_chunks(upload_id)
+        if committed and not staged:
+            return create_error_response("Upload already committed.", 409)
+
+        blocks = chunkupload.select_blocks(staged, req_body.get('chunk_sha256'), req_body.get('chunks'))
+        file_hash = get_chunk_store().commit(upload_id, blocks,
+                                             metadata={"original_filename": req_body.get('filename') or ""})
+        size = sum(sizes.get(block, 0) for block in blocks)
+
+        logging.info(f"Chunked upload '{upload_id}' committed from {len(blocks)} chunks ({size} bytes).")
+        return create_response({
+            "success": True,
+            "message": "File uploaded successfully.",
+            "file_id": upload_id,
+            "chunks": len(blocks),
+            "size": size,
+            "sha256": file_hash
+        })
+    except chunkupload.ChunkError as e:
+        return create_error_response(str(e), 400)
+    except Exception as e:
+        logging.error(f"Upload commit error: {e}")
+        return create_error_response(f"An unexpected error occurred during commit: {e}", 500)
+
+
+def save_upload(uploaded_file):
+    """Stores one uploaded file in the uploads container and returns its file_id."""
+    original_filename = uploaded_file.filename
+    file_extension = os.path.splitext(original_filename)[1]
+    blob_name = f"{uuid.uuid4()}{file_extension}"
+
+    file_bytes = uploaded_file.read()
+    # The content hash lets the process endpoints find cached results without a download,
+    # and the page count lets admission control price a PDF without one
+    metadata = {"sha256": content_hash(file_bytes)}
+    pages = admission.count_pages(file_bytes, file_extension)
+    if pages:
+        metadata["pages"] = str(pages)
+    get_storage().put(UPLOADS_CONTAINER, blob_name, file_bytes, metadata=metadata)
+
+    logging.info(f"File '{original_filename}' uploaded to blob storage as '{blob_name}'.")
+    return blob_name
+
+
+def process_and_upload(file_id: str, source_container: str, dest_container: str, processing_function, file_extension: str,
+                       pipeline=None, report=None, output_extension=".csv"):
+    """Generic function to download, process, and re-upload a file.
+
+    When pipeline is given as a (name, version) pair, results are looked up in
+    result_cache by content hash first and a hit returns the earlier output
+    blob without downloading or processing anything. A dict returned by
+    processing_function is copied into report, if one is passed. A true
+    "archive" in either (several tables, see tablestitch.TableFileSink) makes
+    the output a .zip.
+    """
+    source_properties = get_storage().head(source_container, file_id)
+    if source_properties is None:
         raise FileNotFoundError(f"File with ID '{file_id}' not found in storage.")
-    
-    file_bytes = source_blob_client.download_blob().readall()
-    temp_dir = "/tmp"
-    os.makedirs(temp_dir, exist_ok=True)
-    temp_input_path = os.path.join(temp_dir, file_id)
-    
-    with open(temp_input_path, "wb") as f:
-        f.write(file_bytes)
 
-    processed_blob_name = f"{os.path.splitext(file_id)[0]}_processed.csv"
-    temp_output_path = os.path.join(temp_dir, processed_blob_name)
-    
-    processing_function(temp_input_path, temp_output_path)
+    key = None
+    source_stream = None
+    if pipeline:
+        file_hash = (source_properties.metadata or {}).get("sha256")
+        if not file_hash:
+            # Uploaded before hashes were recorded, or committed from Azure blocks; hashing now still saves
+            # the processing, and recording it saves the download next time
+            source_stream = download_to_memory(source_container, file_id)
+            file_hash = record_file_hash(source_container, file_id, source_properties, source_stream.getbuffer())
+        key = cache_key(file_hash, *pipeline)
+        with span("cache.lookup"):
+            cached_blob_name = lookup_cached_result(key, dest_container)
+        if cached_blob_name:
+            logging.info(f"Cache hit for '{file_id}', reusing '{cached_blob_name}'.")
+            if report is not None:
+                report["cached"] = True
+            return cached_blob_name
+
+    if source_stream is None:
+        source_stream = download_to_memory(source_container, file_id)
+
+    # Input and output both stay in memory, so concurrent requests never share a temp path
+    output_stream = io.BytesIO()
+    with span(f"pipeline.{pipeline[0]}" if pipeline else "process"):
+        result = processing_function(source_stream, output_stream)
+    source_stream.close()
+    if report is None:
+        report = {}
+    if isinstance(result, dict):
+        report.update(result)
+    if report.get("archive"):
+        output_extension = ".zip"
+
+    # Named after the cache key, so runs with other options or another pipeline never
+    # overwrite an output that a cache entry points to
+    suffix = f"_{key[:12]}" if key else ""
+    processed_blob_name = f"{os.path.splitext(file_id)[0]}{suffix}_processed{output_extension}"
+
+    output_stream.seek(0)
+    get_storage().put(dest_container, processed_blob_name, output_stream,
+                      content_type=outputformat.content_type_for(processed_blob_name))
 
-    dest_blob_client = blob_service_client.get_blob_client(container=dest_container, blob=processed_blob_name)
-    with open(temp_output_path, "rb") as data:
-        dest_blob_client.upload_blob(data, overwrite=True)
-    
     logging.info(f"Processed file '{processed_blob_name}' uploaded to container '{dest_container}'.")
 
-    os.remove(temp_input_path)
-    os.remove(temp_output_path)
+    if key:
+        get_result_cache().put(key, processed_blob_name)
 
     return processed_blob_name
 
 
+def download_to_memory(container, name):
+    """Read a blob into a BytesIO positioned at the start; large blobs arrive in parallel blocks."""
+    try:
+        return io.BytesIO(get_storage().get(container, name).data)
+    except storage.BlobNotFound:
+        raise FileNotFoundError(f"File with ID '{name}' not found in storage.")
+
+
+def record_file_hash(container, file_id, properties, data):
+    """Hash data, the content of the blob described by properties, store it in its metadata and return it."""
+    file_hash = content_hash(data)
+    try:
+        get_storage().set_metadata(container, file_id, {**(properties.metadata or {}), "sha256": file_hash})
+    except storage.BlobNotFound:
+        pass
+    return file_hash
+
+
+def lookup_cached_result(key, dest_container):
+    """Return the cached output blob for key if it still exists in dest_container."""
+    cached_blob_name = get_result_cache().get(key)
+    if not cached_blob_name:
+        return None
+    if not get_storage().exists(dest_container, cached_blob_name):
+        get_result_cache().discard(key)
+        return None
+    return cached_blob_name
+
+
+PIPELINES = ("image-to-csv", "pdf-to-csv")
+
+
+def pipeline_for(file_id):
+    """Picks the pipeline for a file from its extension."""
+    return "pdf-to-csv" if os.path.splitext(file_id)[1].lower() == ".pdf" else "image-to-csv"
+
+
+def run_pipeline(file_id, pipeline, options=None, progress=None, report=None):
+    """Runs one of PIPELINES on an uploaded file and returns the output blob name.
+
+    options may carry "output_format" (see outputformat.FORMATS) for any
+    pipeline and, for PDFs, "previous_file_id" (see extract_pdf_tables); the
+    rest are pipeline-specific (see pdfcsv.resolve_options). Invalid options
+    raise ValueError before anything is downloaded; report, if given,
+    receives the pipeline's report (extraction figures, CSV quality).
+    """
+    options, output_format, previous_file_id = split_options(options, pipeline)
+    # The pipelines say in it whether they wrote an archive, which process_and_upload names .zip
+    report = {} if report is None else report
+    if pipeline == "image-to-csv":
+        with span("import.pipeline"):
+            from HttpTrigger1.logic import imgtocsv
+        processing_function = partial(imgtocsv.image_to_csv_pipeline, progress=progress, report=report,
+                                      output_format=output_format)
+        version = imgtocsv.PIPELINE_VERSION
+        output_extension = outputformat.extension(output_format)
+    elif pipeline == "pdf-to-csv":
+        with span("import.pipeline"):
+            from HttpTrigger1.logic import pdfcsv
+        pdfcsv.resolve_options(options)
+        processing_function = partial(extract_pdf_tables, options=options, output_format=output_format,
+                                      progress=progress, previous_file_id=previous_file_id)
+        version = pdfcsv.pipeline_version(options)
+        output_extension = outputformat.extension(output_format)
+    else:
+        raise ValueError(f"Unknown pipeline '{pipeline}'. Use one of: {', '.join(PIPELINES)}.")
+    if output_format != outputformat.DEFAULT_FORMAT:
+        version = f"{version}+{output_format}"
+
+    return process_and_upload(file_id, UPLOADS_CONTAINER, OUTPUTS_CONTAINER, processing_function,
+                              os.path.splitext(file_id)[1], pipeline=(pipeline, version), report=report,
+                              output_extension=output_extension)
+
+
+def split_options(options, pipeline):
+    """Separate output_format and previous_file_id, which do not change the result, from a request's options."""
+    if options is not None and not isinstance(options, dict):
+        raise ValueError("'options' must be an object.")
+    options = dict(options or {})
+    output_format = outputformat.validate_format(options.pop("output_format", None))
+    previous_file_id = options.pop("previous_file_id", None)
+    if previous_file_id is not None and (pipeline != "pdf-to-csv" or not isinstance(previous_file_id, str)):
+        raise ValueError("'previous_file_id' must be the file_id of an earlier version of a PDF.")
+    return options, output_format, previous_file_id
+
+
+def extract_pdf_tables(source_stream, output_stream, options=None, output_format="csv", progress=None,
+                       previous_file_id=None):
+    """pdfcsv.pdf_to_csv, keeping a page manifest of every PDF it processes.
+
+    With previous_file_id (an earlier upload of the same document), pages
+    whose content is unchanged since that version are spliced in from its
+    manifest and only the edited pages are extracted. Manifests are stored
+    in the outputs container, named after the source's content hash.
+    """
+    from HttpTrigger1.logic import pdfcsv, pagemanifest
+
+    version = pdfcsv.extraction_version(pdfcsv.resolve_options(options))
+    previous_manifest = load_page_manifest(previous_file_id, version) if previous_file_id else None
+    manifest_stream = io.BytesIO() if PAGE_MANIFESTS else None
+    file_hash = content_hash(source_stream.getbuffer()) if PAGE_MANIFESTS else None
+
+    report = pdfcsv.pdf_to_csv(source_stream, output_stream, workers=PDF_WORKERS, progress=progress, options=options,
+                               output_format=output_format, previous_manifest=previous_manifest,
+                               manifest_output=manifest_stream)
+    if manifest_stream is not None:
+        get_storage().put(OUTPUTS_CONTAINER, pagemanifest.manifest_name(file_hash, version),
+                          manifest_stream.getvalue(), content_type="application/gzip")
+    return report
+
+
+def load_page_manifest(file_id, version):
+    """The page manifest left by processing the upload file_id with this extraction version, or None."""
+    from HttpTrigger1.logic import pagemanifest
+
+    properties = get_storage().head(UPLOADS_CONTAINER, file_id)
+    if properties is None:
+        raise FileNotFoundError(f"Previous version '{file_id}' not found in storage.")
+    file_hash = properties.metadata.get("sha256")
+    if not file_hash:
+        # Uploads committed from Azure blocks carry no stored hash until first processed
+        file_hash = record_file_hash(UPLOADS_CONTAINER, file_id, properties,
+                                     download_to_memory(UPLOADS_CONTAINER, file_id).getbuffer())
+    try:
+        blob = get_storage().get(OUTPUTS_CONTAINER, pagemanifest.manifest_name(file_hash, version))
+    except storage.BlobNotFound:
+        logging.info(f"No page manifest for '{file_id}'; extracting every page.")
+        return None
+    return pagemanifest.load(blob.data)
+
+
+def handle_job_message(message, attempt=1, final_attempt=True):
+    """Runs the job named in a queue message."""
+    job_store, _ = get_job_backend()
+    # The job id doubles as the correlation id, tying the submit and the worker's logs together
+    with telemetry.request_context(message["job_id"]):
+        return jobs.run_job(job_store, message["job_id"], run_pipeline, attempt, final_attempt)
+
+
+# The queue trigger's default maxDequeueCount; the last delivery records the failure for good
+JOB_MAX_ATTEMPTS = int(os.environ.get("JOB_MAX_ATTEMPTS", "5"))
+
+
 @app.route(route="process/image-to-csv", methods=["POST", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@instrument_route("process/image-to-csv")
+@admission_controlled("process/image-to-csv", partial(estimate_file_cost, pipeline="image-to-csv"))
 def process_image_to_csv(req: func.HttpRequest) -> func.HttpResponse:
     """Processes an image from blob storage."""
     if req.method == "OPTIONS":
@@ -118,22 +563,28 @@ def process_image_to_csv(req: func.HttpRequest) -> func.HttpResponse:
         if not file_id:
             return create_error_response("'file_id' is required in the request body.", 400)
 
-        output_filename = process_and_upload(file_id, UPLOADS_CONTAINER, OUTPUTS_CONTAINER, image_to_csv_pipeline, ".jpg")
+        report = {}
+        output_filename = run_pipeline(file_id, "image-to-csv", req_body.get('options'), report=report)
 
         return create_response({
             "success": True,
             "message": "Image processed successfully.",
             "file_id": file_id,
             "output_filename": output_filename,
-            "download_url": f"/api/download/{output_filename}"
+            "download_url": f"/api/download/{output_filename}",
+            "report": report
         })
     except FileNotFoundError as e:
         return create_error_response(str(e), 404)
+    except ValueError as e:
+        return create_error_response(str(e), 400)
     except Exception as e:
         return create_error_response(f"An unexpected error occurred: {e}", 500)
 
 
 @app.route(route="process/pdf-to-csv", methods=["POST", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@instrument_route("process/pdf-to-csv")
+@admission_controlled("process/pdf-to-csv", partial(estimate_file_cost, pipeline="pdf-to-csv"))
 def process_pdf_to_csv(req: func.HttpRequest) -> func.HttpResponse:
     """Processes a PDF from blob storage."""
     if req.method == "OPTIONS":
@@ -146,22 +597,28 @@ def process_pdf_to_csv(req: func.HttpRequest) -> func.HttpResponse:
         if not file_id:
             return create_error_response("'file_id' is required in the request body.", 400)
             
-        output_filename = process_and_upload(file_id, UPLOADS_CONTAINER, OUTPUTS_CONTAINER, pdf_to_csv, ".pdf")
+        report = {}
+        output_filename = run_pipeline(file_id, "pdf-to-csv", req_body.get('options'), report=report)
 
         return create_response({
             "success": True,
             "message": "PDF processed successfully.",
             "file_id": file_id,
             "output_filename": output_filename,
-            "download_url": f"/api/download/{output_filename}"
+            "download_url": f"/api/download/{output_filename}",
+            "report": report
         })
     except FileNotFoundError as e:
         return create_error_response(str(e), 404)
+    except ValueError as e:
+        return create_error_response(str(e), 400)
     except Exception as e:
         return create_error_response(f"An unexpected error occurred: {e}", 500)
 
 
 @app.route(route="process/merge-csv", methods=["POST", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@instrument_route("process/merge-csv")
+@admission_controlled("process/merge-csv", estimate_merge_cost)
 def process_merge_csv(req: func.HttpRequest) -> func.HttpResponse:
     """Handles merging two CSV files."""
     if req.method == "OPTIONS":
@@ -175,6 +632,10 @@ def process_merge_csv(req: func.HttpRequest) -> func.HttpResponse:
 
         if not base_file or not new_file:
             return create_error_response("Please provide both 'base_file' and 'new_file'.", 400)
+        try:
+            output_format = outputformat.validate_format(req.form.get('output_format'))
+        except ValueError as e:
+            return create_error_response(str(e), 400)
 
         # Temporary directories banayein
         temp_data_dir = os.path.join(temp_dir, "data")
@@ -190,25 +651,37 @@ def process_merge_csv(req: func.HttpRequest) -> func.HttpResponse:
         with open(temp_new_path, "wb") as f: f.write(new_file.read())
 
         # CSVMatcher logic ko call karein
-        matcher = CSVMatcher(data_dir=temp_data_dir, output_dir=temp_output_dir)
-        merged_files = matcher.match_input_csv(temp_new_path)
+        with span("import.pipeline"):
+            from HttpTrigger1.logic.mergecsv import CSVMatcher
+        matcher = CSVMatcher(data_dir=temp_data_dir, output_dir=temp_output_dir, output_format=output_format)
+        with span("pipeline.merge-csv"):
+            merged_files = matcher.match_input_csv(temp_new_path)
 
         if not merged_files:
             return create_response({"success": False, "message": "No matching rows found to merge."})
         
-        # Pehli merged file ko Blob Storage par upload karein
-        merged_file_path = merged_files[0]
-        merged_blob_name = f"merged_{uuid.uuid4()}.csv"
-        
-        dest_blob_client = blob_service_client.get_blob_client(container=OUTPUTS_CONTAINER, blob=merged_blob_name)
-        with open(merged_file_path, "rb") as data:
-            dest_blob_client.upload_blob(data, overwrite=True)
+        # Saari merged files ko Blob Storage par upload karein (ek saath, parallel)
+        merged_blob_names = [f"merged_{uuid.uuid4()}{outputformat.extension(output_format)}" for _ in merged_files]
+        with ExitStack() as files:
+            get_storage().put_many([{
+                "container": OUTPUTS_CONTAINER,
+                "name": merged_blob_name,
+                "data": files.enter_context(open(merged_file_path, "rb")),
+                "content_type": outputformat.content_type_for(merged_blob_name)
+            } for merged_file_path, merged_blob_name in zip(merged_files, merged_blob_names)])
+        outputs = [{
+            "matched_file": matcher.merged_sources[merged_file_path],
+            "output_filename": merged_blob_name,
+            "download_url": f"/api/download/{merged_blob_name}"
+        } for merged_file_path, merged_blob_name in zip(merged_files, merged_blob_names)]
         
         return create_response({
             "success": True,
-            "message": "Files merged successfully.",
-            "output_filename": merged_blob_name,
-            "download_url": f"/api/download/{merged_blob_name}"
+            "message": f"Files merged successfully ({len(outputs)} merged outputs).",
+            # First output kept at top level for existing clients
+            "output_filename": outputs[0]["output_filename"],
+            "download_url": outputs[0]["download_url"],
+            "merged_files": outputs
         })
 
     except Exception as e:
@@ -220,29 +693,349 @@ def process_merge_csv(req: func.HttpRequest) -> func.HttpResponse:
             shutil.rmtree(temp_dir)
 
 
-@app.route(route="download/{filename}", methods=["GET"], auth_level=func.AuthLevel.ANONYMOUS)
+@app.route(route="process/batch", methods=["POST", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@instrument_route("process/batch")
+@admission_controlled("process/batch", estimate_batch_cost)
+def process_batch(req: func.HttpRequest) -> func.HttpResponse:
+    """Uploads and/or converts many files in one request.
+
+    Accepts either multipart 'files' (uploaded, then converted) or a JSON body
+    with 'file_ids' or 'items' ([{"file_id", "pipeline"}]). Each item runs on a
+    bounded worker pool and gets its own entry in the returned manifest, so one
+    bad file does not fail the batch.
+    """
+    if req.method == "OPTIONS":
+        return func.HttpResponse(status_code=204, headers=CORS_HEADERS)
+
+    logging.info("Batch processing triggered.")
+    try:
+        uploaded_files = req.files.getlist('files') if req.files else []
+        if uploaded_files:
+            pipeline = req.form.get('pipeline')
+            items = [{"upload": f, "original_filename": f.filename, "pipeline": pipeline} for f in uploaded_files]
+        else:
+            try:
+                req_body = req.get_json()
+            except ValueError:
+                req_body = None
+            if not isinstance(req_body, dict):
+                return create_error_response("Send multipart 'files' or a JSON body with 'file_ids' or 'items'.", 400)
+            items = req_body.get('items') or [{"file_id": file_id} for file_id in req_body.get('file_ids') or []]
+            if not isinstance(items, list):
+                return create_error_response("'items' and 'file_ids' must be lists.", 400)
+            pipeline = req_body.get('pipeline')
+            # Anything but an object is left for run_batch_item to reject on its own
+            items = [{**item, "pipeline": item.get("pipeline") or pipeline} if isinstance(item, dict) else item
+                     for item in items]
+
+        if not items:
+            return create_error_response("The batch is empty.", 400)
+        if len(items) > BATCH_MAX_ITEMS:
+            return create_error_response(f"A batch may hold at most {BATCH_MAX_ITEMS} files.", 413)
+
+        with ThreadPoolExecutor(max_workers=min(BATCH_WORKERS, len(items))) as executor:
+            results = list(executor.map(telemetry.bind(run_batch_item), range(len(items)), items))
+
+        succeeded = sum(1 for result in results if result["success"])
+        return create_response({
+            "success": succeeded > 0,
+            "message": f"{succeeded} of {len(results)} files processed successfully.",
+            "total": len(results),
+            "succeeded": succeeded,
+            "failed": len(results) - succeeded,
+            "results": results
+        })
+    except Exception as e:
+        logging.error(f"Batch processing error: {e}")
+        return create_error_response(f"An unexpected error occurred during batch processing: {e}", 500)
+
+
+def run_batch_item(index, item):
+    """Uploads (if needed) and converts one batch item, returning its manifest entry."""
+    if not isinstance(item, dict):
+        return {"index": index, "file_id": None, "success": False, "status": 400,
+                "error": "Every item must be an object with a 'file_id'."}
+    result = {"index": index, "file_id": item.get("file_id"), "success": False}
+    if item.get("original_filename"):
+        result["original_filename"] = item["original_filename"]
+    try:
+        if item.get("upload") is not None:
+            result["file_id"] = save_upload(item["upload"])
+        if not result["file_id"] or not isinstance(result["file_id"], str):
+            result["file_id"] = None
+            raise ValueError("'file_id' is required for every item.")
+
+        pipeline = item.get("pipeline") or pipeline_for(result["file_id"])
+        result["pipeline"] = pipeline
+        output_filename = run_pipeline(result["file_id"], pipeline, item.get("options"))
+
+        result.update({
+            "success": True,
+            "output_filename": output_filename,
+            "download_url": f"/api/download/{output_filename}"
+        })
+    except FileNotFoundError as e:
+        result.update({"status": 404, "error": str(e)})
+    except ValueError as e:
+        result.update({"status": 400, "error": str(e)})
+    except Exception as e:
+        logging.error(f"Batch item {index} failed: {e}")
+        result.update({"status": 500, "error": f"An unexpected error occurred: {e}"})
+    return result
+
+
+@app.route(route="jobs", methods=["POST", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@instrument_route("jobs")
+def submit_job(req: func.HttpRequest) -> func.HttpResponse:
+    """Queues a conversion and returns its job id straight away."""
+    if req.method == "OPTIONS":
+        return func.HttpResponse(status_code=204, headers=CORS_HEADERS)
+
+    logging.info("Job submission triggered.")
+    try:
+        req_body = req.get_json()
+        file_id = req_body.get('file_id')
+        pipeline = req_body.get('pipeline')
+        if not file_id:
+            return create_error_response("'file_id' is required in the request body.", 400)
+        if pipeline not in PIPELINES:
+            return create_error_response(f"'pipeline' must be one of: {', '.join(PIPELINES)}.", 400)
+
+        options = req_body.get('options')
+        try:
+            pipeline_options, _, _ = split_options(options, pipeline)
+            if pipeline == "pdf-to-csv":
+                from HttpTrigger1.logic import pdfcsv
+
+                pdfcsv.resolve_options(pipeline_options)
+        except ValueError as e:
+            return create_error_response(str(e), 400)
+
+        job = jobs.new_job(file_id, pipeline, options)
+        job_store, job_queue = get_job_backend()
+        job_store.save(job)
+        job_queue.send({"job_id": job["job_id"]})
+
+        return create_response({
+            "success": True,
+            "message": "Job queued.",
+            "job_id": job["job_id"],
+            "status": job["status"],
+            "status_url": f"/api/jobs/{job['job_id']}"
+        }, 202)
+    except ValueError:
+        return create_error_response("Request body must be JSON.", 400)
+    except Exception as e:
+        logging.error(f"Job submission error: {e}")
+        return create_error_response(f"An unexpected error occurred: {e}", 500)
+
+
+@app.route(route="jobs/{job_id}", methods=["GET"], auth_level=func.AuthLevel.ANONYMOUS)
+@instrument_route("jobs/{job_id}")
+def get_job_status(req: func.HttpRequest) -> func.HttpResponse:
+    """Reports the status, page progress and output of a job."""
+    job_store, _ = get_job_backend()
+    job = job_store.get(req.route_params.get('job_id'))
+    if not job:
+        return create_error_response("Job not found.", 404)
+
+    if job["output_filename"]:
+        job["download_url"] = f"/api/download/{job['output_filename']}"
+    return create_response(job)
+
+
+@app.queue_trigger(arg_name="msg", queue_name=JOB_QUEUE_NAME, connection="AzureWebJobsStorage")
+def process_job(msg: func.QueueMessage) -> None:
+    """Queue-driven worker that runs conversion jobs."""
+    message = json.loads(msg.get_body().decode("utf-8"))
+    logging.info(f"Job {message.get('job_id')} dequeued (attempt {msg.dequeue_count}).")
+    handle_job_message(message, msg.dequeue_count, msg.dequeue_count >= JOB_MAX_ATTEMPTS)
+
+
+@app.route(route="cache/stats", methods=["GET"], auth_level=func.AuthLevel.ANONYMOUS)
+@instrument_route("cache/stats")
+def cache_stats(req: func.HttpRequest) -> func.HttpResponse:
+    """Reports hit and miss counters of the result cache."""
+    return create_response(get_result_cache().stats())
+
+
+@app.route(route="metrics", methods=["GET"], auth_level=func.AuthLevel.ANONYMOUS)
+def metrics(req: func.HttpRequest) -> func.HttpResponse:
+    """Counters and histograms of this worker in the OpenMetrics (or Prometheus) text format."""
+    openmetrics = "application/openmetrics-text" in (req.headers.get("Accept") or "")
+    return func.HttpResponse(telemetry.render(openmetrics), status_code=200, headers={
+        "Content-Type": telemetry.OPENMETRICS_CONTENT_TYPE if openmetrics else telemetry.PROMETHEUS_CONTENT_TYPE})
+
+
+def collect_worker_stats():
+    """Result cache, job queue and admission state for /api/metrics, for whichever of them exist yet."""
+    families = []
+    result_cache = _shared.get("result_cache")
+    if result_cache is not None:
+        stats = result_cache.stats()
+        labels = {"backend": stats["backend"]}
+        families += [
+            ("cache_hits", "counter", "Result cache lookups that found an output.", [(labels, stats["hits"])]),
+            ("cache_misses", "counter", "Result cache lookups that found nothing.", [(labels, stats["misses"])]),
+            ("cache_evictions", "counter", "Entries evicted from the result cache.", [(labels, stats["evictions"])]),
+        ]
+        if stats["entries"] is not None:
+            families.append(("cache_entries", "gauge", "Entries in the result cache.", [(labels, stats["entries"])]))
+    job_backend = _shared.get("job_backend")
+    if job_backend is not None and isinstance(job_backend[1], jobs.LocalJobQueue):
+        # Only the in-process queue is cheap to measure; Storage Queue depth needs a service call
+        families.append(("job_queue_depth", "gauge", "Jobs waiting for a local worker thread.",
+                         [({}, job_backend[1].depth())]))
+    controller = _shared.get("admission")
+    if controller is not None:
+        stats = controller.stats()
+        families += [
+            ("admission_queue_depth", "gauge", "Conversion requests waiting for capacity.", [({}, stats["waiting"])]),
+            ("admission_in_flight_cost", "gauge", "Estimated cost of the conversions running now.",
+             [({}, stats["in_flight"])]),
+            ("admission_capacity", "gauge", "Cost units this worker runs at once.", [({}, stats["capacity"])]),
+            ("admission_clients", "gauge", "Clients with a token bucket.", [({}, stats["clients"])]),
+        ]
+    return families
+
+
+telemetry.register_collector("worker", collect_worker_stats)
+
+
+@app.route(route="download/{filename}", methods=["GET", "HEAD"], auth_level=func.AuthLevel.ANONYMOUS)
+@instrument_route("download/{filename}")
 def download_file(req: func.HttpRequest) -> func.HttpResponse:
-    """Downloads a processed file from Azure Blob Storage."""
+    """Downloads a processed file from storage.
+
+    Supports single byte ranges (206 / 416) so large files can be fetched in
+    pieces and resumed, and If-None-Match (304) against the blob ETag. A
+    ranged read answers existence, condition and body at once. No response
+    holds more than DOWNLOAD_MAX_BODY_BYTES: a longer range is cut short,
+    and a larger full download is redirected (see large_download_response).
+    """
     logging.info("Download endpoint triggered.")
     try:
         filename = req.route_params.get('filename')
         if not filename:
             return create_error_response("Filename is required.", 400)
 
-        blob_client = blob_service_client.get_blob_client(container=OUTPUTS_CONTAINER, blob=filename)
-        if not blob_client.exists():
+        blob_storage = get_storage()
+        if_none_match = req.headers.get("If-None-Match")
+        requested_range = parse_range(req.headers.get("Range"))
+        if_range = req.headers.get("If-Range")
+        none_match_tags = etag_list(if_none_match)
+        if requested_range and if_range and strong_etag(if_range) is None:
+            # A weak tag or a date never satisfies If-Range, so the whole file goes out
+            requested_range = None
+
+        properties = None
+        if req.method == "HEAD" or not requested_range or len(none_match_tags) > 1 or "*" in none_match_tags \
+                or requested_range[2] is not None or (none_match_tags and if_range):
+            # Cases the read cannot answer on its own need the properties first: a full body has its
+            # size checked, and a read takes one condition, so If-None-Match with If-Range is one of them
+            properties = blob_storage.head(OUTPUTS_CONTAINER, filename)
+            if properties is None:
+                return create_error_response("File not found.", 404)
+            if if_none_match and etag_matches(if_none_match, properties.etag):
+                return not_modified_response(properties.etag)
+            if req.method == "HEAD":
+                headers = download_headers(filename, properties.etag, properties.last_modified)
+                headers["Content-Length"] = str(properties.size)
+                return func.HttpResponse(status_code=200, headers=headers)
+
+        if requested_range and if_range and properties is not None and not strong_matches(if_range, properties.etag):
+            # The client's partial copy is stale; send the whole file instead
+            requested_range = None
+        if not requested_range and properties.size > DOWNLOAD_MAX_BODY_BYTES:
+            return large_download_response(filename, properties)
+
+        get_kwargs = {}
+        if requested_range:
+            try:
+                if properties is not None:
+                    offset, length = resolve_range(requested_range, properties.size)
+                else:
+                    start, end, _ = requested_range
+                    offset, length = start, (end - start + 1 if end is not None else None)
+            except RangeNotSatisfiable:
+                return range_not_satisfiable_response(properties.size)
+            get_kwargs.update(offset=offset, length=min(length or DOWNLOAD_MAX_BODY_BYTES, DOWNLOAD_MAX_BODY_BYTES))
+        if properties is None and none_match_tags:
+            get_kwargs["if_none_match"] = none_match_tags[0]
+        elif properties is None and requested_range and if_range:
+            get_kwargs["if_match"] = strong_etag(if_range)
+
+        try:
+            blob = blob_storage.get(OUTPUTS_CONTAINER, filename, **get_kwargs)
+        except storage.BlobNotFound:
             return create_error_response("File not found.", 404)
+        except storage.BlobNotModified:
+            return not_modified_response(none_match_tags[0])
+        except storage.BlobModified:
+            # If-Range did not match: the client's partial copy is stale
+            requested_range = None
+            properties = blob_storage.head(OUTPUTS_CONTAINER, filename)
+            if properties is None:
+                return create_error_response("File not found.", 404)
+            if properties.size > DOWNLOAD_MAX_BODY_BYTES:
+                return large_download_response(filename, properties)
+            blob = blob_storage.get(OUTPUTS_CONTAINER, filename)
+        except storage.RangeOutOfBounds as e:
+            return range_not_satisfiable_response(e.size)
 
-        file_bytes = blob_client.download_blob().readall()
+        headers = download_headers(filename, blob.info.etag, blob.info.last_modified)
+        if not requested_range:
+            return func.HttpResponse(body=blob.data, status_code=200, headers=headers)
 
-        return func.HttpResponse(
-            body=file_bytes,
-            status_code=200,
-            headers={
-                "Content-Type": "text/csv",
-                "Content-Disposition": f"attachment; filename={filename}"
-            }
-        )
+        headers["Content-Range"] = f"bytes {blob.offset}-{blob.offset + len(blob.data) - 1}/{blob.info.size}"
+        return func.HttpResponse(body=blob.data, status_code=206, headers=headers)
+    except ValueError as e:
+        return create_error_response(str(e), 400)
     except Exception as e:
         logging.error(f"Download error: {e}")
-        return create_error_response(f"An unexpected error occurred during download: {e}", 500)
\ No newline at end of file
+        return create_error_response(f"An unexpected error occurred during download: {e}", 500)
+
+
+def download_headers(filename, etag, last_modified):
+    """Headers shared by full, partial and HEAD download responses."""
+    headers = CORS_HEADERS.copy()
+    headers.update({
+        "Content-Type": outputformat.content_type_for(filename),
+        "Content-Disposition": f"attachment; filename={filename}",
+        "Accept-Ranges": "bytes",
+        "ETag": etag,
+        "Access-Control-Expose-Headers": "ETag, Content-Range, Content-Length, Accept-Ranges, "
+                                         "X-Correlation-ID, Server-Timing",
+    })
+    if last_modified:
+        headers["Last-Modified"] = format_datetime(last_modified, usegmt=True)
+    return headers
+
+
+def large_download_response(filename, properties):
+    """Answer a full download above DOWNLOAD_MAX_BODY_BYTES without reading it.
+
+    Storage that can sign a read URL gets the client redirected there; other
+    backends answer 413, and the client fetches the file in Range requests.
+    """
+    url = get_storage().read_url(OUTPUTS_CONTAINER, filename, DOWNLOAD_URL_SECONDS)
+    if url:
+        headers = CORS_HEADERS.copy()
+        headers.update({"Location": url, "Cache-Control": "no-store"})
+        return func.HttpResponse(status_code=307, headers=headers)
+    response = create_error_response(f"File is {properties.size} bytes; download it with Range requests of at most "
+                                     f"{DOWNLOAD_MAX_BODY_BYTES} bytes.", 413)
+    response.headers["Accept-Ranges"] = "bytes"
+    return response
+
+
+def not_modified_response(etag):
+    headers = CORS_HEADERS.copy()
+    headers["ETag"] = etag
+    return func.HttpResponse(status_code=304, headers=headers)
+
+
+def range_not_satisfiable_response(size):
+    headers = CORS_HEADERS.copy()
+    headers["Content-Range"] = f"bytes */{size}"
+    return func.HttpResponse(status_code=416, headers=headers)
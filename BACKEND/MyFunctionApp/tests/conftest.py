@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Tests import the app's packages (HttpTrigger1, benchmarks) from the function app directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,31 @@
+from HttpTrigger1.logic import admission
+
+
+def test_unauthenticated_client_is_named_by_the_trusted_hop(monkeypatch):
+    monkeypatch.setattr(admission, "API_KEYS", ["secret"])
+    headers = {"X-Client-ID": "someone-else", "X-Forwarded-For": "1.2.3.4, 203.0.113.7:50123"}
+    assert admission.client_id(headers) == "203.0.113.7"
+    monkeypatch.setattr(admission, "TRUSTED_PROXIES", 2)
+    assert admission.client_id(headers) == "1.2.3.4"
+    assert admission.client_id({"X-Forwarded-For": "203.0.113.7"}) == "anonymous"
+
+
+def test_client_header_needs_a_valid_key(monkeypatch):
+    monkeypatch.setattr(admission, "API_KEYS", ["secret"])
+    forwarded = {"X-Forwarded-For": "[2001:db8::1]:443"}
+    assert admission.client_id({**forwarded, "X-Client-ID": "team-a", "X-API-Key": "wrong"}) == "2001:db8::1"
+    assert admission.client_id({**forwarded, "X-Client-ID": "team-a", "x-functions-key": "secret"}) == "key:team-a"
+    assert admission.client_id({**forwarded, "X-API-Key": "secret"}).startswith("key:")
+
+
+def test_count_pages_reads_the_page_tree(monkeypatch):
+    pdf = (b"%PDF-1.4\n1 0 obj\n<< /Type /Catalog /Pages 2 0 R >>\nendobj\n"
+           b"2 0 obj\n<< /Type /Pages /Kids [3 0 R 4 0 R] /Count 7 >>\nendobj\n"
+           b"3 0 obj\n<< /Type /Pages /Parent 2 0 R /Count 3 >>\nendobj\n"
+           b"5 0 obj\n<< /Type /Outlines /Count 12 >>\nendobj\n")
+    monkeypatch.setattr(admission, "ENABLED", True)
+    assert admission.count_pages(pdf, ".PDF") == 7
+    assert admission.count_pages(b"%PDF-1.5 compressed", ".pdf") is None
+    assert admission.count_pages(pdf, ".png") is None
+    monkeypatch.setattr(admission, "ENABLED", False)
+    assert admission.count_pages(pdf, ".pdf") is None
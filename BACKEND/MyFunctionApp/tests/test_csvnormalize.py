@@ -0,0 +1,46 @@
+from HttpTrigger1.logic import csvnormalize
+
+
+def normalize(*responses, max_overlap_rows=0):
+    tables = csvnormalize.TableListSink()
+    normalizer = csvnormalize.CsvNormalizer(tables)
+    for index, text in enumerate(responses):
+        normalizer.add(text, max_overlap_rows if index else 0)
+    return tables.tables, normalizer.close().as_dict()
+
+
+def test_row_that_reads_as_a_sentence_is_kept_and_flagged():
+    tables, report = normalize("Item,Notes\nWidget is great for all uses.,\nGadget,ok")
+    assert tables == [(["Item", "Notes"], [["Widget is great for all uses.", ""], ["Gadget", "ok"]])]
+    assert report["flagged"] == {"suspect_prose": 1}
+
+
+def test_row_before_the_header_is_kept():
+    tables, report = normalize("North,,\nRegion,Q1,Q2\nSouth,1,2")
+    assert tables == [(["Region", "Q1", "Q2"], [["North", "", ""], ["South", "1", "2"]])]
+    assert report["flagged"] == {"before_header": 1}
+
+
+def test_blank_line_and_another_width_start_a_new_table():
+    tables, _ = normalize("A,B\n1,2\n\nC,D,E\n3,4,5")
+    assert tables == [(["A", "B"], [["1", "2"]]), (["C", "D", "E"], [["3", "4", "5"]])]
+
+
+def test_prose_around_the_table_is_dropped():
+    tables, report = normalize(
+        "Sure, here is the CSV:\n```csv\nItem,Qty\nA,1\n```\nLet me know if you need anything else!",
+        "Sure, here is the CSV:\n```csv\nItem,Qty\nB,2\n```",
+    )
+    assert tables == [(["Item", "Qty"], [["A", "1"], ["B", "2"]])]
+    assert report["dropped"]["prose"] == 3
+
+
+def test_overlap_is_dropped_only_within_the_band():
+    tables, report = normalize("Name,Qty\nA,1\nB,2\nC,3", "Name,Qty\nB,2\nC,3\nD,4", max_overlap_rows=2)
+    assert tables == [(["Name", "Qty"], [["A", "1"], ["B", "2"], ["C", "3"], ["D", "4"]])]
+    assert report["dropped"]["overlap"] == 2
+
+
+def test_repeated_rows_outside_the_band_are_kept():
+    tables, _ = normalize("Name,Qty\nA,1\nA,1", "Name,Qty\nA,1\nA,1", max_overlap_rows=0)
+    assert tables == [(["Name", "Qty"], [["A", "1"]] * 4)]
@@ -0,0 +1,93 @@
+import json
+import pytest
+from benchmarks.harness import LocalApp
+from benchmarks.samples import table_pdf
+
+
+@pytest.fixture(scope="module")
+def local_app():
+    with LocalApp() as app:
+        yield app
+
+
+def post_batch(local_app, body):
+    request = local_app.func.HttpRequest("POST", "/api/process/batch", headers={"Content-Type": "application/json"},
+                                         body=json.dumps(body).encode())
+    response = local_app.app.process_batch(request)
+    return response.status_code, json.loads(response.get_body())
+
+
+def test_batch_reports_bad_items_one_by_one(local_app):
+    file_id = local_app.seed(local_app.app.UPLOADS_CONTAINER, "doc.pdf", table_pdf(pages=1))
+    status, body = post_batch(local_app, {"items": ["doc.pdf", {"file_id": 5}, {"file_id": file_id}]})
+    assert status == 200
+    assert [(result["success"], result.get("status")) for result in body["results"]] == \
+        [(False, 400), (False, 400), (True, None)]
+
+
+def test_batch_rejects_a_body_that_is_not_an_object(local_app):
+    assert post_batch(local_app, ["doc.pdf"])[0] == 400
+    assert post_batch(local_app, {"items": "doc.pdf"})[0] == 400
+
+
+def download(local_app, name, headers):
+    request = local_app.func.HttpRequest("GET", f"/api/download/{name}", headers=headers, body=b"",
+                                         route_params={"filename": name})
+    response = local_app.app.download_file(request)
+    return response.status_code, response.get_body()
+
+
+def test_if_range_is_checked_alongside_if_none_match(local_app):
+    name = local_app.seed(local_app.app.OUTPUTS_CONTAINER, "range.csv", b"0123456789")
+    etag = local_app.storage.head(local_app.app.OUTPUTS_CONTAINER, name).etag
+    stale = {"If-None-Match": '"other"', "Range": "bytes=2-4", "If-Range": '"stale"'}
+    assert download(local_app, name, stale) == (200, b"0123456789")
+    assert download(local_app, name, dict(stale, **{"If-Range": etag})) == (206, b"234")
+    assert download(local_app, name, dict(stale, **{"If-None-Match": etag}))[0] == 304
+
+
+def test_weak_if_range_gets_the_whole_file(local_app):
+    name = local_app.seed(local_app.app.OUTPUTS_CONTAINER, "weak.csv", b"0123456789")
+    etag = local_app.storage.head(local_app.app.OUTPUTS_CONTAINER, name).etag
+    weak = {"Range": "bytes=2-4", "If-Range": f"W/{etag}"}
+    assert download(local_app, name, weak) == (200, b"0123456789")
+    assert download(local_app, name, dict(weak, **{"If-None-Match": '"other"'})) == (200, b"0123456789")
+    assert download(local_app, name, dict(weak, **{"If-Range": "Tue, 01 Jan 2030 00:00:00 GMT"}))[0] == 200
+    assert download(local_app, name, dict(weak, **{"If-Range": etag})) == (206, b"234")
+
+
+def test_large_downloads_are_redirected_or_served_in_ranges(local_app, monkeypatch):
+    name = local_app.seed(local_app.app.OUTPUTS_CONTAINER, "large.csv", b"0123456789" * 2)
+    monkeypatch.setattr(local_app.app, "DOWNLOAD_MAX_BODY_BYTES", 8)
+    assert download(local_app, name, {})[0] == 413
+    assert download(local_app, name, {"Range": "bytes=0-"}) == (206, b"01234567")
+    assert download(local_app, name, {"Range": "bytes=16-"}) == (206, b"6789")
+
+    monkeypatch.setattr(local_app.storage, "read_url", lambda container, blob, expires_in: f"https://signed/{blob}")
+    request = local_app.func.HttpRequest("GET", f"/api/download/{name}", body=b"", route_params={"filename": name})
+    response = local_app.app.download_file(request)
+    assert (response.status_code, response.headers["Location"]) == (307, f"https://signed/{name}")
+
+
+def test_chunked_upload_stores_the_file_hash(local_app, monkeypatch):
+    import hashlib
+    from HttpTrigger1.logic import chunkupload
+
+    data = table_pdf(pages=2)
+    upload_id = chunkupload.new_upload_id("doc.pdf")
+    store = local_app.app.get_chunk_store()
+    chunks = [data[:1000], data[1000:1500], data[1500:]]
+    reads = []
+    get = store.storage.get
+    monkeypatch.setattr(store.storage, "get", lambda container, name, **kwargs: reads.append(name) or get(
+        container, name, **kwargs))
+    for index, chunk in enumerate(chunks):
+        store.put_chunk(upload_id, index, chunk, hashlib.sha256(chunk).hexdigest())
+    request = local_app.func.HttpRequest("POST", f"/api/upload/{upload_id}/commit",
+                                         body=json.dumps({"chunks": 3}).encode(), route_params={"upload_id": upload_id})
+    response = local_app.app.commit_chunked_upload(request)
+    assert json.loads(response.get_body())["sha256"] == hashlib.sha256(data).hexdigest()
+    stored = local_app.storage.head(local_app.app.UPLOADS_CONTAINER, upload_id)
+    assert stored.metadata["sha256"] == hashlib.sha256(data).hexdigest()
+    # Each chunk is read once, for the copy and the hash together
+    assert sorted(reads) == sorted(set(reads)) and len(reads) == 3
@@ -0,0 +1,33 @@
+import io
+import zipfile
+from PIL import Image
+from HttpTrigger1.logic import imgprep
+
+
+def image_bytes(image_format, frames=1):
+    images = [Image.new("RGB", (40, 30), (index * 40, 0, 0)) for index in range(frames)]
+    out = io.BytesIO()
+    images[0].save(out, format=image_format, save_all=frames > 1, append_images=images[1:])
+    return out.getvalue()
+
+
+def archive(entries):
+    out = io.BytesIO()
+    with zipfile.ZipFile(out, "w") as zf:
+        for name, data in entries.items():
+            zf.writestr(name, data)
+    return out.getvalue()
+
+
+def test_page_count_matches_iter_pages_and_reads_only_multi_page_entries(monkeypatch):
+    data = archive({"a.png": image_bytes("PNG"), "b.tif": image_bytes("TIFF", frames=3),
+                    "c.jpg": image_bytes("JPEG"), "notes.txt": b"x", "__MACOSX/._a.png": b"x"})
+    pages = len(list(imgprep.iter_pages(data)))
+    opened = []
+    real_open = zipfile.ZipFile.open
+    monkeypatch.setattr(zipfile.ZipFile, "read", lambda *args, **kwargs: (_ for _ in ()).throw(AssertionError))
+    monkeypatch.setattr(zipfile.ZipFile, "open",
+                        lambda self, info, *args, **kwargs: opened.append(getattr(info, "filename", info))
+                        or real_open(self, info, *args, **kwargs))
+    assert imgprep.page_count(data) == pages == 5
+    assert opened == ["b.tif"]
@@ -0,0 +1,38 @@
+from HttpTrigger1.logic import csvnormalize
+from HttpTrigger1.logic.imgprep import PreparedImage
+from HttpTrigger1.logic.imgtocsv import overlap_rows, write_parts
+
+
+def strips(*overlaps, height=1000):
+    return [PreparedImage(b"", "image/jpeg", 500, height, overlap) for overlap in overlaps]
+
+
+def convert(parts, texts):
+    tables = csvnormalize.TableListSink()
+    normalizer = csvnormalize.CsvNormalizer(tables)
+    write_parts(normalizer, parts, texts)
+    return tables.tables, normalizer.close().as_dict()
+
+
+def test_overlap_band_follows_row_height():
+    above, strip = strips(0, 100)
+    assert overlap_rows(above, strip, 20) == 3
+    assert overlap_rows(above, strip, 0) == 0
+    assert overlap_rows(*strips(0, 0), 20) == 0
+
+
+def test_rows_in_the_overlap_are_dropped():
+    texts = ["Name,Qty\n" + "\n".join(f"R{i},{i}" for i in range(10)),
+             "Name,Qty\nR9,9\nR10,10"]
+    tables, report = convert(strips(0, 100), texts)
+    assert [row[0] for row in tables[0][1]] == [f"R{i}" for i in range(11)]
+    assert report["dropped"]["overlap"] == 1
+
+
+def test_repeated_rows_below_the_overlap_are_kept():
+    # Real data that repeats the rows above, further down than the overlap reaches
+    texts = ["Name,Qty\n" + "\n".join(f"R{i},1" for i in range(10)),
+             "Name,Qty\nA,1\nA,1\nA,1\nR7,1\nR8,1\nR9,1"]
+    tables, report = convert(strips(0, 100), texts)
+    assert len(tables[0][1]) == 16
+    assert "overlap" not in report["dropped"]
@@ -0,0 +1,26 @@
+import pandas as pd
+from HttpTrigger1.logic.fingerprint import analyze_frame
+from HttpTrigger1.logic.matchindex import MatchIndex
+
+
+def test_dtype_profile_is_inferred_from_the_text():
+    frame = pd.DataFrame({"Qty": ["1", "2"], "Name": ["a", "b"], "Price": ["1.5", ""], "Paid": ["true", "false"]},
+                         dtype=str)
+    # Name, Paid, Price, Qty
+    assert analyze_frame(frame)["dtypes"] == "Obfi"
+
+
+def test_files_with_the_same_schema_match(tmp_path):
+    index = MatchIndex(str(tmp_path / "matches.db"))
+    frame = pd.DataFrame({"Region": ["North", "North"], "Sales": ["1", "2"]}, dtype=str)
+    other = pd.DataFrame({"region": ["South", "East"], "sales": ["3", "3"]}, dtype=str)
+    first, second = analyze_frame(frame), analyze_frame(other)
+    assert first["signature"] == second["signature"]
+    index.upsert("a.csv", "Region", "North", first["signature"], first["dtypes"])
+    index.upsert("b.csv", "Product", "Widget")
+    index.upsert("c.csv", "sales", "3", second["signature"], second["dtypes"])
+    signature, dtypes = index.schema("c.csv")
+    assert index.matches("sales", exclude="c.csv", signature=signature, dtypes=dtypes) == ["a.csv"]
+    assert index.matches("sales", exclude="c.csv") == []
+    assert index.schema("b.csv") is None
+    index.close()
@@ -0,0 +1,38 @@
+import threading
+import time
+import pandas as pd
+from HttpTrigger1.logic.mergecsv import CSVMatcher
+
+
+class SlowClient:
+    """Stands in for the Gemini client, counting how many calls overlap."""
+    max_concurrency = 4
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.running = self.peak = 0
+
+    def generate_text(self, prompt, model, api_key=None):
+        with self.lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        time.sleep(0.05)
+        with self.lock:
+            self.running -= 1
+        return '{"column": "Name", "value": "a"}'
+
+
+def test_load_all_csvs_analyzes_files_concurrently(tmp_path):
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    for index in range(8):
+        # Every value distinct: the local analysis is unsure and asks the model
+        pd.DataFrame({"Name": [f"n{index}-{row}" for row in range(10)],
+                      "Qty": [str(row) for row in range(10)]}).to_csv(data_dir / f"f{index}.csv", index=False)
+    matcher = CSVMatcher(str(data_dir), str(tmp_path / "output"))
+    matcher.gemini_client = SlowClient()
+    results = matcher.load_all_csvs()
+    assert sorted(result["file"] for result in results) == [f"f{index}.csv" for index in range(8)]
+    assert {result["source"] for result in results} == {"gemini"}
+    assert matcher.gemini_client.peak == SlowClient.max_concurrency
+    matcher.index.close()
@@ -0,0 +1,40 @@
+import io
+import csv
+import pyarrow.parquet as pq
+from HttpTrigger1.logic.outputformat import ColumnType, convert_csv
+from HttpTrigger1.logic.tablestitch import TableFileSink
+
+HEADER = ["id", "amount", "ratio", "code", "flag", "note", "blank", "padded", "huge"]
+ROWS = [
+    ["1", "1.0", "0.5", "007", "true", "x", "", " 12 ", "9007199254740993"],
+    ["2", "", "1e3", "010", "False", "", "", "3", "1"],
+    ["", "2.50", "", "", "", "inf", "  ", "", "2"],
+]
+
+
+def typed_output(rows, convert):
+    output = io.BytesIO()
+    if convert:
+        text = io.StringIO()
+        csv.writer(text).writerows([HEADER] + rows)
+        convert_csv(text.getvalue().encode("utf-8"), output, "parquet")
+    else:
+        with TableFileSink(output, "parquet") as sink:
+            sink.start_table(HEADER)
+            sink.write_rows(rows)
+    output.seek(0)
+    return pq.read_table(output)
+
+
+def test_streamed_and_converted_outputs_share_one_schema():
+    streamed, converted = typed_output(ROWS, False), typed_output(ROWS, True)
+    assert streamed.schema.equals(converted.schema)
+    assert [str(field.type) for field in streamed.schema] == \
+        ["int64", "double", "double", "string", "bool", "string", "string", "int64", "double"]
+    assert streamed.to_pylist() == converted.to_pylist()
+
+
+def test_column_type_ignores_surrounding_whitespace():
+    column = ColumnType()
+    column.observe((" 4", "", "   ", "5 "))
+    assert (column.name, column.filled, column.blank) == ("integer", 2, 2)
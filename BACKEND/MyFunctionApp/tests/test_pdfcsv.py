@@ -0,0 +1,55 @@
+import io
+import zipfile
+import pypdfium2
+from benchmarks.samples import table_pdf
+from HttpTrigger1.logic import pdfcsv
+
+
+def two_table_pdf():
+    """Two pages of a four-column table followed by two pages of a three-column one."""
+    document = pypdfium2.PdfDocument(table_pdf(pages=2, columns=4))
+    document.import_pages(pypdfium2.PdfDocument(table_pdf(pages=2, columns=3, seed=1)))
+    out = io.BytesIO()
+    document.save(out)
+    return out.getvalue()
+
+
+def convert(data, **kwargs):
+    output = io.BytesIO()
+    report = pdfcsv.pdf_to_csv(io.BytesIO(data), output, **kwargs)
+    return output.getvalue(), report
+
+
+def test_streaming_matches_serial_for_one_table():
+    data = table_pdf(pages=5, rows=10)
+    serial, serial_report = convert(data)
+    streamed, streamed_report = convert(data, workers=2, pages_per_task=2)
+    assert streamed == serial
+    assert serial_report["logical_tables"] == streamed_report["logical_tables"] == 1
+    assert serial.decode().count("Item,Col1,Col2,Col3") == 1
+
+
+def test_streaming_matches_serial_for_several_tables():
+    data = two_table_pdf()
+    serial, serial_report = convert(data)
+    streamed, _ = convert(data, workers=2, pages_per_task=1)
+    assert serial_report["archive"]
+    serial_zip, streamed_zip = zipfile.ZipFile(io.BytesIO(serial)), zipfile.ZipFile(io.BytesIO(streamed))
+    assert serial_zip.namelist() == streamed_zip.namelist() == ["table_001.csv", "table_002.csv"]
+    for name in serial_zip.namelist():
+        assert serial_zip.read(name) == streamed_zip.read(name)
+    assert serial_zip.read("table_002.csv").decode().splitlines()[0] == "Item,Col1,Col2"
+
+
+class NoCopyBytesIO(io.BytesIO):
+    def getvalue(self):
+        raise AssertionError("the document was copied")
+
+
+def test_in_memory_source_is_read_in_place():
+    data = table_pdf(pages=3, rows=10)
+    source, output = NoCopyBytesIO(data), io.BytesIO()
+    pdfcsv.pdf_to_csv(source, output)
+    assert output.getvalue() == convert(data)[0]
+    # Every view of the buffer is released, so the stream can be closed
+    source.close()
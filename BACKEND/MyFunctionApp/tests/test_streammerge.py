@@ -0,0 +1,52 @@
+import io
+import os
+import pandas as pd
+import pytest
+from HttpTrigger1.logic import streammerge
+from HttpTrigger1.logic.streammerge import merge_csv_streaming
+
+EXISTING = "Name,Qty,Note\nA,1,\nB,2,x\nA,1,\nC,3,NA\nD,1.0,\n"
+NEW = "Qty,Name\n" + "1,A\n2,B\n1.0,D\n3,C\n" * 3
+
+
+def pandas_merge(*texts):
+    frames = [pd.read_csv(io.StringIO(text), dtype=str, keep_default_na=False) for text in texts]
+    return pd.concat(frames).drop_duplicates(keep="last").to_csv(index=False)
+
+
+@pytest.mark.parametrize("max_memory_rows", [streammerge.MEMORY_ROWS, 2])
+def test_matches_pandas_concat_drop_duplicates(tmp_path, max_memory_rows):
+    sources = []
+    for name, text in (("existing.csv", EXISTING), ("new.csv", NEW)):
+        (tmp_path / name).write_text(text)
+        sources.append(str(tmp_path / name))
+    merged = tmp_path / "merged.csv"
+    rows_in, rows_out, _ = merge_csv_streaming(sources, str(merged), chunksize=3, max_memory_rows=max_memory_rows)
+    assert merged.read_text() == pandas_merge(EXISTING, NEW)
+    assert (rows_in, rows_out) == (17, 8)
+
+
+
+def test_wide_rows_spill_as_fixed_size_digests(tmp_path, monkeypatch):
+    header = ",".join(f"c{column}" for column in range(200))
+    rows = [",".join(f"{row}-{column}-" + "x" * 40 for column in range(200)) for row in range(60)]
+    existing, new = "\n".join([header] + rows) + "\n", "\n".join([header] + rows[::2]) + "\n"
+    (tmp_path / "existing.csv").write_text(existing)
+    (tmp_path / "new.csv").write_text(new)
+    merged = tmp_path / "merged.csv"
+
+    spilled = []
+    real_spill = streammerge.RowIndex._spill
+
+    def spill(index):
+        real_spill(index)
+        index._conn.commit()
+        spilled.append(os.path.getsize(index._path))
+
+    monkeypatch.setattr(streammerge.RowIndex, "_spill", spill)
+    rows_in, rows_out, _ = merge_csv_streaming([str(tmp_path / "existing.csv"), str(tmp_path / "new.csv")],
+                                               str(merged), chunksize=7, max_memory_rows=10)
+    assert merged.read_text() == pandas_merge(existing, new)
+    assert (rows_in, rows_out) == (90, 60)
+    # The rows are about 10 KB each; the spilled index holds 16-byte digests
+    assert spilled and spilled[0] < 16 * 1024